@@ -0,0 +1,240 @@
+"""
+Ancestor/descendant transitive closure, stored in Kuzu as the CLOSURE rel table.
+
+CLOSURE(FROM ancestor TO descendant, depth) has one edge per (ancestor, descendant)
+pair over PARENT_OF/ADOPTED_BY, with depth = fewest generations between them.
+Ancestor and descendant lookups are then a single one-hop match.
+
+The closure is maintained incrementally from the kinship index:
+- adding a parent edge p -> c links every ancestor of p (and p) to every
+  descendant of c (and c), keeping the smaller depth on conflicts;
+- removing an edge or a person (or adding many edges at once) recomputes the
+  closure rows of the affected descendants only; large recomputations are
+  written with COPY FROM instead of UNWIND batches.
+On startup the stored closure is compared with the index and rebuilt if they
+differ in any row.
+"""
+import os
+import tempfile
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from database import get_db_connection, transaction, write_queue
+from graph_index import get_kinship_index
+
+# Rows per UNWIND statement
+BATCH_SIZE = 5000
+
+# closure_refresh stages at least this many rows as Parquet and uses COPY FROM
+COPY_MIN_ROWS = 50000
+
+MERGE_QUERY = """
+    UNWIND $rows AS r
+    MATCH (a:Person), (d:Person)
+    WHERE a.id = r.a AND d.id = r.d
+    MERGE (a)-[x:CLOSURE]->(d)
+    ON CREATE SET x.depth = r.depth
+    ON MATCH SET x.depth = CASE WHEN r.depth < x.depth THEN r.depth ELSE x.depth END
+"""
+
+INSERT_QUERY = """
+    UNWIND $rows AS r
+    MATCH (a:Person), (d:Person)
+    WHERE a.id = r.a AND d.id = r.d
+    CREATE (a)-[:CLOSURE {depth: r.depth}]->(d)
+"""
+
+
+def _write_rows(conn, query, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(query, parameters={"rows": rows[start:start + BATCH_SIZE]})
+
+
+def _ancestor_rows(index, person_ids):
+    rows = []
+    for pid in person_ids:
+        for ancestor_id, depth in index.ancestors(pid).items():
+            rows.append({"a": ancestor_id, "d": pid, "depth": depth})
+    return rows
+
+
+def add_parent_edge(conn, query, params, parent_id, child_id, label):
+    """
+    write_queue mutation: create a parent edge with `query` and, in the same
+    transaction, its closure rows. The index is patched inside so that later
+    edges in the same group commit see this one; the patch is undone if the
+    group rolls back. Returns False (writing nothing) if `query` matched no pair.
+
+    The cycle check runs here too, on the writer thread against the index as
+    of this point in the group: index.add_parent raises CycleError and the
+    transaction rolls back.
+    """
+    if not conn.execute(query, parameters=params).has_next():
+        return False
+    index = get_kinship_index()
+    index.add_parent(parent_id, child_id, label)
+    write_queue.on_rollback(index.remove_parent, parent_id, child_id)
+    closure_add_parent(conn, index, parent_id, child_id)
+    return True
+
+
+def closure_add_parent(conn, index, parent_id, child_id):
+    """Extend the closure for a new parent edge (index must already contain it)."""
+    up = index.ancestors(parent_id)
+    up[parent_id] = 0
+    down = index.descendants(child_id)
+    down[child_id] = 0
+
+    rows = [
+        {"a": a, "d": d, "depth": da + 1 + dd}
+        for a, da in up.items()
+        for d, dd in down.items()
+    ]
+    _write_rows(conn, MERGE_QUERY, rows)
+
+
+def closure_refresh(conn, index, person_ids):
+    """
+    Recompute the ancestor rows of `person_ids` from the index. Used after an
+    edge or person removal, with the descendants below the removed edge/person,
+    and after bulk edge inserts, with everyone below the new edges.
+    """
+    person_ids = list(person_ids)
+    if not person_ids:
+        return
+    conn.execute("""
+        MATCH (:Person)-[x:CLOSURE]->(d:Person)
+        WHERE d.id IN $ids
+        DELETE x
+    """, parameters={"ids": person_ids})
+    src, dst, depth = _bulk_ancestor_columns(index, person_ids)
+    if len(src) >= COPY_MIN_ROWS:
+        with tempfile.TemporaryDirectory() as staging_dir:
+            _copy_columns(conn, src, dst, depth, staging_dir)
+    else:
+        rows = [{"a": a, "d": d, "depth": k} for a, d, k in zip(src, dst, depth)]
+        _write_rows(conn, INSERT_QUERY, rows)
+
+
+def _bulk_ancestor_columns(index, person_ids):
+    """
+    (ancestor, descendant, depth) columns for many people at once, in one
+    parents-first pass: each person's ancestors are their parents' ancestors one
+    generation further, so nobody is walked twice. A person's map is dropped
+    as soon as all their children in the set have used it.
+    """
+    ids = set(person_ids)
+    parents = {pid: [p for p, _ in index.parents(pid)] for pid in ids}
+    waiting = {pid: 0 for pid in ids}  # children in the set not yet processed
+    pending = {}
+    for pid, ps in parents.items():
+        pending[pid] = sum(1 for p in ps if p in ids)
+        for p in ps:
+            if p in ids:
+                waiting[p] += 1
+    order = [pid for pid in ids if pending[pid] == 0]
+    children = {}
+    for pid, ps in parents.items():
+        for p in ps:
+            if p in ids:
+                children.setdefault(p, []).append(pid)
+
+    src, dst, depth = [], [], []
+    known = {}
+    for pid in order:
+        up = {}
+        for p in parents[pid]:
+            above = known.get(p) if p in ids else index.ancestors(p)
+            up[p] = 1
+            for a, d in above.items():
+                if d + 1 < up.get(a, d + 2):
+                    up[a] = d + 1
+            if p in ids:
+                waiting[p] -= 1
+                if waiting[p] == 0:
+                    known.pop(p, None)
+        src += up.keys()
+        dst += [pid] * len(up)
+        depth += up.values()
+        if waiting[pid]:
+            known[pid] = up
+        for c in children.get(pid, ()):
+            pending[c] -= 1
+            if pending[c] == 0:
+                order.append(c)
+
+    # People on a parent cycle never become ready; walk them individually
+    for pid in ids - set(order):
+        for a, d in index.ancestors(pid).items():
+            src.append(a)
+            dst.append(pid)
+            depth.append(d)
+    return src, dst, depth
+
+
+def closure_bulk_load(conn, index, person_ids, staging_dir):
+    """
+    Add the ancestor rows of newly bulk-loaded people (who have none yet) with
+    COPY FROM a staged Parquet file instead of UNWIND batches.
+    """
+    src, dst, depth = _bulk_ancestor_columns(index, person_ids)
+    if src:
+        _copy_columns(conn, src, dst, depth, staging_dir)
+
+
+def _copy_columns(conn, src, dst, depth, staging_dir):
+    path = os.path.join(staging_dir, "closure.parquet")
+    pq.write_table(pa.table({
+        "from": pa.array(src, pa.int64()),
+        "to": pa.array(dst, pa.int64()),
+        "depth": pa.array(depth, pa.int64())
+    }), path)
+    conn.execute(f'COPY CLOSURE FROM "{path}"')
+
+
+def rebuild_closure(conn, index):
+    """Drop and recompute the whole closure, in one transaction."""
+    src, dst, depth = _bulk_ancestor_columns(index, index.person_ids())
+    with transaction(conn):
+        conn.execute("MATCH (:Person)-[x:CLOSURE]->(:Person) DELETE x")
+        if len(src) >= COPY_MIN_ROWS:
+            with tempfile.TemporaryDirectory() as staging_dir:
+                _copy_columns(conn, src, dst, depth, staging_dir)
+        else:
+            rows = [{"a": a, "d": d, "depth": k} for a, d, k in zip(src, dst, depth)]
+            _write_rows(conn, INSERT_QUERY, rows)
+
+
+def _sorted_rows(src, dst, depth):
+    rows = np.column_stack([np.asarray(src, np.int64), np.asarray(dst, np.int64), np.asarray(depth, np.int64)])
+    return rows[np.lexsort((rows[:, 2], rows[:, 1], rows[:, 0]))] if len(rows) else rows.reshape(0, 3)
+
+
+def closure_matches(conn, index):
+    """True if CLOSURE holds exactly the rows the kinship index implies."""
+    actual = conn.execute("""
+        MATCH (a:Person)-[x:CLOSURE]->(d:Person)
+        RETURN CAST(a.id AS INT64) AS a, CAST(d.id AS INT64) AS d, x.depth AS depth
+    """).get_as_arrow()
+    expected = _bulk_ancestor_columns(index, index.person_ids())
+    if actual.num_rows != len(expected[0]):
+        return False
+    columns = [actual.column(name).to_numpy() for name in ("a", "d", "depth")]
+    return np.array_equal(_sorted_rows(*columns), _sorted_rows(*expected))
+
+
+def ensure_closure(conn, index):
+    """
+    Rebuild the closure on startup unless it matches the kinship index row
+    for row (it can be stale, e.g. after a crash between an edge write and
+    its closure update, or empty on a new database).
+    """
+    if not closure_matches(conn, index):
+        print("Ancestor closure out of date; rebuilding...")
+        rebuild_closure(conn, index)
+
+
+if __name__ == "__main__":
+    db, conn = get_db_connection()
+    rebuild_closure(conn, get_kinship_index())
+    print("Closure rebuilt.")
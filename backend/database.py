@@ -1,11 +1,106 @@
 
+import asyncio
 import kuzu
 import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 
 DB_PATH = "kuzu_db"
 
+# Most connections the server keeps open; requests beyond that wait for one
+POOL_SIZE = int(os.environ.get("KUZU_POOL_SIZE", "16"))
+# Seconds a request waits for a free connection before failing with 503
+POOL_TIMEOUT = float(os.environ.get("KUZU_POOL_TIMEOUT", "30"))
+# Threads running Kuzu calls for async routes (see AsyncDatabase)
+DB_THREADS = int(os.environ.get("KUZU_DB_THREADS", str(POOL_SIZE)))
+# Default seconds an async call may take, queueing included, before 504
+QUERY_TIMEOUT = float(os.environ.get("KUZU_QUERY_TIMEOUT", "30"))
+# Seconds a write waits for the one write transaction Kuzu allows at a time
+WRITE_TIMEOUT = float(os.environ.get("KUZU_WRITE_TIMEOUT", "30"))
+# Group commit: how long the writer waits for more mutations, and how many it
+# commits together at most (see WriteQueue)
+WRITE_BATCH_WINDOW = float(os.environ.get("KUZU_WRITE_BATCH_MS", "2")) / 1000
+WRITE_BATCH_SIZE = int(os.environ.get("KUZU_WRITE_BATCH_SIZE", "64"))
+
+# Prepared statements kept per connection (least recently used dropped first)
+MAX_PREPARED = 256
+
+# Statements that change the catalog; they invalidate every prepared statement
+DDL_PATTERN = re.compile(r"^\s*(CREATE|ALTER|DROP)\s+((NODE|REL)\s+)?TABLE\b", re.IGNORECASE)
+
+# Kuzu's error when another connection holds the write transaction
+WRITE_CONFLICT = "Only one write transaction at a time"
+
 # Singleton instance
 _db_instance = None
+_schema_generation = 0
+
+def schema_changed():
+    """Discard all prepared statements (done automatically for CREATE/ALTER/DROP TABLE)."""
+    global _schema_generation
+    _schema_generation += 1
+
+class Connection(kuzu.Connection):
+    """
+    kuzu.Connection that prepares each parameterised query once and executes
+    later calls with the same text through the prepared statement, instead of
+    Kuzu parsing and planning it every time. Statements belong to the
+    connection (like the connection, they are used by one thread at a time)
+    and are dropped after schema changes.
+    """
+
+    def __init__(self, database):
+        super().__init__(database)
+        self._statements = OrderedDict()  # query text -> kuzu.PreparedStatement
+        self._generation = _schema_generation
+
+    def _prepared(self, query):
+        if self._generation != _schema_generation:
+            self._statements.clear()
+            self._generation = _schema_generation
+        statement = self._statements.get(query)
+        if statement is not None:
+            self._statements.move_to_end(query)
+            return statement
+        statement = kuzu.PreparedStatement(self, query)
+        if not statement.is_success():
+            raise RuntimeError(statement.get_error_message())
+        self._statements[query] = statement
+        if len(self._statements) > MAX_PREPARED:
+            self._statements.popitem(last=False)
+        return statement
+
+    def execute(self, query, parameters=None):
+        # A write that finds another connection mid-write fails before doing
+        # anything; wait for the writer (see transaction()) and try again
+        deadline = None
+        pause = 0.001
+        while True:
+            try:
+                return self._execute(query, parameters)
+            except RuntimeError as e:
+                if WRITE_CONFLICT not in str(e):
+                    raise
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + WRITE_TIMEOUT
+                if now >= deadline:
+                    raise
+                time.sleep(pause)
+                pause = min(pause * 2, 0.05)
+
+    def _execute(self, query, parameters):
+        if parameters and isinstance(query, str):
+            return super().execute(self._prepared(query), parameters)
+        result = super().execute(query, parameters)
+        if isinstance(query, str) and DDL_PATTERN.match(query):
+            schema_changed()
+        return result
 
 def get_db_instance():
     global _db_instance
@@ -15,10 +110,366 @@ def get_db_instance():
     return _db_instance
 
 def get_db_connection():
-    # Reuse the same Database instance
+    """
+    A new, unpooled connection, for scripts and CLIs. The server uses the pool
+    (get_conn / connection) instead.
+    """
     db = get_db_instance()
-    # Connections are cheap and thread-safe? Kuzu docs say:
-    # "Connection is not thread-safe. You should create a separate connection for each thread."
-    # So creating a new connection per request is correct, but from the SAME database instance.
-    conn = kuzu.Connection(db)
+    conn = Connection(db)
     return db, conn
+
+class PoolTimeout(Exception):
+    """No pooled connection came free in time (main.py answers 503)."""
+
+class ConnectionPool:
+    """
+    Up to `size` Kuzu connections, created lazily and reused. A Kuzu Connection
+    is not thread-safe, so each one is checked out by a single thread at a time;
+    a thread gets back the connection it used last when that one is idle.
+    """
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._idle = []       # most recently returned last
+        self._created = 0
+        self._local = threading.local()
+        # metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def checkout(self):
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    last = getattr(self._local, "conn", None)
+                    if last is not None and last in self._idle:
+                        self._idle.remove(last)
+                        conn = last
+                    else:
+                        conn = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    conn = Connection(get_db_instance())
+                    self._created += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection free after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            self._checkouts += 1
+            if waited:
+                wait = time.perf_counter() - started
+                self._waits += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn):
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._created - len(self._idle),
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6)
+            }
+
+# Singleton instance
+_pool = ConnectionPool()
+
+def get_pool():
+    return _pool
+
+@contextmanager
+def connection():
+    """Check a pooled connection out for the `with` block only."""
+    with _pool.connection() as conn:
+        yield conn
+
+def get_conn():
+    """
+    FastAPI dependency: a pooled connection for the request. It goes back to
+    the pool after the response, including streamed ones, has been sent.
+    """
+    conn = _pool.checkout()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+def get_read_conn():
+    """
+    FastAPI dependency for handlers that only read: a pooled connection with
+    one read-only transaction open until the response, including a streamed
+    one, has been sent. Every query of the request sees the same snapshot,
+    and a concurrent writer neither waits for it nor shows up in it halfway.
+    """
+    conn = _pool.checkout()
+    try:
+        with transaction(conn, read_only=True):
+            yield conn
+    finally:
+        _pool.release(conn)
+
+@contextmanager
+def transaction(conn, read_only=False):
+    """
+    Run the block's queries in one explicit transaction: all or nothing, or
+    with read_only=True, one consistent view that does not block writers.
+    Kuzu has a single writer; other connections' writes wait for COMMIT.
+    """
+    conn.execute("BEGIN TRANSACTION READ ONLY" if read_only else "BEGIN TRANSACTION")
+    try:
+        yield conn
+    except BaseException:
+        try:
+            conn.execute("ROLLBACK")
+        except RuntimeError:
+            pass  # Kuzu already rolled back when a statement failed
+        raise
+    conn.execute("COMMIT")
+
+class QueryTimeout(Exception):
+    """An AsyncDatabase call ran past its timeout (main.py answers 504)."""
+
+class AsyncDatabase:
+    """
+    Kuzu calls for async routes. Kuzu blocks the calling thread, so each call
+    runs on a dedicated, bounded thread pool with a pooled connection, and the
+    event loop keeps serving other requests meanwhile. Every call has a
+    timeout: Kuzu interrupts the query when it runs out, and a call still
+    queued for a thread at that point is not started at all.
+    """
+
+    def __init__(self, threads=DB_THREADS, pool=None):
+        self.threads = threads
+        self.pool = pool or _pool
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="kuzu")
+        return self._executor
+
+    def _call(self, fn, args, timeout, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise QueryTimeout(f"Query did not start within {timeout}s")
+        with self.pool.connection() as conn:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise QueryTimeout(f"Query did not start within {timeout}s")
+            conn.set_query_timeout(max(1, int(remaining * 1000)))
+            try:
+                return fn(conn, *args)
+            except RuntimeError as e:
+                if str(e).startswith("Interrupted"):
+                    raise QueryTimeout(f"Query took longer than {timeout}s") from e
+                raise
+            finally:
+                conn.set_query_timeout(0)
+
+    async def run(self, fn, *args, timeout=QUERY_TIMEOUT):
+        """Await fn(conn, *args) run on a database thread with a pooled connection."""
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self._call, fn, args, timeout, deadline)
+
+    async def execute(self, query, parameters=None, timeout=QUERY_TIMEOUT):
+        """Await one query; returns all its rows as lists."""
+        def execute(conn):
+            return conn.execute(query, parameters=parameters or {}).get_all()
+        return await self.run(execute, timeout=timeout)
+
+    def close(self):
+        """Stop the threads once queued calls are done (a later call starts new ones)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+# Singleton instance
+db = AsyncDatabase()
+
+def _all_rows(conn, query, parameters):
+    return conn.execute(query, parameters=parameters or {}).get_all()
+
+class WriteQueue:
+    """
+    One writer thread that owns all queued writes. Kuzu runs a single write
+    transaction at a time, so instead of each request beginning and committing
+    its own (and waiting for the others), requests submit mutations and the
+    writer commits whatever is pending together: it takes the first mutation,
+    waits up to `window` seconds for more (at most `max_batch`), runs them all
+    in one transaction and resolves each request's future with its result.
+
+    A mutation is fn(conn, *args). A failure anywhere in a group rolls the
+    whole group back and the writer then reruns each mutation in a transaction
+    of its own; only the failing one gets the exception. So a mutation should
+    only touch the database, or register an undo with on_rollback() for any
+    in-memory change it makes (e.g. patching the kinship index so that later
+    mutations in the same group see it). An `exclusive` mutation (e.g. a
+    snapshot restore) is never grouped: it commits in a transaction of its own.
+    """
+
+    def __init__(self, window=WRITE_BATCH_WINDOW, max_batch=WRITE_BATCH_SIZE):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._undo = []  # rollback callbacks of the transaction being run
+        self._held = None  # exclusive item taken while filling a batch; runs next
+        # metrics
+        self._batches = 0
+        self._mutations = 0
+        self._largest = 0
+        self._split = 0
+
+    def submit(self, fn, *args, exclusive=False):
+        """Queue fn(conn, *args); returns a concurrent.futures.Future of its result."""
+        future = Future()
+        with self._lock:
+            # (Re)start the writer if it is not running, e.g. after it died
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="kuzu-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((fn, args, future, exclusive))
+        return future
+
+    def run(self, fn, *args, exclusive=False):
+        """Queue fn(conn, *args) and wait for it to commit; returns its result."""
+        return self.submit(fn, *args, exclusive=exclusive).result()
+
+    def execute(self, query, parameters=None):
+        """Queue one query and wait for it to commit; returns all its rows."""
+        return self.run(_all_rows, query, parameters)
+
+    def on_rollback(self, fn, *args):
+        """From inside a mutation: call fn(*args) if its transaction rolls back."""
+        self._undo.append((fn, args))
+
+    def _take_batch(self):
+        first, self._held = self._held or self._queue.get(), None
+        batch = [first]
+        if first is not None and first[3]:
+            return batch
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            try:
+                item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is not None and item[3]:
+                self._held = item  # runs alone, as the next batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        batch = []
+        try:
+            conn = Connection(get_db_instance())
+            while True:
+                batch = self._take_batch()
+                stop = batch[-1] is None
+                batch = [item for item in batch if item is not None and item[2].set_running_or_notify_cancel()]
+                if batch:
+                    self._batches += 1
+                    self._mutations += len(batch)
+                    self._largest = max(self._largest, len(batch))
+                    self._commit(conn, batch)
+                if stop:
+                    return
+        except BaseException as e:
+            # Nobody may wait forever on a writer that is gone: fail what it
+            # held and what is queued; the next submit starts a new thread
+            error = RuntimeError(f"Writer thread stopped: {e}")
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                while True:
+                    try:
+                        item, self._held = self._held or self._queue.get_nowait(), None
+                    except queue.Empty:
+                        break
+                    if item is not None and item[2].set_running_or_notify_cancel():
+                        item[2].set_exception(error)
+            raise
+
+    def _commit(self, conn, batch):
+        results = []
+        self._undo = []
+        try:
+            with transaction(conn):
+                for fn, args, _, _ in batch:
+                    results.append(fn(conn, *args))
+        except Exception as e:
+            for undo, undo_args in reversed(self._undo):
+                try:
+                    undo(*undo_args)
+                except Exception as undo_error:
+                    print(f"Write queue rollback callback {undo!r} failed: {undo_error}")
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            # No savepoints in Kuzu: find the failing mutation by running each alone
+            self._split += 1
+            for item in batch:
+                self._commit(conn, [item])
+            return
+        for (_, _, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self):
+        """Commit what is queued and stop the thread (a later submit starts a new one)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self._batches,
+            "mutations": self._mutations,
+            "largest_batch": self._largest,
+            "mean_batch": round(self._mutations / self._batches, 2) if self._batches else 0,
+            "split_batches": self._split
+        }
+
+# Singleton instance
+write_queue = WriteQueue()
@@ -0,0 +1,337 @@
+"""
+Duplicate-person candidates for /people/duplicates.
+
+Comparing every pair of people is O(n^2), so people are first grouped into
+blocks that likely duplicates share, and pairs are only scored inside a block:
+- Soundex code of the surname (last word of the name, and of the maiden name),
+- combined with the birth decade, or the first word of the birth place, or
+  (with neither known) the first initial.
+Blocks that are still too large are split again by first initial.
+
+Pairs are scored on name similarity, birth/death date agreement and birth
+place, and different known genders never match. Full scans fan blocks out over
+a process pool. The scored candidates are cached in memory; creating, editing
+or deleting a single person rescores only that person against their blocks.
+"""
+import difflib
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+from database import connection
+
+# Pairs scoring below this are not kept as candidates
+MIN_SCORE = 0.75
+
+# Blocks above this size are split by first initial before scoring
+MAX_BLOCK_SIZE = 500
+
+# Full scans with fewer pairs than this are scored in-process
+PARALLEL_MIN_PAIRS = 20000
+
+# Blocks sent to a worker per task
+BLOCKS_PER_TASK = 200
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6"
+}
+
+PEOPLE_QUERY = """
+    MATCH (p:Person)
+    {where}
+    RETURN p.id, p.name, p.gender, p.birth_date, p.birth_place, p.death_date, p.maiden_name
+"""
+
+
+def _normalize(text):
+    # Lowercase ASCII letters, digits and single spaces
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", text.lower()).split())
+
+
+def soundex(word):
+    """American Soundex code ("Robert" -> "R163"), or "" for no letters."""
+    letters = [ch for ch in _normalize(word) if ch.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    last = SOUNDEX_CODES.get(letters[0], "")
+    for ch in letters[1:]:
+        digit = SOUNDEX_CODES.get(ch, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate letters with the same code; vowels do
+        if ch not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+
+def _year(date):
+    match = re.match(r"\s*(\d{4})", date or "")
+    return int(match.group(1)) if match else None
+
+
+def _record(row):
+    return {
+        "id": row[0],
+        "name": _normalize(row[1]),
+        "gender": (row[2] or "").lower()[:1],
+        "birth_date": row[3],
+        "birth_place": _normalize((row[4] or "").split(",")[0]),
+        "death_date": row[5],
+        "maiden_name": _normalize(row[6])
+    }
+
+
+def blocking_keys(rec):
+    names = rec["name"].split()
+    initial = names[0][0] if names else ""
+    codes = {soundex(names[-1]) if names else "", soundex(rec["maiden_name"])} - {""}
+    year = _year(rec["birth_date"])
+    place = rec["birth_place"].split()[0] if rec["birth_place"] else None
+
+    keys = set()
+    for code in codes:
+        if year is not None:
+            keys.add((code, "decade", year // 10))
+        if place:
+            keys.add((code, "place", place))
+        if year is None and not place:
+            keys.add((code, "initial", initial))
+    return keys
+
+
+def _date_score(a, b):
+    # 1 for the same date, tapering with the gap in years; None if either is unknown
+    if not a or not b:
+        return None
+    if a == b:
+        return 1.0
+    ya, yb = _year(a), _year(b)
+    if ya is None or yb is None:
+        return None
+    return {0: 0.8, 1: 0.5, 2: 0.3}.get(abs(ya - yb), 0.0)
+
+
+def _name_variants(rec):
+    variants = [rec["name"]]
+    if rec["maiden_name"] and rec["name"]:
+        variants.append(f"{rec['name'].split()[0]} {rec['maiden_name']}")
+    return variants
+
+
+def score_pair(a, b, floor=0.0):
+    """
+    Similarity of two people in [0, 1], or 0 if they cannot be the same person
+    or cannot reach `floor`.
+    """
+    if a["gender"] and b["gender"] and a["gender"] != b["gender"]:
+        return 0.0
+
+    # Weighted average over the evidence that is actually there
+    parts = []
+    for date_score in (_date_score(a["birth_date"], b["birth_date"]), _date_score(a["death_date"], b["death_date"])):
+        if date_score is not None:
+            parts.append((date_score, 0.3))
+    if a["birth_place"] and b["birth_place"]:
+        parts.append((difflib.SequenceMatcher(None, a["birth_place"], b["birth_place"]).ratio(), 0.1))
+    known = sum(s * w for s, w in parts)
+    total = sum(w for _, w in parts) + 0.6
+
+    # A maiden name on one side may be the surname on the other
+    matchers = [difflib.SequenceMatcher(None, x, y) for x in _name_variants(a) for y in _name_variants(b)]
+    # quick_ratio() bounds ratio() from above and is much cheaper
+    if (known + 0.6 * max(m.quick_ratio() for m in matchers)) / total < floor:
+        return 0.0
+    name = max(m.ratio() for m in matchers)
+    return (known + 0.6 * name) / total
+
+
+def _split_block(members):
+    if len(members) <= MAX_BLOCK_SIZE:
+        return [members]
+    by_initial = {}
+    for rec in members:
+        by_initial.setdefault(rec["name"][:1], []).append(rec)
+    return list(by_initial.values())
+
+
+def _score_blocks(blocks):
+    """Worker: [(a_id, b_id, score), ...] for pairs within each block above MIN_SCORE."""
+    found = []
+    for members in blocks:
+        for sub in _split_block(members):
+            for i, a in enumerate(sub):
+                for b in sub[i + 1:]:
+                    score = score_pair(a, b, MIN_SCORE)
+                    if score >= MIN_SCORE:
+                        found.append((min(a["id"], b["id"]), max(a["id"], b["id"]), score))
+    return found
+
+
+class DuplicateCache:
+    """Candidate pairs plus the blocks they came from, kept in step with single edits."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.built = False
+        self._people = {}   # id -> record
+        self._blocks = {}   # key -> {id, ...}
+        self._pairs = {}    # (low id, high id) -> score
+        self._sorted = None
+        self._building = False
+        self._missed = set()  # ids edited while a build was running
+
+    def _load(self, conn, person_ids=None):
+        where = "" if person_ids is None else "WHERE p.id IN $ids"
+        params = {} if person_ids is None else {"ids": list(person_ids)}
+        result = conn.execute(PEOPLE_QUERY.format(where=where), parameters=params)
+        records = []
+        while result.has_next():
+            records.append(_record(result.get_next()))
+        return records
+
+    def build(self, conn):
+        """Full scan: block everyone and score all within-block pairs."""
+        with self._lock:
+            self._building = True
+        records = self._load(conn)
+        blocks = {}
+        for rec in records:
+            for key in blocking_keys(rec):
+                blocks.setdefault(key, []).append(rec)
+        block_list = [members for members in blocks.values() if len(members) > 1]
+
+        work = sum(len(m) * (len(m) - 1) // 2 for m in block_list)
+        if work < PARALLEL_MIN_PAIRS:
+            results = [_score_blocks(block_list)]
+        else:
+            tasks = [block_list[i:i + BLOCKS_PER_TASK] for i in range(0, len(block_list), BLOCKS_PER_TASK)]
+            # spawn, not fork: the server process has Kuzu and worker threads running
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=context) as pool:
+                results = list(pool.map(_score_blocks, tasks))
+
+        with self._lock:
+            self._people = {rec["id"]: rec for rec in records}
+            self._blocks = {key: {rec["id"] for rec in members} for key, members in blocks.items()}
+            self._pairs = {}
+            for found in results:
+                for a, b, score in found:
+                    self._pairs[(a, b)] = score
+            self._sorted = None
+            self.built = True
+            self._building = False
+            missed, self._missed = self._missed, set()
+
+        # Edits made after the scan read the database
+        self.refresh_people(conn, missed)
+
+    def _drop(self, pid):
+        rec = self._people.pop(pid, None)
+        if rec is None:
+            return
+        for key in blocking_keys(rec):
+            members = self._blocks.get(key)
+            if members:
+                members.discard(pid)
+                if not members:
+                    del self._blocks[key]
+        for pair in [pair for pair in self._pairs if pid in pair]:
+            del self._pairs[pair]
+
+    def remove_person(self, pid):
+        with self._lock:
+            if self._building:
+                self._missed.add(pid)
+            if self.built:
+                self._drop(pid)
+                self._sorted = None
+
+    def refresh_person(self, conn, pid):
+        """Re-block and rescore one person after it was created or edited."""
+        self.refresh_people(conn, [pid])
+
+    def refresh_people(self, conn, person_ids):
+        """Re-block and rescore several people with one lookup."""
+        person_ids = list(person_ids)
+        with self._lock:
+            if self._building:
+                self._missed.update(person_ids)
+            if not self.built or not person_ids:
+                return
+        records = {rec["id"]: rec for rec in self._load(conn, person_ids)}
+        with self._lock:
+            self._sorted = None
+            for pid in person_ids:
+                self._drop(pid)
+                rec = records.get(pid)
+                if rec is not None:
+                    self._add(rec)
+
+    def _add(self, rec):
+        pid = rec["id"]
+        self._people[pid] = rec
+        others = set()
+        for key in blocking_keys(rec):
+            members = self._blocks.setdefault(key, set())
+            if len(members) + 1 > MAX_BLOCK_SIZE:
+                # Same split as _split_block
+                others |= {m for m in members if self._people[m]["name"][:1] == rec["name"][:1]}
+            else:
+                others |= members
+            members.add(pid)
+        for other_id in others:
+            score = score_pair(rec, self._people[other_id], MIN_SCORE)
+            if score >= MIN_SCORE:
+                self._pairs[(min(pid, other_id), max(pid, other_id))] = score
+
+    def candidates(self, min_score=MIN_SCORE):
+        """[(a_id, b_id, score), ...], best first."""
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(
+                    ((a, b, score) for (a, b), score in self._pairs.items()),
+                    key=lambda c: (-c[2], c[0], c[1])
+                )
+            return [c for c in self._sorted if c[2] >= min_score]
+
+
+# Singleton instance
+_cache = DuplicateCache()
+_build_lock = threading.Lock()
+
+def get_duplicate_cache():
+    if not _cache.built:
+        with _build_lock:
+            if not _cache.built:
+                with connection() as conn:
+                    _cache.build(conn)
+    return _cache
+
+
+def refresh_duplicates(conn, *person_ids):
+    """Call after people were created or edited (no-op until the first scan)."""
+    _cache.refresh_people(conn, person_ids)
+
+
+def forget_duplicates(person_id):
+    """Call after a person was deleted."""
+    _cache.remove_person(person_id)
+
+
+def reset_duplicates():
+    """Call after a bulk load; the next /people/duplicates request rescans."""
+    global _cache
+    with _build_lock:
+        _cache = DuplicateCache()
@@ -0,0 +1,732 @@
+"""
+GEDCOM 5.5.1 / 7.0 import and GEDCOM 5.5.1 export.
+
+The file is read line by line and grouped into one level-0 record at a time,
+so memory does not grow with file size beyond the compact family/link tuples
+kept until the end. INDI records are staged straight into Parquet files, and
+everything is bulk-loaded from them instead of with per-row CREATEs:
+1. Person, Event and Place rows are created with LOAD FROM and an `import_key`
+   ("<batch>:<xref>" for people), then read back to map keys to SERIAL ids;
+2. PARENT_OF, ADOPTED_BY, MARRIED_TO, PARTICIPATED_IN and LIVED_AT are staged
+   with those ids and copied.
+The load and the closure rows for the new people are one write_queue
+mutation, so one transaction; the kinship index is reloaded inside it (and
+again if it rolls back), the graph caches afterwards.
+
+Export walks Person ids in fixed-size ranges, writing each range's INDI
+records followed by the FAM records "owned" by those people. Each of its
+queries fetches a larger id window at a time (id range filters let Kuzu skip
+the rest of the table), and the ranges are taken from those results in step,
+so neither Kuzu nor Python holds more than a window of rows per query however
+large the tree is. Families are derived, not stored: a family is a parent
+couple (or single parent) keyed by the sorted parent ids, formed from
+MARRIED_TO pairs and from the parents each child shares; it is written by its
+lowest-id parent.
+
+Usage: python gedcom.py import FILE.ged
+       python gedcom.py export FILE.ged
+"""
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from database import get_db_connection, transaction, write_queue
+from graph_index import reload_kinship_index
+from closure import closure_bulk_load
+from graph_cache import invalidate_graph
+from duplicates import reset_duplicates
+
+# Rows buffered per Parquet row group while staging
+STAGE_BATCH = 50000
+
+# Person id range formatted per chunk of output
+EXPORT_BATCH = 1000
+
+# Person id window each export query fetches at a time (Kuzu materializes a
+# whole result, so this bounds the rows held per stream)
+EXPORT_PAGE = 20000
+
+# GEDCOM 5.5.1 caps lines at 255 characters; longer values continue with CONC
+MAX_LINE_VALUE = 200
+
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+GENDERS = {"M": "Male", "F": "Female", "X": "Other"}
+
+# INDI event tags imported as Event nodes: tag -> (Event.type, description)
+EVENT_TAGS = {
+    "GRAD": ("GRADUATION", None),
+    "MILI": ("MILITARY_SERVICE", None),
+    "_MILT": ("MILITARY_SERVICE", None),
+    "IMMI": ("IMMIGRATION", "Immigration"),
+    "EMIG": ("IMMIGRATION", "Emigration"),
+    "NATU": ("IMMIGRATION", "Naturalization"),
+    "RETI": ("RETIREMENT", None),
+    "BAPM": ("OTHER", "Baptism"),
+    "CHR": ("OTHER", "Christening"),
+    "CONF": ("OTHER", "Confirmation"),
+    "BARM": ("OTHER", "Bar mitzvah"),
+    "BASM": ("OTHER", "Bat mitzvah"),
+    "BURI": ("OTHER", "Burial"),
+    "CREM": ("OTHER", "Cremation"),
+    "EDUC": ("OTHER", "Education"),
+    "CENS": ("OTHER", "Census"),
+    "PROB": ("OTHER", "Probate"),
+    "WILL": ("OTHER", "Will"),
+    "EVEN": ("OTHER", None),
+}
+
+PERSON_COLUMNS = ["import_key", "name", "gender", "birth_date", "birth_place",
+                  "death_date", "death_place", "bio", "maiden_name"]
+EVENT_COLUMNS = ["import_key", "type", "event_date", "description", "location"]
+
+
+# --- parsing ---
+
+def read_records(lines):
+    """
+    Yield level-0 records one at a time as [tag, xref, value, children] trees
+    (children are the same shape). CONC/CONT lines are folded into their parent.
+    """
+    record = None
+    stack = []
+    for raw in lines:
+        # "LEVEL [@XREF@] TAG [VALUE]"; split() is much faster than a regex here
+        parts = raw.rstrip("\r\n").lstrip("\ufeff \t").split(" ", 2)
+        if len(parts) < 2 or not parts[0].isdigit():
+            continue
+        level = int(parts[0])
+        if parts[1].startswith("@"):
+            if len(parts) < 3:
+                continue
+            tag, _, value = parts[2].partition(" ")
+            node = [tag.upper(), parts[1], value, []]
+        else:
+            node = [parts[1].upper(), None, parts[2] if len(parts) > 2 else "", []]
+
+        if level == 0:
+            if record is not None:
+                yield record
+            record = node
+            stack = [node]
+            continue
+        if record is None or level > len(stack):
+            continue  # orphan line or skipped level
+
+        if node[0] in ("CONC", "CONT"):
+            parent = stack[level - 1]
+            parent[2] += ("\n" if node[0] == "CONT" else "") + node[2]
+            continue
+        del stack[level:]
+        stack[-1][3].append(node)
+        stack.append(node)
+
+    if record is not None:
+        yield record
+
+
+def open_gedcom(binary):
+    """Text stream over a binary GEDCOM file (UTF-8 with or without BOM, or UTF-16)."""
+    head = binary.read(2)
+    binary.seek(0)
+    encoding = "utf-16" if head in (b"\xff\xfe", b"\xfe\xff") else "utf-8-sig"
+    return io.TextIOWrapper(binary, encoding=encoding, errors="replace", newline="")
+
+
+def _child(node, tag):
+    for child in node[3]:
+        if child[0] == tag:
+            return child
+    return None
+
+
+def _value(node, tag):
+    child = _child(node, tag) if node else None
+    return child[2].strip() or None if child else None
+
+
+def gedcom_date(value):
+    """ "12 MAR 1900" -> "1900-03-12", "MAR 1900" -> "1900-03"; anything else as given."""
+    if not value:
+        return None
+    match = re.fullmatch(r"(?:(\d{1,2}) )?(?:([A-Z]{3}) )?(\d{3,4})", value.strip().upper())
+    if not match or (match.group(1) and not match.group(2)) or (match.group(2) and match.group(2) not in MONTHS):
+        return value.strip()
+    day, month, year = match.groups()
+    date = year.zfill(4)
+    if month:
+        date += f"-{MONTHS.index(month) + 1:02d}"
+        if day:
+            date += f"-{int(day):02d}"
+    return date
+
+
+def _split_name(value):
+    # "John /Smith/ Jr." -> ("John Smith Jr.", "Smith")
+    surname = re.search(r"/([^/]*)/", value)
+    name = " ".join(value.replace("/", " ").split())
+    return name, (surname.group(1).strip() or None) if surname else None
+
+
+def _person_row(key, record):
+    names = []
+    for node in record[3]:
+        if node[0] == "NAME":
+            name, surname = _split_name(node[2])
+            if not name:
+                given, surname = _value(node, "GIVN"), _value(node, "SURN")
+                name = " ".join(p for p in (given, surname) if p)
+            names.append((name, surname, (_value(node, "TYPE") or "").lower()))
+
+    # A married name becomes the display name, the birth surname the maiden name
+    birth = next((n for n in names if n[2] != "married"), names[0] if names else (None, None, ""))
+    married = next((n for n in names if n[2] == "married"), None)
+    name, maiden = birth[0], None
+    if married:
+        name = married[0]
+        if birth[1] and birth[1] != married[1]:
+            maiden = birth[1]
+
+    notes = [n[2].strip() for n in record[3] if n[0] == "NOTE" and n[2].strip() and not n[2].startswith("@")]
+    birth_event, death_event = _child(record, "BIRT"), _child(record, "DEAT")
+    return {
+        "import_key": key,
+        "name": name or "Unknown",
+        "gender": GENDERS.get((_value(record, "SEX") or "").upper()[:1]),
+        "birth_date": gedcom_date(_value(birth_event, "DATE")),
+        "birth_place": _value(birth_event, "PLAC"),
+        "death_date": gedcom_date(_value(death_event, "DATE")),
+        "death_place": _value(death_event, "PLAC"),
+        "bio": "\n\n".join(notes) or None,
+        "maiden_name": maiden
+    }
+
+
+# --- staging ---
+
+class _ParquetStage:
+    """Append rows to a Parquet file in row groups of STAGE_BATCH."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        self._buffer = {name: [] for name in schema.names}
+        self._writer = None
+
+    def append(self, row):
+        for name, column in self._buffer.items():
+            column.append(row.get(name))
+        self.rows += 1
+        if len(self._buffer[self.schema.names[0]]) >= STAGE_BATCH:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer[self.schema.names[0]]:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, self.schema)
+        self._writer.write_table(pa.table(self._buffer, schema=self.schema))
+        self._buffer = {name: [] for name in self.schema.names}
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _strings(names):
+    return pa.schema([(name, pa.string()) for name in names])
+
+
+def _rel_schema(*properties):
+    return pa.schema([("from", pa.int64()), ("to", pa.int64())] + [(p, pa.string()) for p in properties])
+
+
+def _copy(conn, table, stage):
+    stage.close()
+    if not stage.rows:
+        return
+    conn.execute(f'COPY {table} FROM "{stage.path}"')
+
+
+def _create_nodes(conn, table, stage, columns):
+    # LOAD FROM ... CREATE rather than COPY: Kuzu (0.11) corrupts a non-empty
+    # node table when a transaction that COPYed into it rolls back
+    stage.close()
+    if not stage.rows:
+        return
+    properties = ", ".join(f"{column}: {column}" for column in columns)
+    conn.execute(f'LOAD FROM "{stage.path}" CREATE (:{table} {{{properties}}})')
+
+
+def _key_map(conn, table, prefix):
+    result = conn.execute(
+        f"MATCH (n:{table}) WHERE n.import_key STARTS WITH $prefix RETURN n.import_key, n.id",
+        parameters={"prefix": prefix}
+    )
+    mapping = {}
+    while result.has_next():
+        key, node_id = result.get_next()
+        mapping[key] = node_id
+    return mapping
+
+
+# --- import ---
+
+def import_gedcom(lines):
+    """Import GEDCOM text lines into Kuzu; returns counts and timings."""
+    started = time.perf_counter()
+    batch = uuid.uuid4().hex[:12]
+    prefix = f"{batch}:"
+
+    families = []       # (fam xref, husband xref, wife xref, [(child xref, father rel, mother rel)], married, divorced)
+    pedigree = {}       # (child xref, fam xref) -> (set of adoptive roles, adoption date)
+    events = []         # (event key, person key)
+    residences = []     # (person key, place name, date)
+    records = 0
+
+    with tempfile.TemporaryDirectory() as staging:
+        people = _ParquetStage(os.path.join(staging, "person.parquet"), _strings(PERSON_COLUMNS))
+        event_rows = _ParquetStage(os.path.join(staging, "event.parquet"), _strings(EVENT_COLUMNS))
+
+        for record in read_records(lines):
+            records += 1
+            tag, xref = record[0], record[1]
+            if tag == "INDI" and xref:
+                key = prefix + xref
+                people.append(_person_row(key, record))
+                for node in record[3]:
+                    if node[0] == "FAMC" and node[2].startswith("@"):
+                        if (_value(node, "PEDI") or "").lower() == "adopted":
+                            pedigree[(xref, node[2])] = ({"HUSB", "WIFE"}, None)
+                    elif node[0] == "ADOP":
+                        famc = _child(node, "FAMC")
+                        if famc and famc[2].startswith("@"):
+                            who = (_value(famc, "ADOP") or "BOTH").upper()
+                            roles = {"HUSB", "WIFE"} if who == "BOTH" else {who}
+                            pedigree[(xref, famc[2])] = (roles, gedcom_date(_value(node, "DATE")))
+                    elif node[0] == "RESI":
+                        place = _value(node, "PLAC") or _value(node, "ADDR")
+                        if place:
+                            residences.append((key, place, gedcom_date(_value(node, "DATE"))))
+                    elif node[0] in EVENT_TAGS:
+                        event_type, label = EVENT_TAGS[node[0]]
+                        event_key = f"{prefix}E{len(events)}"
+                        description = _value(node, "TYPE") or node[2].strip() or label
+                        event_rows.append({
+                            "import_key": event_key,
+                            "type": event_type,
+                            "event_date": gedcom_date(_value(node, "DATE")),
+                            "description": description,
+                            "location": _value(node, "PLAC")
+                        })
+                        events.append((event_key, key))
+            elif tag == "FAM" and xref:
+                children = [
+                    (node[2], (_value(node, "_FREL") or "").lower(), (_value(node, "_MREL") or "").lower())
+                    for node in record[3] if node[0] == "CHIL"
+                ]
+                families.append((
+                    xref, _value(record, "HUSB"), _value(record, "WIFE"), children,
+                    gedcom_date(_value(_child(record, "MARR"), "DATE")),
+                    gedcom_date(_value(_child(record, "DIV"), "DATE"))
+                ))
+
+        # Everything is loaded as one writer mutation, so in one transaction: a
+        # failed import leaves nothing behind
+        def load(conn):
+            # 1. Nodes, then their SERIAL ids
+            _create_nodes(conn, "Person", people, PERSON_COLUMNS)
+            person_ids = {key[len(prefix):]: pid for key, pid in _key_map(conn, "Person", prefix).items()}
+
+            # 2. Kinship edges
+            parent_of = _ParquetStage(os.path.join(staging, "parent_of.parquet"), _rel_schema())
+            adopted_by = _ParquetStage(os.path.join(staging, "adopted_by.parquet"), _rel_schema("adoption_date"))
+            married_to = _ParquetStage(os.path.join(staging, "married_to.parquet"), _rel_schema("start_date", "end_date"))
+            seen = set()
+            for fam, husband, wife, children, married, divorced in families:
+                h, w = person_ids.get(husband), person_ids.get(wife)
+                if h is not None and w is not None and h != w:
+                    married_to.append({"from": h, "to": w, "start_date": married, "end_date": divorced})
+                for child, father_rel, mother_rel in children:
+                    c = person_ids.get(child)
+                    if c is None:
+                        continue
+                    roles, adoption_date = pedigree.get((child, fam), (set(), None))
+                    for role, parent, rel in (("HUSB", h, father_rel), ("WIFE", w, mother_rel)):
+                        if parent is None or parent == c or (parent, c) in seen:
+                            continue
+                        seen.add((parent, c))
+                        if role in roles or rel.startswith("adopt"):
+                            adopted_by.append({"from": parent, "to": c, "adoption_date": adoption_date})
+                        else:
+                            parent_of.append({"from": parent, "to": c})
+            for table, stage in (("PARENT_OF", parent_of), ("ADOPTED_BY", adopted_by), ("MARRIED_TO", married_to)):
+                _copy(conn, table, stage)
+
+            # 3. Events and residences
+            _create_nodes(conn, "Event", event_rows, EVENT_COLUMNS)
+            event_ids = _key_map(conn, "Event", prefix)
+            participated = _ParquetStage(os.path.join(staging, "participated_in.parquet"), _rel_schema("role"))
+            for event_key, person_key in events:
+                participated.append({"from": person_ids[person_key[len(prefix):]], "to": event_ids[event_key]})
+            _copy(conn, "PARTICIPATED_IN", participated)
+
+            place_keys = {}
+            place_rows = _ParquetStage(os.path.join(staging, "place.parquet"), _strings(["import_key", "name"]))
+            for _, place, _ in residences:
+                if place not in place_keys:
+                    place_keys[place] = f"{prefix}P{len(place_keys)}"
+                    place_rows.append({"import_key": place_keys[place], "name": place})
+            _create_nodes(conn, "Place", place_rows, ["import_key", "name"])
+            place_ids = _key_map(conn, "Place", prefix)
+            lived_at = _ParquetStage(
+                os.path.join(staging, "lived_at.parquet"),
+                _rel_schema("start_date", "end_date", "residence_type")
+            )
+            for person_key, place, date in residences:
+                lived_at.append({
+                    "from": person_ids[person_key[len(prefix):]],
+                    "to": place_ids[place_keys[place]],
+                    "start_date": date
+                })
+            _copy(conn, "LIVED_AT", lived_at)
+
+            loaded = time.perf_counter()
+
+            # 4. Derived state, refreshed once for the whole import (the closure
+            # rows commit with the rest)
+            write_queue.on_rollback(reload_kinship_index, conn)
+            index = reload_kinship_index(conn)
+            closure_bulk_load(conn, index, person_ids.values(), staging)
+            return loaded, {
+                "parent_edges": parent_of.rows,
+                "adoptions": adopted_by.rows,
+                "marriages": married_to.rows,
+                "places": place_rows.rows,
+                "residences": lived_at.rows
+            }
+
+        try:
+            loaded, counts = write_queue.run(load)
+        finally:
+            invalidate_graph()
+            reset_duplicates()
+
+    load_seconds = loaded - started
+    return {
+        "batch": batch,
+        "records": records,
+        "people": people.rows,
+        "families": len(families),
+        "parent_edges": counts["parent_edges"],
+        "adoptions": counts["adoptions"],
+        "marriages": counts["marriages"],
+        "events": event_rows.rows,
+        "places": counts["places"],
+        "residences": counts["residences"],
+        # Parsing and COPY of the records themselves vs. rebuilding index and closure
+        "load_seconds": round(load_seconds, 3),
+        "derived_seconds": round(time.perf_counter() - loaded, 3),
+        "records_per_second": round(records / load_seconds) if load_seconds else None
+    }
+
+
+
+# --- export ---
+
+EXPORT_SEX = {"male": "M", "m": "M", "female": "F", "f": "F"}
+
+# Event.type -> GEDCOM tag (OTHER goes out as EVEN with a TYPE)
+EXPORT_EVENT_TAGS = {
+    "GRADUATION": "GRAD",
+    "MILITARY_SERVICE": "_MILT",
+    "IMMIGRATION": "IMMI",
+    "RETIREMENT": "RETI",
+}
+
+# Each query fetches one id window [lo, hi), ordered by the person id in its
+# first column, and is consumed one id range at a time (see _Stream)
+EXPORT_QUERIES = {
+    "people": """
+        MATCH (p:Person)
+        WHERE p.id >= $lo AND p.id < $hi
+        RETURN p.id, p.name, p.gender, p.birth_date, p.birth_place, p.death_date, p.death_place, p.bio, p.maiden_name
+        ORDER BY p.id
+    """,
+    # Parents of each person (their FAMC)
+    "parents": """
+        MATCH (par:Person)-[r:PARENT_OF|ADOPTED_BY]->(c:Person)
+        WHERE c.id >= $lo AND c.id < $hi
+        RETURN c.id, par.id, label(r), r.adoption_date
+        ORDER BY c.id
+    """,
+    # Children of each person with the child's other parent(s) of the same kind
+    "children": """
+        MATCH (p:Person)-[r:PARENT_OF|ADOPTED_BY]->(c:Person)
+        WHERE p.id >= $lo AND p.id < $hi
+        OPTIONAL MATCH (o:Person)-[r2:PARENT_OF|ADOPTED_BY]->(c)
+        WHERE o.id <> p.id AND label(r2) = label(r)
+        RETURN p.id, c.id, label(r), collect({id: o.id, gender: o.gender})
+        ORDER BY p.id, c.id
+    """,
+    "spouses": """
+        MATCH (p:Person)-[m:MARRIED_TO]-(s:Person)
+        WHERE p.id >= $lo AND p.id < $hi
+        RETURN p.id, s.id, s.gender, m.start_date, m.end_date
+        ORDER BY p.id
+    """,
+    "events": """
+        MATCH (p:Person)-[:PARTICIPATED_IN]->(e:Event)
+        WHERE p.id >= $lo AND p.id < $hi
+        RETURN p.id, e.type, e.event_date, e.description, e.location
+        ORDER BY p.id, e.id
+    """,
+    "residences": """
+        MATCH (p:Person)-[l:LIVED_AT]->(pl:Place)
+        WHERE p.id >= $lo AND p.id < $hi
+        RETURN p.id, pl.name, pl.city, pl.state, pl.country, l.start_date
+        ORDER BY p.id, pl.id
+    """,
+}
+
+
+def export_date(value):
+    """ "1900-03-12" -> "12 MAR 1900", "1900-03" -> "MAR 1900"; anything else as stored."""
+    if not value:
+        return None
+    match = re.fullmatch(r"(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?", value.strip())
+    if not match or (match.group(2) and not 1 <= int(match.group(2)) <= 12):
+        return value.strip()
+    year, month, day = match.groups()
+    parts = [str(int(day))] if day else []
+    if month:
+        parts.append(MONTHS[int(month) - 1])
+    return " ".join(parts + [year])
+
+
+def _line(level, tag, value=None, xref=None):
+    """One GEDCOM line plus CONT/CONC continuations for newlines and long values."""
+    head = f"{level} {xref} {tag}" if xref else f"{level} {tag}"
+    if value is None or value == "":
+        return head + "\n"
+    out = []
+    for n, text in enumerate(str(value).split("\n")):
+        chunks = [text[i:i + MAX_LINE_VALUE] for i in range(0, len(text), MAX_LINE_VALUE)] or [""]
+        for m, chunk in enumerate(chunks):
+            if n == 0 and m == 0:
+                out.append(f"{head} {chunk}")
+            else:
+                out.append(f"{level + 1} {'CONC' if m else 'CONT'} {chunk}".rstrip())
+    return "\n".join(out) + "\n"
+
+
+def _family_xref(parent_ids):
+    parents = sorted(set(parent_ids))[:2]
+    return "@F" + "_".join(str(p) for p in parents) + "@", tuple(parents)
+
+
+def _split_for_gedcom(name, surname=None):
+    # "Mary Smith" -> "Mary /Smith/"; with an explicit surname, swap it in
+    words = (name or "").split()
+    if not words:
+        return f"/{surname}/" if surname else ""
+    given = " ".join(words[:-1]) if len(words) > 1 else words[0]
+    last = surname or (words[-1] if len(words) > 1 else "")
+    return f"{given} /{last}/" if last else given
+
+
+class _Stream:
+    """
+    One export query's rows, ordered by person id, taken one id range at a
+    time. The query runs once per EXPORT_PAGE window of ids, not per range.
+    """
+
+    def __init__(self, conn, key):
+        self._conn = conn
+        self._query = EXPORT_QUERIES[key]
+        self._fetched = 0  # ids below this have been queried
+        self._result = None
+        self._next = None
+
+    def _advance(self):
+        self._next = self._result.get_next() if self._result.has_next() else None
+
+    def until(self, hi):
+        """Yield the rows whose person id is below `hi` (fully consume before the next call)."""
+        while True:
+            while self._next is not None and self._next[0] < hi:
+                row = self._next
+                self._advance()
+                yield row
+            if self._next is not None or self._fetched >= hi:
+                return
+            # This window is used up; fetch the next one (covering at least `hi`)
+            lo, self._fetched = self._fetched, max(hi, self._fetched + EXPORT_PAGE)
+            self._result = self._conn.execute(self._query, parameters={"lo": lo, "hi": self._fetched})
+            self._advance()
+
+
+def _export_range(streams, hi):
+    """GEDCOM text for the next INDI records (ids below `hi`) and the FAM records they own."""
+    people = list(streams["people"].until(hi))
+    if not people:
+        return ""
+
+    famc = {}    # child -> {kind: [parent ids]}
+    adoption_dates = {}
+    for child, parent, label, adoption_date in streams["parents"].until(hi):
+        famc.setdefault(child, {}).setdefault(label, []).append(parent)
+        if adoption_date:
+            adoption_dates[child] = adoption_date
+
+    fams = {}    # person -> {family xref, ...}
+    owned = {}   # family xref -> {"parents", "children": [(child, label)], "married", "divorced"}
+    genders = {row[0]: row[2] for row in people}
+    # Partners outside this range decide HUSB/WIFE too, so their genders come along
+    # FAM records come out in order of their first child
+    for pid, child, label, others in sorted(streams["children"].until(hi), key=lambda row: row[1]):
+        others = [o for o in (others or []) if o["id"] is not None]
+        genders.update((o["id"], o["gender"]) for o in others)
+        xref, parents = _family_xref([pid] + [o["id"] for o in others])
+        if pid not in parents:
+            continue  # third parent of the same kind; the family is the first two
+        fams.setdefault(pid, set()).add(xref)
+        if parents[0] == pid:
+            family = owned.setdefault(xref, {"parents": parents, "children": [], "married": None, "divorced": None})
+            family["children"].append((child, label))
+    for pid, spouse, spouse_gender, married, divorced in streams["spouses"].until(hi):
+        genders[spouse] = spouse_gender
+        xref, parents = _family_xref([pid, spouse])
+        fams.setdefault(pid, set()).add(xref)
+        if parents[0] == pid:
+            family = owned.setdefault(xref, {"parents": parents, "children": [], "married": None, "divorced": None})
+            family["married"] = family["married"] or married
+            family["divorced"] = family["divorced"] or divorced
+
+    events = {}
+    for pid, event_type, event_date, description, location in streams["events"].until(hi):
+        events.setdefault(pid, []).append((event_type, event_date, description, location))
+    residences = {}
+    for pid, name, city, state, country, start_date in streams["residences"].until(hi):
+        place = name or ", ".join(p for p in (city, state, country) if p)
+        residences.setdefault(pid, []).append((place, start_date))
+
+    out = []
+    for pid, name, gender, birth_date, birth_place, death_date, death_place, bio, maiden_name in people:
+        out.append(_line(0, "INDI", xref=f"@I{pid}@"))
+        if maiden_name:
+            # Birth name first, then the married name the person is shown under
+            out.append(_line(1, "NAME", _split_for_gedcom(name, maiden_name)))
+            out.append(_line(1, "NAME", _split_for_gedcom(name)))
+            out.append(_line(2, "TYPE", "married"))
+        else:
+            out.append(_line(1, "NAME", _split_for_gedcom(name)))
+        out.append(_line(1, "SEX", EXPORT_SEX.get((gender or "").lower(), "U")))
+        for tag, date, place in (("BIRT", birth_date, birth_place), ("DEAT", death_date, death_place)):
+            if date or place:
+                out.append(_line(1, tag))
+                if date:
+                    out.append(_line(2, "DATE", export_date(date)))
+                if place:
+                    out.append(_line(2, "PLAC", place))
+        for event_type, event_date, description, location in events.get(pid, ()):
+            tag = EXPORT_EVENT_TAGS.get(event_type, "EVEN")
+            out.append(_line(1, tag))
+            if tag == "EVEN" and description:
+                out.append(_line(2, "TYPE", description))
+            if event_date:
+                out.append(_line(2, "DATE", export_date(event_date)))
+            if location:
+                out.append(_line(2, "PLAC", location))
+            if tag != "EVEN" and description:
+                out.append(_line(2, "NOTE", description))
+        for place, start_date in residences.get(pid, ()):
+            out.append(_line(1, "RESI"))
+            if start_date:
+                out.append(_line(2, "DATE", export_date(start_date)))
+            out.append(_line(2, "PLAC", place))
+        for label, parents in famc.get(pid, {}).items():
+            xref, _ = _family_xref(parents)
+            out.append(_line(1, "FAMC", xref))
+            if label == "ADOPTED_BY":
+                out.append(_line(2, "PEDI", "adopted"))
+        if "ADOPTED_BY" in famc.get(pid, {}):
+            xref, _ = _family_xref(famc[pid]["ADOPTED_BY"])
+            out.append(_line(1, "ADOP"))
+            if adoption_dates.get(pid):
+                out.append(_line(2, "DATE", export_date(adoption_dates[pid])))
+            out.append(_line(2, "FAMC", xref))
+            out.append(_line(3, "ADOP", "BOTH"))
+        for xref in sorted(fams.get(pid, ())):
+            out.append(_line(1, "FAMS", xref))
+        if bio:
+            out.append(_line(1, "NOTE", bio))
+
+    for xref, family in owned.items():
+        parents = list(family["parents"])
+        if EXPORT_SEX.get((genders.get(parents[0]) or "").lower()) == "F":
+            parents.reverse()
+        out.append(_line(0, "FAM", xref=xref))
+        roles = ["HUSB", "WIFE"]
+        if len(parents) == 1 and EXPORT_SEX.get((genders.get(parents[0]) or "").lower()) == "F":
+            roles = ["WIFE"]
+        for role, parent in zip(roles, parents):
+            out.append(_line(1, role, f"@I{parent}@"))
+        for child, label in family["children"]:
+            out.append(_line(1, "CHIL", f"@I{child}@"))
+            if label == "ADOPTED_BY":
+                out.append(_line(2, "_FREL", "Adopted"))
+                out.append(_line(2, "_MREL", "Adopted"))
+        if family["married"]:
+            out.append(_line(1, "MARR"))
+            out.append(_line(2, "DATE", export_date(family["married"])))
+        if family["divorced"]:
+            out.append(_line(1, "DIV"))
+            out.append(_line(2, "DATE", export_date(family["divorced"])))
+    return "".join(out)
+
+
+def export_gedcom(conn):
+    """
+    Yield the whole tree as GEDCOM 5.5.1 text, one id range at a time. Run it
+    inside a read-only transaction so the streams see one snapshot.
+    """
+    yield (
+        _line(0, "HEAD")
+        + _line(1, "SOUR", "graph-family-tree")
+        + _line(1, "GEDC") + _line(2, "VERS", "5.5.1") + _line(2, "FORM", "LINEAGE-LINKED")
+        + _line(1, "CHAR", "UTF-8")
+    )
+    result = conn.execute("MATCH (p:Person) RETURN max(p.id)")
+    max_id = result.get_next()[0] if result.has_next() else None
+    if max_id is not None:
+        streams = {key: _Stream(conn, key) for key in EXPORT_QUERIES}
+        for lo in range(0, max_id + 1, EXPORT_BATCH):
+            chunk = _export_range(streams, lo + EXPORT_BATCH)
+            if chunk:
+                yield chunk
+    yield _line(0, "TRLR")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python gedcom.py import|export FILE.ged")
+        sys.exit(1)
+    from schema import create_schema
+    create_schema()
+    db, conn = get_db_connection()
+    if sys.argv[1] == "import":
+        with open(sys.argv[2], "rb") as f:
+            print(import_gedcom(open_gedcom(f)))
+    else:
+        with open(sys.argv[2], "w", encoding="utf-8") as f, transaction(conn, read_only=True):
+            for chunk in export_gedcom(conn):
+                f.write(chunk)
@@ -0,0 +1,144 @@
+"""
+Graph version counter and cache of serialized /relationships/graph payloads.
+
+Every mutating route in routers/people.py and routers/relationships.py calls
+bump_graph_version(). The version doubles as a strong ETag for the graph
+payloads, and the last serialized payloads are kept in memory until it changes,
+so repeat requests cost no database work.
+
+Payloads can also be kept precompressed (gzip / brotli), negotiated from
+Accept-Encoding, so compression is paid once per graph version.
+
+Each bump can record the graph changes it made (node/edge adds, removes and
+node property updates) in a bounded journal, keyed by version as sequence
+number, so clients holding a cached graph can catch up with small diffs.
+"""
+import gzip
+import threading
+import time
+from collections import deque
+import brotli
+
+# Serialized payloads kept per version (one per query/format/encoding variant)
+MAX_CACHED_PAYLOADS = 32
+
+# Compression effort; payloads are compressed once per version, not per request
+BROTLI_QUALITY = 9
+GZIP_LEVEL = 9
+
+# Change journal entries kept before the oldest are dropped
+MAX_JOURNAL = 10000
+
+# Start from wall-clock milliseconds so versions (and ETags) keep increasing
+# across restarts instead of repeating from 0 with different data.
+_version = time.time_ns() // 1_000_000
+_payloads = {}  # variant -> bytes, all for the current _version
+_journal = deque()  # (seq, change) in seq order
+_journal_floor = _version  # changes at or before this seq are not in the journal
+_lock = threading.Lock()
+
+
+def get_graph_version():
+    return _version
+
+
+def bump_graph_version(*changes):
+    """
+    Start a new graph version and journal `changes` under it. A change is a dict:
+        {"op": "add_node" | "update_node", "node": {...}}
+        {"op": "remove_node", "id": ...}  (its edges go with it)
+        {"op": "add_edge" | "remove_edge", "edge": {"source", "target", "type"}}
+    """
+    global _version, _journal_floor
+    with _lock:
+        _version += 1
+        _payloads.clear()
+        for change in changes:
+            if len(_journal) >= MAX_JOURNAL:
+                _journal_floor = _journal.popleft()[0]
+            _journal.append((_version, change))
+        return _version
+
+
+def invalidate_graph():
+    """
+    Start a new graph version after a bulk change that was not journalled
+    (imports, restores): clients asking for changes get full_reload.
+    """
+    global _version, _journal_floor
+    with _lock:
+        _version += 1
+        _payloads.clear()
+        _journal.clear()
+        _journal_floor = _version
+        return _version
+
+
+def get_changes_since(since):
+    """
+    (version, changes) with every journalled change after `since`, or
+    (version, None) if `since` is older than the journal (or from another
+    process) and the client has to reload the whole graph.
+    """
+    with _lock:
+        if since < _journal_floor or since > _version:
+            return _version, None
+        changes = [{"seq": seq, **change} for seq, change in _journal if seq > since]
+        return _version, changes
+
+
+def make_etag(version, variant=""):
+    return f'"{version}-{variant}"' if variant else f'"{version}"'
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value covers `etag`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparison for If-None-Match is weak, so a W/ prefix is ignored
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def get_cached_payload(version, variant, build):
+    """
+    Serialized payload for `variant` at `version`, calling build() -> bytes on
+    a miss. Payloads built for a version that has since moved on are not kept.
+    """
+    with _lock:
+        if version == _version and variant in _payloads:
+            return _payloads[variant]
+
+    payload = build()
+
+    with _lock:
+        if version == _version:
+            if len(_payloads) >= MAX_CACHED_PAYLOADS:
+                _payloads.pop(next(iter(_payloads)))
+            _payloads[variant] = payload
+    return payload
+
+
+def pick_encoding(accept_encoding):
+    """Preferred precompressed encoding ("br", "gzip") allowed by Accept-Encoding, or None."""
+    accepted = set()
+    for token in (accept_encoding or "").split(","):
+        name, _, params = token.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    if "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress_payload(payload, encoding):
+    if encoding == "br":
+        return brotli.compress(payload, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(payload, compresslevel=GZIP_LEVEL)
+    return payload
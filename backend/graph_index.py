@@ -0,0 +1,602 @@
+"""
+In-process adjacency index of the kinship graph (PARENT_OF, ADOPTED_BY, MARRIED_TO).
+
+The graph is kept as compressed-sparse-row (CSR) arrays: for every relation an
+int32 `offsets` array (one slot per person + 1) and an int32 `targets` array, so
+the neighbours of person i are targets[offsets[i]:offsets[i + 1]]. Person.id is
+mapped to a dense row index on load.
+
+CSR arrays are expensive to patch in place, so writes go to a small overlay of
+added/removed edges that lookups merge on the fly. Once the overlay grows past
+COMPACT_THRESHOLD edges the CSR arrays are rebuilt from the merged view.
+
+Every person also carries a generation level with level(child) > level(parent)
+for every parent edge. A new edge p -> c can only close a cycle if c already
+reaches p, which needs level(c) < level(p); otherwise the check is O(1), and
+when it is not the search below c skips everyone at or past level(p).
+
+Connected components ("islands") over all kinship edges are tracked with a
+union-find: adding a person or edge is a near-O(1) union, while a removal
+can split a component, so it just marks the union-find stale and the next
+read rebuilds it from the edges.
+"""
+import threading
+import time
+import numpy as np
+from database import connection
+
+# Edge kinds stored alongside parent/child targets
+PARENT_OF = 0
+ADOPTED_BY = 1
+MARRIED_TO = 2
+KIND_LABELS = ("PARENT_OF", "ADOPTED_BY", "MARRIED_TO")
+
+# Rebuild the CSR arrays once this many edges have been patched in or out
+COMPACT_THRESHOLD = 1024
+
+_EMPTY_TARGETS = np.zeros(0, dtype=np.int32)
+_EMPTY_KINDS = np.zeros(0, dtype=np.int8)
+
+
+class CycleError(ValueError):
+    """Raised for a parent edge that would make someone their own ancestor."""
+
+
+def kind_from_label(label):
+    return KIND_LABELS.index(label)
+
+
+class _CSR:
+    """One relation in CSR form plus its pending overlay."""
+
+    def __init__(self, n, src, dst, kinds):
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        kinds = np.asarray(kinds, dtype=np.int8)
+
+        # Sort by (src, dst) and drop duplicate pairs (Kuzu allows repeated rels)
+        order = np.lexsort((dst, src))
+        src, dst, kinds = src[order], dst[order], kinds[order]
+        if len(src):
+            keep = np.ones(len(src), dtype=bool)
+            keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+            src, dst, kinds = src[keep], dst[keep], kinds[keep]
+
+        self.offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=n), out=self.offsets[1:])
+        self.targets = dst.astype(np.int32)
+        self.kinds = kinds
+
+        self.added = {}    # src -> {dst: kind}
+        self.removed = {}  # src -> {dst, ...}
+        self.pending = 0
+
+    def row(self, i):
+        if i + 1 >= len(self.offsets):
+            return _EMPTY_TARGETS, _EMPTY_KINDS
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.targets[start:end], self.kinds[start:end]
+
+    def neighbours(self, i):
+        """Merged view of row i as {dst: kind}."""
+        targets, kinds = self.row(i)
+        removed = self.removed.get(i)
+        added = self.added.get(i)
+        if not removed and not added:
+            return dict(zip(targets.tolist(), kinds.tolist()))
+        result = {
+            t: k for t, k in zip(targets.tolist(), kinds.tolist())
+            if not removed or t not in removed
+        }
+        if added:
+            result.update(added)
+        return result
+
+    def add(self, i, j, kind):
+        self.added.setdefault(i, {})[j] = kind
+        self.pending += 1
+
+    def remove(self, i, j):
+        added = self.added.get(i)
+        if added:
+            added.pop(j, None)
+        self.removed.setdefault(i, set()).add(j)
+        self.pending += 1
+
+    def edges(self, n):
+        """All (src, dst, kind) triples of the merged view."""
+        src, dst, kinds = [], [], []
+        for i in range(n):
+            for j, k in self.neighbours(i).items():
+                src.append(i)
+                dst.append(j)
+                kinds.append(k)
+        return src, dst, kinds
+
+
+class KinshipIndex:
+    """
+    CSR index of parents, children and spouses keyed by Person.id.
+
+    All public methods take and return Person ids; dense row indices stay internal.
+    """
+
+    def __init__(self, person_ids, parent_edges, spouse_edges):
+        """
+        person_ids: iterable of Person.id
+        parent_edges: iterable of (parent_id, child_id, label) with label PARENT_OF / ADOPTED_BY
+        spouse_edges: iterable of (spouse1_id, spouse2_id)
+        """
+        self._lock = threading.RLock()
+        self._ids = []        # row index -> Person.id (None once deleted)
+        self._index_of = {}   # Person.id -> row index
+        # Bumped on every write, for caches derived from the index. Starts from
+        # wall-clock milliseconds so it never repeats across restarts (the
+        # layout ETag is built from it).
+        self.version = time.time_ns() // 1_000_000
+        self._level = []      # row index -> generation level (see module docstring)
+        self._uf = []         # row index -> union-find parent row
+        self._uf_stale = False
+        self._components = None  # (version, components()) cache
+
+        for pid in person_ids:
+            self._row(pid)
+
+        p_src, p_dst, p_kind = [], [], []
+        for parent_id, child_id, label in parent_edges:
+            p_src.append(self._row(parent_id))
+            p_dst.append(self._row(child_id))
+            p_kind.append(kind_from_label(label))
+
+        s_src, s_dst = [], []
+        for a, b in spouse_edges:
+            ia, ib = self._row(a), self._row(b)
+            # Spouses are undirected: store both directions
+            s_src += [ia, ib]
+            s_dst += [ib, ia]
+
+        n = len(self._ids)
+        self._children = _CSR(n, p_src, p_dst, p_kind)
+        self._parents = _CSR(n, p_dst, p_src, p_kind)
+        self._spouses = _CSR(n, s_src, s_dst, [MARRIED_TO] * len(s_src))
+        self._assign_levels()
+        self._rebuild_components()
+
+    # --- internal helpers ---
+
+    def _row(self, pid):
+        i = self._index_of.get(pid)
+        if i is None:
+            i = len(self._ids)
+            self._ids.append(pid)
+            self._index_of[pid] = i
+            self._level.append(0)
+            self._uf.append(i)
+        return i
+
+    def _assign_levels(self):
+        # Longest path from the roots (Kahn's algorithm)
+        n = len(self._ids)
+        pending = np.diff(self._parents.offsets).tolist()
+        order = [i for i in range(n) if pending[i] == 0]
+        for i in order:
+            for j in self._children.neighbours(i):
+                self._level[j] = max(self._level[j], self._level[i] + 1)
+                pending[j] -= 1
+                if pending[j] == 0:
+                    order.append(j)
+
+    def _raise_levels(self, start):
+        # Push levels down below `start` until level(child) > level(parent) again
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            for j in self._children.neighbours(i):
+                if self._level[j] <= self._level[i]:
+                    self._level[j] = self._level[i] + 1
+                    stack.append(j)
+
+    def _find(self, i):
+        uf = self._uf
+        while uf[i] != i:
+            uf[i] = uf[uf[i]]  # path halving
+            i = uf[i]
+        return i
+
+    def _union(self, i, j):
+        ri, rj = self._find(i), self._find(j)
+        if ri != rj:
+            # Keep the lower row as root so roots stay stable across unions
+            if ri < rj:
+                self._uf[rj] = ri
+            else:
+                self._uf[ri] = rj
+
+    def _rebuild_components(self):
+        self._uf = list(range(len(self._ids)))
+        n = len(self._ids)
+        for csr in (self._children, self._spouses):
+            for i in range(n):
+                for j in csr.neighbours(i):
+                    self._union(i, j)
+        self._uf_stale = False
+
+    def _labelled(self, neighbours):
+        return [(self._ids[j], KIND_LABELS[k]) for j, k in neighbours.items()]
+
+    def _changed(self):
+        self.version += 1
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        n = len(self._ids)
+        for name in ("_children", "_parents", "_spouses"):
+            csr = getattr(self, name)
+            if csr.pending >= COMPACT_THRESHOLD:
+                setattr(self, name, _CSR(n, *csr.edges(n)))
+
+    # --- reads ---
+
+    def __contains__(self, pid):
+        return pid in self._index_of
+
+    def person_ids(self):
+        with self._lock:
+            return list(self._index_of)
+
+    def parents(self, pid):
+        """[(parent_id, "PARENT_OF" | "ADOPTED_BY"), ...]"""
+        with self._lock:
+            i = self._index_of.get(pid)
+            return [] if i is None else self._labelled(self._parents.neighbours(i))
+
+    def children(self, pid):
+        """[(child_id, "PARENT_OF" | "ADOPTED_BY"), ...]"""
+        with self._lock:
+            i = self._index_of.get(pid)
+            return [] if i is None else self._labelled(self._children.neighbours(i))
+
+    def spouses(self, pid):
+        with self._lock:
+            i = self._index_of.get(pid)
+            return [] if i is None else [self._ids[j] for j in self._spouses.neighbours(i)]
+
+    def _walk(self, relation, pid, max_depth):
+        # Breadth-first, so each person is reported at its closest generation
+        with self._lock:
+            csr = getattr(self, relation)
+            start = self._index_of.get(pid)
+            if start is None:
+                return {}
+            depth_of = {start: 0}
+            frontier = [start]
+            depth = 0
+            while frontier and (max_depth is None or depth < max_depth):
+                depth += 1
+                next_frontier = []
+                for i in frontier:
+                    for j in csr.neighbours(i):
+                        if j not in depth_of:
+                            depth_of[j] = depth
+                            next_frontier.append(j)
+                frontier = next_frontier
+            del depth_of[start]
+            return {self._ids[j]: d for j, d in depth_of.items()}
+
+    def would_create_cycle(self, parent_id, child_id):
+        """True if adding parent_id -> child_id would make someone their own ancestor."""
+        with self._lock:
+            return self._closes_cycle(parent_id, child_id)
+
+    def _closes_cycle(self, parent_id, child_id):
+        if parent_id == child_id:
+            return True
+        p = self._index_of.get(parent_id)
+        c = self._index_of.get(child_id)
+        if p is None or c is None:
+            return False
+        limit = self._level[p]
+        if self._level[c] > limit:
+            return False
+        # Only people strictly above p's level can still lead down to p
+        seen = {c}
+        stack = [c]
+        while stack:
+            i = stack.pop()
+            for j in self._children.neighbours(i):
+                if j == p:
+                    return True
+                if j not in seen and self._level[j] < limit:
+                    seen.add(j)
+                    stack.append(j)
+        return False
+
+    def first_cycle(self, parent_edges):
+        """
+        Position of the first (parent_id, child_id) in `parent_edges` that would
+        close a cycle together with the edges before it, or None. The index is
+        not modified; pending edges and the levels they raise live in overlays.
+        """
+        with self._lock:
+            extra = {}   # row -> [child rows] from earlier edges in the batch
+            raised = {}  # row -> level after the earlier edges
+
+            def level(i):
+                return raised.get(i, self._level[i])
+
+            def children(i):
+                yield from self._children.neighbours(i)
+                yield from extra.get(i, ())
+
+            for n, (parent_id, child_id) in enumerate(parent_edges):
+                if parent_id == child_id:
+                    return n
+                p = self._index_of.get(parent_id)
+                c = self._index_of.get(child_id)
+                if p is None or c is None:
+                    continue
+                limit = level(p)
+                if level(c) <= limit:
+                    # Same search as would_create_cycle, over index + batch edges
+                    seen = {c}
+                    stack = [c]
+                    while stack:
+                        i = stack.pop()
+                        for j in children(i):
+                            if j == p:
+                                return n
+                            if j not in seen and level(j) < limit:
+                                seen.add(j)
+                                stack.append(j)
+                extra.setdefault(p, []).append(c)
+                if level(c) <= level(p):
+                    raised[c] = level(p) + 1
+                    stack = [c]
+                    while stack:
+                        i = stack.pop()
+                        for j in children(i):
+                            if level(j) <= level(i):
+                                raised[j] = level(i) + 1
+                                stack.append(j)
+            return None
+
+    def _hops(self, i, kinds):
+        # (neighbour, kind, step) for every edge of an allowed kind, step being
+        # what the neighbour is to i: "parent", "child" or "spouse"
+        for step, csr in (("parent", self._parents), ("child", self._children), ("spouse", self._spouses)):
+            for j, k in csr.neighbours(i).items():
+                if k in kinds:
+                    yield j, k, step
+
+    def shortest_path(self, source_id, target_id, kinds=(PARENT_OF, ADOPTED_BY, MARRIED_TO)):
+        """
+        Shortest chain of kinship edges from source_id to target_id, using only
+        edges whose kind is in `kinds`, as [(person_id, kind_label, step), ...]
+        where each entry is what person_id is to the one before it (the first
+        entry is (source_id, None, None)). None if they are not connected.
+
+        Bidirectional breadth-first search: always expands the smaller frontier
+        one full layer at a time and stops after the first layer in which the
+        two searches meet, so it only explores around both ends.
+        """
+        with self._lock:
+            s = self._index_of.get(source_id)
+            t = self._index_of.get(target_id)
+            if s is None or t is None:
+                return None
+            if s == t:
+                return [(source_id, None, None)]
+            kinds = set(kinds)
+
+            # row -> (previous row, kind, step from previous to row); None at the roots
+            prev = ({s: None}, {t: None})
+            dist = ({s: 0}, {t: 0})
+            frontier = ([s], [t])
+            meet = None
+            while frontier[0] and frontier[1] and meet is None:
+                side = 0 if len(frontier[0]) <= len(frontier[1]) else 1
+                seen, other = prev[side], prev[1 - side]
+                near, far = dist[side], dist[1 - side]
+                best = None
+                next_frontier = []
+                for i in frontier[side]:
+                    for j, k, step in self._hops(i, kinds):
+                        if j in seen:
+                            continue
+                        seen[j] = (i, k, step)
+                        near[j] = near[i] + 1
+                        next_frontier.append(j)
+                        # Meets within one layer can differ in length on the far side
+                        if j in other and (best is None or far[j] < best):
+                            meet, best = j, far[j]
+                frontier = (next_frontier, frontier[1]) if side == 0 else (frontier[0], next_frontier)
+
+            if meet is None:
+                return None
+
+            # Walk back to the source, then forward to the target (flipping steps)
+            flip = {"parent": "child", "child": "parent", "spouse": "spouse"}
+            path = []
+            i = meet
+            while prev[0][i] is not None:
+                j, k, step = prev[0][i]
+                path.append((self._ids[i], KIND_LABELS[k], step))
+                i = j
+            path.append((source_id, None, None))
+            path.reverse()
+            i = meet
+            while prev[1][i] is not None:
+                j, k, step = prev[1][i]
+                path.append((self._ids[j], KIND_LABELS[k], flip[step]))
+                i = j
+            return path
+
+    def components(self):
+        """
+        [(component_id, size), ...] for every connected component, largest
+        first. component_id is the smallest Person.id in the component, so it
+        stays the same as long as that person and their links do.
+        """
+        with self._lock:
+            if self._components and self._components[0] == self.version:
+                return self._components[1]
+            if self._uf_stale:
+                self._rebuild_components()
+            groups = {}
+            for i, pid in enumerate(self._ids):
+                if pid is None:
+                    continue
+                root = self._find(i)
+                first, size = groups.get(root, (pid, 0))
+                groups[root] = (min(first, pid), size + 1)
+            result = sorted(groups.values(), key=lambda c: (-c[1], c[0]))
+            self._components = (self.version, result)
+            return result
+
+    def component_members(self, component_id):
+        """Person ids in the component with this id, or None if there is no such component."""
+        with self._lock:
+            i = self._index_of.get(component_id)
+            if i is None:
+                return None
+            if self._uf_stale:
+                self._rebuild_components()
+            root = self._find(i)
+            members = [pid for j, pid in enumerate(self._ids) if pid is not None and self._find(j) == root]
+            return members if min(members) == component_id else None
+
+    def snapshot(self):
+        """
+        (version, person_ids, parent_edges, spouse_pairs) taken under the lock.
+        parent_edges are (parent_id, child_id, label); each spouse pair appears once.
+        """
+        with self._lock:
+            parent_edges = []
+            spouse_pairs = []
+            for i, pid in enumerate(self._ids):
+                if pid is None:
+                    continue
+                for j, k in self._children.neighbours(i).items():
+                    parent_edges.append((pid, self._ids[j], KIND_LABELS[k]))
+                for j in self._spouses.neighbours(i):
+                    if i < j:
+                        spouse_pairs.append((pid, self._ids[j]))
+            return self.version, list(self._index_of), parent_edges, spouse_pairs
+
+    def ancestors(self, pid, max_depth=None):
+        """{ancestor_id: generations up} for everyone reachable via parent edges."""
+        return self._walk("_parents", pid, max_depth)
+
+    def descendants(self, pid, max_depth=None):
+        """{descendant_id: generations down} for everyone reachable via child edges."""
+        return self._walk("_children", pid, max_depth)
+
+    # --- writes (call after the matching Kuzu write succeeded) ---
+
+    def add_person(self, pid):
+        with self._lock:
+            self._row(pid)
+            self.version += 1
+
+    def add_parent(self, parent_id, child_id, label="PARENT_OF"):
+        """Raises CycleError (changing nothing) if the edge would close a cycle."""
+        with self._lock:
+            # Checked under the same lock as the write: two concurrent edges
+            # a -> b and b -> a cannot both pass, and _raise_levels would
+            # never terminate on a cycle
+            if self._closes_cycle(parent_id, child_id):
+                raise CycleError("Child is already an ancestor of parent")
+            p, c = self._row(parent_id), self._row(child_id)
+            kind = kind_from_label(label)
+            self._children.add(p, c, kind)
+            self._parents.add(c, p, kind)
+            if self._level[c] <= self._level[p]:
+                self._level[c] = self._level[p] + 1
+                self._raise_levels(c)
+            if not self._uf_stale:
+                self._union(p, c)
+            self._changed()
+
+    def remove_parent(self, parent_id, child_id):
+        with self._lock:
+            p, c = self._index_of.get(parent_id), self._index_of.get(child_id)
+            if p is None or c is None:
+                return
+            self._children.remove(p, c)
+            self._parents.remove(c, p)
+            self._uf_stale = True
+            self._changed()
+
+    def add_spouse(self, spouse1_id, spouse2_id):
+        with self._lock:
+            a, b = self._row(spouse1_id), self._row(spouse2_id)
+            self._spouses.add(a, b, MARRIED_TO)
+            self._spouses.add(b, a, MARRIED_TO)
+            if not self._uf_stale:
+                self._union(a, b)
+            self._changed()
+
+    def remove_person(self, pid):
+        """Drop a person and every edge touching them (mirrors DETACH DELETE)."""
+        with self._lock:
+            i = self._index_of.pop(pid, None)
+            if i is None:
+                return
+            for j in self._children.neighbours(i):
+                self._children.remove(i, j)
+                self._parents.remove(j, i)
+            for j in self._parents.neighbours(i):
+                self._parents.remove(i, j)
+                self._children.remove(j, i)
+            for j in self._spouses.neighbours(i):
+                self._spouses.remove(i, j)
+                self._spouses.remove(j, i)
+            self._ids[i] = None
+            self._uf_stale = True
+            self._changed()
+
+
+def build_index(conn):
+    """Read all people and kinship edges from Kuzu into a fresh KinshipIndex."""
+    person_ids = []
+    result = conn.execute("MATCH (p:Person) RETURN p.id")
+    while result.has_next():
+        person_ids.append(result.get_next()[0])
+
+    parent_edges = []
+    result = conn.execute("MATCH (p:Person)-[r:PARENT_OF|ADOPTED_BY]->(c:Person) RETURN p.id, c.id, label(r)")
+    while result.has_next():
+        parent_edges.append(tuple(result.get_next()))
+
+    spouse_edges = []
+    result = conn.execute("MATCH (p1:Person)-[:MARRIED_TO]->(p2:Person) RETURN p1.id, p2.id")
+    while result.has_next():
+        spouse_edges.append(tuple(result.get_next()))
+
+    return KinshipIndex(person_ids, parent_edges, spouse_edges)
+
+
+# Singleton instance
+_index = None
+_index_lock = threading.Lock()
+
+def get_kinship_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                with connection() as conn:
+                    _index = build_index(conn)
+    return _index
+
+
+def reload_kinship_index(conn):
+    """Rebuild the singleton from Kuzu after a bulk load that bypassed it."""
+    global _index
+    with _index_lock:
+        index = build_index(conn)
+        # Keep versions increasing so caches keyed on them (layout) see a change
+        if _index is not None:
+            index.version = max(index.version, _index.version + 1)
+        _index = index
+    return index
@@ -0,0 +1,420 @@
+"""
+Relationship naming on top of the kinship index.
+
+Two people are related through their lowest common ancestors (LCAs): common
+ancestors none of whose children is also a common ancestor. A pedigree is a DAG
+(two parents per child, cousin marriages), so there can be several LCAs; the
+closest one (smallest combined generation distance) names the relationship.
+
+Also computes kinship / relationship coefficient matrices over the pedigree.
+"""
+import numpy as np
+
+ORDINALS = ["zeroth", "first", "second", "third", "fourth", "fifth",
+            "sixth", "seventh", "eighth", "ninth", "tenth"]
+TIMES = {1: "once", 2: "twice", 3: "thrice"}
+
+
+def _suffix(n):
+    # 1st, 2nd, 3rd, 4th ... 11th, 12th, 13th ... 21st, 22nd, 23rd
+    if 11 <= n % 100 <= 13:
+        return "th"
+    return {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+
+
+def _ordinal(n):
+    if n < len(ORDINALS):
+        return ORDINALS[n]
+    return f"{n}{_suffix(n)}"
+
+
+def _greats(n):
+    # 1 -> "great-", 2 -> "2nd great-", 3 -> "3rd great-", ...
+    if n <= 0:
+        return ""
+    if n == 1:
+        return "great-"
+    return f"{n}{_suffix(n)} great-"
+
+
+def _gendered(gender, male, female, neutral):
+    if gender and gender.lower() in ("male", "m"):
+        return male
+    if gender and gender.lower() in ("female", "f"):
+        return female
+    return neutral
+
+
+def relationship_label(up_a, up_b, half=False, gender=None):
+    """
+    Name what A is to B, where A is `up_a` generations below the common ancestor
+    and B is `up_b` generations below it.
+    """
+    if up_a == 0 and up_b == 0:
+        return "self"
+
+    # Direct line
+    if up_a == 0:
+        base = _gendered(gender, "father", "mother", "parent")
+        if up_b == 1:
+            return base
+        return _greats(up_b - 2) + "grand" + base
+    if up_b == 0:
+        base = _gendered(gender, "son", "daughter", "child")
+        if up_a == 1:
+            return base
+        return _greats(up_a - 2) + "grand" + base
+
+    prefix = "half-" if half else ""
+
+    if up_a == 1 and up_b == 1:
+        return prefix + _gendered(gender, "brother", "sister", "sibling")
+
+    # Aunt/uncle and niece/nephew lines
+    if up_a == 1:
+        base = _gendered(gender, "uncle", "aunt", "aunt/uncle")
+        return _greats(up_b - 2) + prefix + base
+    if up_b == 1:
+        base = _gendered(gender, "nephew", "niece", "niece/nephew")
+        return _greats(up_a - 2) + prefix + base
+
+    # Cousins
+    degree = min(up_a, up_b) - 1
+    removed = abs(up_a - up_b)
+    label = f"{prefix}{_ordinal(degree)} cousin"
+    if removed:
+        times = TIMES.get(removed, f"{removed} times")
+        label += f" {times} removed"
+    return label
+
+
+def common_ancestors(index, a, b):
+    """
+    Lowest common ancestors of `a` and `b` as a list of
+    (ancestor_id, generations_from_a, generations_from_b), closest first.
+    A person counts as their own ancestor at distance 0.
+    """
+    up_a = index.ancestors(a)
+    up_a[a] = 0
+    up_b = index.ancestors(b)
+    up_b[b] = 0
+
+    common = up_a.keys() & up_b.keys()
+    lowest = [
+        c for c in common
+        if not any(child in common for child, _ in index.children(c))
+    ]
+    return sorted(
+        ((c, up_a[c], up_b[c]) for c in lowest),
+        key=lambda t: (t[1] + t[2], t[1], t[0])
+    )
+
+
+def _children_towards(index, ancestor, person, distance):
+    # Children of `ancestor` that lie on a shortest line down to `person`
+    if distance == 1:
+        return [person]
+    up = index.ancestors(person)
+    return [c for c, _ in index.children(ancestor) if up.get(c) == distance - 1]
+
+
+def _shared_parents(index, x, y):
+    return len({p for p, _ in index.parents(x)} & {p for p, _ in index.parents(y)})
+
+
+def _is_half(index, ancestor, a, da, b, db):
+    # `ancestor` being the only closest common ancestor of a and b: "half"
+    # only if the siblings below it each have two parents on record and share
+    # one (one recorded parent is usually missing data, not a half relation)
+    branch_a = _children_towards(index, ancestor, a, da)
+    branch_b = _children_towards(index, ancestor, b, db)
+    return any(
+        _shared_parents(index, x, y) == 1
+        for x in branch_a for y in branch_b
+        if len(index.parents(x)) >= 2 and len(index.parents(y)) >= 2
+    )
+
+
+def describe_relationship(index, a, b, gender_a=None):
+    """
+    Relationship of `a` to `b`: label, the LCAs and whether the tie is "half"
+    (the siblings below the closest LCA each have two recorded parents and
+    share only one). Falls back to "spouse"
+    or None when there is no common ancestor.
+    """
+    lcas = common_ancestors(index, a, b)
+    if not lcas:
+        label = "spouse" if b in index.spouses(a) else None
+        return {"relationship": label, "common_ancestors": []}
+
+    ancestor, da, db = lcas[0]
+    closest = [c for c in lcas if c[1] == da and c[2] == db]
+    # Full siblings/cousins share a couple
+    half = da > 0 and db > 0 and len(closest) == 1 and _is_half(index, ancestor, a, da, b, db)
+    return {
+        "relationship": relationship_label(da, db, half=half, gender=gender_a),
+        "common_ancestors": lcas,
+    }
+
+
+# Largest pedigree (requested people plus all their ancestors) the kinship
+# matrix will build; the working matrix is float32 and O(n^2) in this size.
+MAX_KINSHIP_PEDIGREE = 5000
+
+
+def _pedigree_parents(index, pid, include_adopted):
+    # At most two parent slots; biological parents take precedence
+    parents = index.parents(pid)
+    bio = [p for p, label in parents if label == "PARENT_OF"]
+    adopted = [p for p, label in parents if label == "ADOPTED_BY"] if include_adopted else []
+    return (bio + adopted)[:2]
+
+
+def kinship_matrix(index, person_ids, include_adopted=True):
+    """
+    Kinship coefficients (phi) between all pairs of `person_ids`, as an n x n
+    float32 array in the order given.
+
+    Uses the tabular method: order the pedigree so parents come before children,
+    then for each person i with parents f, m and every earlier j:
+        phi(i, j) = (phi(f, j) + phi(m, j)) / 2
+        phi(i, i) = (1 + phi(f, m)) / 2
+    Each step is a vectorised row update, so the whole pedigree is one pass.
+    Unknown parents are treated as unrelated founders.
+    """
+    # 1. Pedigree = requested people plus all their ancestors
+    pedigree = set(person_ids)
+    for pid in person_ids:
+        pedigree.update(index.ancestors(pid))
+    if len(pedigree) > MAX_KINSHIP_PEDIGREE:
+        raise ValueError(f"Pedigree has {len(pedigree)} people; the limit is {MAX_KINSHIP_PEDIGREE}")
+
+    parents_of = {pid: _pedigree_parents(index, pid, include_adopted) for pid in pedigree}
+
+    # 2. Topological order (Kahn): parents before children
+    pending = {pid: sum(1 for p in parents if p in pedigree) for pid, parents in parents_of.items()}
+    children_of = {}
+    for pid, parents in parents_of.items():
+        for p in parents:
+            children_of.setdefault(p, []).append(pid)
+    order = [pid for pid, count in pending.items() if count == 0]
+    for pid in order:
+        for child in children_of.get(pid, ()):
+            pending[child] -= 1
+            if pending[child] == 0:
+                order.append(child)
+    if len(order) != len(pedigree):
+        raise ValueError("Pedigree contains a cycle")
+
+    # 3. One pass of the recurrence
+    pos = {pid: i for i, pid in enumerate(order)}
+    phi = np.zeros((len(order), len(order)), dtype=np.float32)
+    for i, pid in enumerate(order):
+        slots = [pos[p] for p in parents_of[pid] if p in pos]
+        for p in slots:
+            phi[i, :i] += 0.5 * phi[p, :i]
+        phi[:i, i] = phi[i, :i]
+        phi[i, i] = 0.5 * (1.0 + (phi[slots[0], slots[1]] if len(slots) == 2 else 0.0))
+
+    selected = [pos[pid] for pid in person_ids]
+    return phi[np.ix_(selected, selected)]
+
+
+def relationship_matrix(phi):
+    """
+    Wright's coefficient of relationship from a kinship matrix:
+        r(i, j) = 2 phi(i, j) / sqrt((1 + F_i)(1 + F_j)),  with 1 + F_i = 2 phi(i, i)
+    """
+    d = np.sqrt(2.0 * np.diag(phi))
+    return (2.0 * phi / np.outer(d, d)).astype(np.float32)
+
+
+def _inbreeding(parents_of, order, collapsed, person_id):
+    """
+    Inbreeding coefficient of `person_id`: the kinship of its two parents,
+    by the pairwise recurrence memoised over the pairs it actually needs:
+        phi(x, x) = (1 + phi(f, m)) / 2
+        phi(x, y) = (phi(f, y) + phi(m, y)) / 2   (x not an ancestor of y)
+    Two people of the pedigree can only be related through an ancestor that
+    occurs more than once in it (`collapsed`), so any pair that shares none
+    is 0 without recursing. `order` has children before parents.
+    """
+    parents = parents_of[person_id]
+    if len(parents) < 2 or not collapsed:
+        return 0.0
+    # Bitmask of the collapsed ancestors of each person (themselves included)
+    bit = {pid: 1 << n for n, pid in enumerate(collapsed)}
+    shared = {}
+    for pid in reversed(order):
+        mask = bit.get(pid, 0)
+        for p in parents_of[pid]:
+            mask |= shared[p]
+        shared[pid] = mask
+    rank = {pid: n for n, pid in enumerate(order)}
+
+    def key(x, y):
+        return (x, y) if x <= y else (y, x)
+
+    phi = {}
+    stack = [key(*parents)]
+    while stack:
+        x, y = stack[-1]
+        if (x, y) in phi:
+            stack.pop()
+            continue
+        if x == y:
+            ps = parents_of[x]
+            terms = [key(ps[0], ps[1])] if len(ps) == 2 else []
+        elif not shared[x] & shared[y]:
+            phi[x, y] = 0.0
+            stack.pop()
+            continue
+        else:
+            # Recurse on the one nearer the proband: it cannot be an ancestor of the other
+            child, other = (x, y) if rank[x] < rank[y] else (y, x)
+            terms = [key(p, other) for p in parents_of[child]]
+        missing = [t for t in terms if t not in phi]
+        if missing:
+            stack.extend(missing)
+            continue
+        total = sum(phi[t] for t in terms)
+        phi[x, y] = 0.5 * (1.0 + total) if x == y else 0.5 * total
+        stack.pop()
+    return phi[key(*parents)]
+
+
+def pedigree_analysis(index, person_id, include_adopted=True):
+    """
+    Pedigree collapse of one person's ancestry.
+
+    Ancestor *occurrences* (how many times someone appears in the full pedigree
+    chart) are path counts, which grow exponentially under collapse. They are
+    counted per generation with memoisation over the DAG: each ancestor is
+    visited once, after all its children in the pedigree, and passes its
+    {generation: paths} counts up to its parents. Cost is linear in unique
+    ancestors and edges, not in paths.
+
+    Returns the inbreeding coefficient F (see _inbreeding; no kinship matrix,
+    so no limit on pedigree size), overall and per-generation implex, and the
+    ancestors that occur more than once as {ancestor_id: {generation: paths}}.
+    """
+    # Walk the same (at most two) parent slots that are counted below, so
+    # unique ancestors and occurrences always describe the same chart
+    parents_of = {person_id: _pedigree_parents(index, person_id, include_adopted)}
+    stack = [person_id]
+    while stack:
+        for p in parents_of[stack.pop()]:
+            if p not in parents_of:
+                parents_of[p] = _pedigree_parents(index, p, include_adopted)
+                stack.append(p)
+    pedigree = set(parents_of)
+    ancestors = pedigree - {person_id}
+
+    # Children-before-parents order within the pedigree
+    pending = {pid: 0 for pid in pedigree}
+    for pid, parents in parents_of.items():
+        for p in parents:
+            pending[p] += 1
+    order = [pid for pid, count in pending.items() if count == 0]
+    for pid in order:
+        for p in parents_of[pid]:
+            pending[p] -= 1
+            if pending[p] == 0:
+                order.append(p)
+
+    paths = {pid: {} for pid in pedigree}
+    paths[person_id] = {0: 1}
+    for pid in order:
+        for p in parents_of[pid]:
+            counts = paths[p]
+            for gen, n in paths[pid].items():
+                counts[gen + 1] = counts.get(gen + 1, 0) + n
+
+    generations = {}
+    for pid in ancestors:
+        for gen, n in paths[pid].items():
+            row = generations.setdefault(gen, {"occurrences": 0, "unique": 0})
+            row["occurrences"] += n
+            row["unique"] += 1
+
+    occurrences = sum(row["occurrences"] for row in generations.values())
+    per_generation = []
+    for gen in sorted(generations):
+        row = generations[gen]
+        per_generation.append({
+            "generation": gen,
+            "possible": 2 ** gen,
+            "occurrences": row["occurrences"],
+            "unique": row["unique"],
+            "implex": 1 - row["unique"] / row["occurrences"]
+        })
+
+    collapsed = [pid for pid in ancestors if sum(paths[pid].values()) > 1]
+    return {
+        "inbreeding_coefficient": _inbreeding(parents_of, order, collapsed, person_id),
+        "unique_ancestors": len(ancestors),
+        "ancestor_occurrences": occurrences,
+        "implex": (1 - len(ancestors) / occurrences) if occurrences else 0.0,
+        "generations": per_generation,
+        "duplicated": {pid: paths[pid] for pid in collapsed}
+    }
+
+
+def family(index, person_id, degree):
+    """
+    Relatives of `person_id` within `degree` (civil-law degrees: generations up
+    to the common ancestor plus generations down, so parent = 1, sibling = 2,
+    aunt/uncle = 3, first cousin = 4), plus spouses and step relatives.
+
+    Walks the index once per ancestor within range and keeps, for every blood
+    relative, the closest common ancestor(s). Returns a list of dicts with
+    "id", "kind" ("blood" | "spouse" | "step"), "degree", and the arguments for
+    relationship_label() as "up" (relative's generations below the common
+    ancestor), "down" (the person's) and "half".
+    """
+    up_from = index.ancestors(person_id, degree)
+    up_from[person_id] = 0
+
+    # relative -> {(relative's distance, person's distance): [common ancestors]}
+    paths = {}
+    for ancestor_id, up in up_from.items():
+        below = index.descendants(ancestor_id, degree - up)
+        below[ancestor_id] = 0
+        for rid, down in below.items():
+            paths.setdefault(rid, {}).setdefault((down, up), []).append(ancestor_id)
+    paths.pop(person_id, None)
+
+    relatives = []
+    for rid, found in paths.items():
+        (d_rel, d_person), ancestors = min(found.items(), key=lambda kv: (kv[0][0] + kv[0][1], kv[0][0]))
+        # Same "half" rule as describe_relationship
+        half = (
+            d_rel > 0 and d_person > 0 and len(ancestors) == 1
+            and _is_half(index, ancestors[0], rid, d_rel, person_id, d_person)
+        )
+        relatives.append({
+            "id": rid, "kind": "blood", "degree": d_rel + d_person,
+            "up": d_rel, "down": d_person, "half": half
+        })
+
+    if degree < 1:
+        return relatives
+
+    blood = set(paths) | {person_id}
+    parents = {p for p, _ in index.parents(person_id)}
+    spouses = index.spouses(person_id)
+    step = []
+    for sid in spouses:
+        relatives.append({"id": sid, "kind": "spouse", "degree": 1, "up": 0, "down": 0, "half": False})
+        step += [(c, 1, 0, 1) for c, _ in index.children(sid)]
+    step_parents = {s for p in parents for s in index.spouses(p)} - parents
+    step += [(s, 0, 1, 1) for s in step_parents]
+    if degree >= 2:
+        step += [(c, 1, 1, 2) for s in step_parents for c, _ in index.children(s)]
+
+    seen = blood | set(spouses)
+    for rid, up, down, deg in step:
+        if rid not in seen:
+            seen.add(rid)
+            relatives.append({"id": rid, "kind": "step", "degree": deg, "up": up, "down": down, "half": False})
+    return relatives
@@ -0,0 +1,281 @@
+"""
+Server-side genealogical layout for the tree view.
+
+Served by GET /relationships/graph/layout as a server-side alternative to the
+browser-side dagre pass in FamilyGraph.tsx:
+1. Generations: every child sits at least one row below each parent, spouses
+   share a row, and people without parents are pulled down next to their
+   children instead of floating at the top.
+2. Family units: spouses in the same row are grouped and kept side by side.
+3. Ordering: units are ordered by a few barycenter sweeps (down over parents,
+   up over children) to reduce edge crossings.
+4. Coordinates: units are packed left to right and nudged towards the centre
+   of their parents, keeping a minimum gap.
+
+Layouts are cached by kinship index version, so repeat requests are free until
+a person or kinship edge changes.
+"""
+import threading
+from collections import defaultdict, deque
+
+# Match the node box used by FamilyGraph.tsx
+NODE_WIDTH = 180
+NODE_HEIGHT = 80
+NODE_GAP = 40      # between spouses / siblings in a row
+UNIT_GAP = 80      # between family units
+RANK_SEP = 100     # vertical gap between generations
+
+# Barycenter sweep iterations (each = one down + one up pass)
+SWEEPS = 4
+
+
+def _topological_order(person_ids, parents, children):
+    pending = {pid: len(parents[pid]) for pid in person_ids}
+    order = [pid for pid in person_ids if pending[pid] == 0]
+    for pid in order:
+        for child in children[pid]:
+            pending[child] -= 1
+            if pending[child] == 0:
+                order.append(child)
+    # Anything left is on a cycle; keep it so every person still gets a row
+    seen = set(order)
+    order += [pid for pid in person_ids if pid not in seen]
+    return order
+
+
+def _same_line(a, b, gen, parents):
+    """True if one of a, b is an ancestor of the other (gen: longest-path rows)."""
+    if gen[a] == gen[b]:
+        return False
+    upper, lower = (a, b) if gen[a] < gen[b] else (b, a)
+    # Only ancestors below the upper one's row can still lead up to it
+    seen = {lower}
+    stack = [lower]
+    while stack:
+        for p in parents[stack.pop()]:
+            if p == upper:
+                return True
+            if p not in seen and gen[p] > gen[upper]:
+                seen.add(p)
+                stack.append(p)
+    return False
+
+
+def _settle_rows(person_ids, parents, gen, group):
+    """
+    Lowest rows >= gen that put every child below its parents and each group
+    (of spouses) on one row: one longest-path pass over the groups. Also
+    returns the groups that cannot share a row (a parent edge inside the group
+    or a cycle through it).
+    """
+    members = defaultdict(list)
+    for pid in person_ids:
+        members[group[pid]].append(pid)
+    below = defaultdict(list)
+    pending = defaultdict(int)
+    stuck = set()
+    for child in person_ids:
+        for p in parents[child]:
+            if group[p] == group[child]:
+                stuck.add(group[child])
+            else:
+                below[group[p]].append(group[child])
+                pending[group[child]] += 1
+    row = {g: max(gen[pid] for pid in pids) for g, pids in members.items()}
+    queue = [g for g in members if pending[g] == 0]
+    for g in queue:
+        for h in below[g]:
+            row[h] = max(row[h], row[g] + 1)
+            pending[h] -= 1
+            if pending[h] == 0:
+                queue.append(h)
+    stuck.update(g for g in members if pending[g])
+    return row, stuck
+
+
+def assign_generations(person_ids, parents, children, spouses):
+    order = _topological_order(person_ids, parents, children)
+
+    gen = {}
+    for pid in order:
+        gen[pid] = max((gen[p] + 1 for p in parents[pid] if p in gen), default=0)
+
+    # Spouses share a row, except a pair where one descends from the other
+    # (no row can hold both); groups are found before the pull-down below
+    # moves the longest-path rows
+    group = {pid: pid for pid in person_ids}
+
+    def find(pid):
+        while group[pid] != pid:
+            group[pid] = group[group[pid]]
+            pid = group[pid]
+        return pid
+
+    for pid in person_ids:
+        for s in spouses[pid]:
+            if pid < s and not _same_line(pid, s, gen, parents):
+                group[find(pid)] = find(s)
+    group = {pid: find(pid) for pid in person_ids}
+
+    # Pull parentless people down to just above their highest child
+    for pid in reversed(order):
+        if not parents[pid] and children[pid]:
+            gen[pid] = min(gen[c] for c in children[pid]) - 1
+
+    # Push spouses and descendants down until everything is consistent. Spouse
+    # chains can still tie a line to itself (a's spouse descends from b, whose
+    # spouse is a's ancestor); those groups are split up rather than chased
+    # down forever
+    row, stuck = _settle_rows(person_ids, parents, gen, group)
+    if stuck:
+        for pid in person_ids:
+            if group[pid] in stuck:
+                group[pid] = pid
+        row, _ = _settle_rows(person_ids, parents, gen, group)
+    gen = {pid: row[group[pid]] for pid in person_ids}
+
+    lowest = min(gen.values(), default=0)
+    return {pid: g - lowest for pid, g in gen.items()}
+
+
+def _family_units(person_ids, gen, spouses, visit_order):
+    """Group same-row spouses into units, in first-visit order."""
+    unit_of = {}
+    units = []
+    for pid in visit_order:
+        if pid in unit_of:
+            continue
+        # Walk the spouse chain so multiple marriages stay contiguous
+        members = []
+        queue = deque([pid])
+        unit_of[pid] = len(units)
+        while queue:
+            p = queue.popleft()
+            members.append(p)
+            for s in spouses[p]:
+                if s not in unit_of and gen[s] == gen[pid]:
+                    unit_of[s] = len(units)
+                    queue.append(s)
+        units.append(members)
+    return units
+
+
+def _visit_order(person_ids, parents, children, spouses):
+    # Breadth-first over all kinship edges so families and islands stay together
+    seen = set()
+    order = []
+    for start in sorted(person_ids):
+        if start in seen:
+            continue
+        seen.add(start)
+        queue = deque([start])
+        while queue:
+            pid = queue.popleft()
+            order.append(pid)
+            for other in (*spouses[pid], *parents[pid], *children[pid]):
+                if other not in seen:
+                    seen.add(other)
+                    queue.append(other)
+    return order
+
+
+def compute_layout(person_ids, parent_edges, spouse_pairs, sweeps=SWEEPS):
+    """
+    person_ids: iterable of Person.id
+    parent_edges: iterable of (parent_id, child_id, ...)
+    spouse_pairs: iterable of (spouse1_id, spouse2_id)
+
+    Returns [{"id", "x", "y", "generation"}, ...] with x/y as the top-left
+    corner of the node box.
+    """
+    person_ids = list(person_ids)
+    parents = defaultdict(list)
+    children = defaultdict(list)
+    spouses = defaultdict(list)
+    for edge in parent_edges:
+        parents[edge[1]].append(edge[0])
+        children[edge[0]].append(edge[1])
+    for a, b in spouse_pairs:
+        spouses[a].append(b)
+        spouses[b].append(a)
+
+    gen = assign_generations(person_ids, parents, children, spouses)
+    units = _family_units(person_ids, gen, spouses, _visit_order(person_ids, parents, children, spouses))
+
+    rows = defaultdict(list)
+    for u, members in enumerate(units):
+        rows[gen[members[0]]].append(u)
+    row_keys = sorted(rows)
+
+    # Position of each person within its row (slot index), for barycenters
+    slot = {}
+
+    def renumber(row):
+        i = 0
+        for u in rows[row]:
+            for pid in units[u]:
+                slot[pid] = i
+                i += 1
+
+    for row in row_keys:
+        renumber(row)
+
+    def sweep(row, neighbours):
+        current = {u: i for i, u in enumerate(rows[row])}
+
+        def key(u):
+            linked = [slot[n] for pid in units[u] for n in neighbours[pid]]
+            return sum(linked) / len(linked) if linked else slot[units[u][0]]
+
+        rows[row].sort(key=lambda u: (key(u), current[u]))
+        renumber(row)
+
+    for _ in range(sweeps):
+        for row in row_keys[1:]:
+            sweep(row, parents)
+        for row in reversed(row_keys[:-1]):
+            sweep(row, children)
+
+    # Coordinates: pack units left to right, pulled towards their parents' centre
+    x = {}
+    for row in row_keys:
+        right_edge = None
+        for u in rows[row]:
+            members = units[u]
+            width = len(members) * NODE_WIDTH + (len(members) - 1) * NODE_GAP
+            parent_xs = [x[p] + NODE_WIDTH / 2 for pid in members for p in parents[pid] if p in x]
+            start = (sum(parent_xs) / len(parent_xs) - width / 2) if parent_xs else 0
+            if right_edge is not None:
+                start = max(start, right_edge + UNIT_GAP)
+            for i, pid in enumerate(members):
+                x[pid] = start + i * (NODE_WIDTH + NODE_GAP)
+            right_edge = start + width
+
+    left = min(x.values(), default=0)
+    return [
+        {
+            "id": pid,
+            "x": round(x[pid] - left, 1),
+            "y": gen[pid] * (NODE_HEIGHT + RANK_SEP),
+            "generation": gen[pid]
+        }
+        for pid in person_ids
+    ]
+
+
+# Last computed layout, keyed by kinship index version
+_cache = {"version": None, "layout": None}
+_cache_lock = threading.Lock()
+
+def get_layout(index):
+    with _cache_lock:
+        if _cache["version"] != index.version:
+            version, person_ids, parent_edges, spouse_pairs = index.snapshot()
+            _cache["layout"] = {
+                "version": version,
+                "node_width": NODE_WIDTH,
+                "node_height": NODE_HEIGHT,
+                "nodes": compute_layout(person_ids, parent_edges, spouse_pairs)
+            }
+            _cache["version"] = version
+        return _cache["layout"]
@@ -1,20 +1,40 @@
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from schema import create_schema
-from routers import auth, people, relationships, events, places, media, occupations, organizations
+from graph_index import get_kinship_index
+from closure import ensure_closure
+from database import connection, db, write_queue, PoolTimeout, QueryTimeout
+from routers import auth, people, relationships, events, places, media, occupations, organizations, gedcom, admin
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Init DB schema
     print("Initializing Database Schema...")
     create_schema()
+    print("Loading kinship index...")
+    index = get_kinship_index()
+    with connection() as conn:
+        ensure_closure(conn, index)
     yield
     # Shutdown
     print("Shutting down...")
+    write_queue.close()
+    db.close()
 
 app = FastAPI(lifespan=lifespan)
 
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    # Every pooled connection stayed busy for the whole wait
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+@app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request: Request, exc: QueryTimeout):
+    # An async route's query was interrupted (or never started) in time
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 from fastapi.middleware.cors import CORSMiddleware
 
 origins = [
@@ -40,6 +60,8 @@ app.include_router(places.router, prefix="/places", tags=["places"])
 app.include_router(media.router, prefix="/media", tags=["media"])
 app.include_router(occupations.router, prefix="/occupations", tags=["occupations"])
 app.include_router(organizations.router, prefix="/organizations", tags=["organizations"])
+app.include_router(gedcom.router, tags=["gedcom"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 @app.get("/")
 def read_root():
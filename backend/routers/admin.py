@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from kuzu import Connection
+from database import get_conn, get_pool, write_queue
+from auth import require_admin
+from snapshot import create_snapshot, list_snapshots, restore_snapshot
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+def _summary(manifest):
+    return {
+        "name": manifest["name"],
+        "created_at": manifest["created_at"],
+        "tables": {t["name"]: t["rows"] for t in manifest["tables"]}
+    }
+
+@router.post("/snapshot", status_code=status.HTTP_201_CREATED)
+def take_snapshot(conn: Connection = Depends(get_conn)):
+    """
+    Export every table to a timestamped Parquet snapshot with a checksummed
+    manifest (see snapshot.py). Runs in a read-only transaction, so other
+    requests carry on meanwhile.
+    """
+    try:
+        manifest = create_snapshot(conn)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot failed: {str(e)}")
+    return {**_summary(manifest), "seconds": manifest["seconds"]}
+
+@router.get("/db-pool")
+def get_pool_stats():
+    """Connection pool size, current use and checkout wait metrics."""
+    return get_pool().stats()
+
+@router.get("/write-queue")
+def get_write_queue_stats():
+    """Writer thread backlog and group commit sizes."""
+    return write_queue.stats()
+
+@router.get("/snapshots")
+def get_snapshots():
+    return [_summary(manifest) for manifest in list_snapshots()]
+
+@router.post("/snapshots/{name}/restore")
+def restore_from_snapshot(name: str):
+    """Replace the whole database with a snapshot, in one write transaction."""
+    snapshot = next((m for m in list_snapshots() if m["name"] == name), None)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    try:
+        return restore_snapshot(snapshot["path"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Restore failed: {str(e)}")
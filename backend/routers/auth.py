@@ -1,7 +1,8 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
-from database import get_db_connection
+from database import db, write_queue
 from auth import verify_password, create_access_token, get_password_hash
 from models import Token, UserCreate
 
@@ -9,15 +10,10 @@ router = APIRouter()
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    db, conn = get_db_connection()
-    # Query user from Kuzu
-    # Note: Strings in Kuzu Cypher must be quoted
-    query = f"MATCH (u:User) WHERE u.username = '{form_data.username}' RETURN u.username, u.password_hash, u.role"
-    result = conn.execute(query)
-    
-    user_row = None
-    if result.has_next():
-        user_row = result.get_next()
+    # Query user from Kuzu (on a database thread, not the event loop)
+    query = "MATCH (u:User) WHERE u.username = $username RETURN u.username, u.password_hash, u.role"
+    rows = await db.execute(query, {"username": form_data.username})
+    user_row = rows[0] if rows else None
         
     if not user_row:
         raise HTTPException(
@@ -31,7 +27,8 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     password_hash = user_row[1]
     role = user_row[2] # "admin", "editor", "viewer"
 
-    if not verify_password(form_data.password, password_hash):
+    # bcrypt is deliberately slow; keep it off the event loop too
+    if not await run_in_threadpool(verify_password, form_data.password, password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -43,28 +40,25 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register_user(user: UserCreate):
-    db, conn = get_db_connection()
-    
-    # Check if exists
-    check_query = f"MATCH (u:User) WHERE u.username = '{user.username}' RETURN u"
-    if conn.execute(check_query).has_next():
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    hashed_pwd = get_password_hash(user.password)
-    
-    # Insert new user
-    # Cypher injection risk: In prod, use parameters. Kuzu python API supports params in execute().
-    # For MVP we will use f-strings carefully or switch to params if Kuzu version allows.
-    # Current Kuzu Python: conn.execute(query, parameters={"a": 1})
-    
+def _create_user(conn, username, password_hash, role):
+    """write_queue mutation: insert the user unless the name is taken."""
+    check_query = "MATCH (u:User) WHERE u.username = $username RETURN u.username"
+    if conn.execute(check_query, parameters={"username": username}).has_next():
+        return False
     insert_query = "CREATE (u:User {username: $username, password_hash: $pwd, role: $role}) RETURN u"
     params = {
-        "username": user.username,
-        "pwd": hashed_pwd,
-        "role": user.role
+        "username": username,
+        "pwd": password_hash,
+        "role": role
     }
     conn.execute(insert_query, parameters=params)
+    return True
+
+@router.post("/register", status_code=status.HTTP_201_CREATED)
+async def register_user(user: UserCreate):
+    hashed_pwd = await run_in_threadpool(get_password_hash, user.password)
+    
+    if not await run_in_threadpool(write_queue.run, _create_user, user.username, hashed_pwd, user.role):
+        raise HTTPException(status_code=400, detail="Username already registered")
     
     return {"message": "User created successfully"}
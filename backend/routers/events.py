@@ -1,8 +1,9 @@
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends
 from typing import Optional, List
 from pydantic import BaseModel
-from database import get_db_connection
+from kuzu import Connection
+from database import get_conn, get_read_conn, write_queue
 
 router = APIRouter()
 
@@ -30,7 +31,6 @@ class ParticipantLink(BaseModel):
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_event(event: EventCreate):
     """Create a new event, optionally linking participants."""
-    db, conn = get_db_connection()
     
     # Validate event type
     if event.type not in EVENT_TYPES:
@@ -53,12 +53,13 @@ def create_event(event: EventCreate):
         "location": event.location
     }
     
-    try:
+    # The event and its links together, or nothing
+    def write(conn):
         result = conn.execute(query, parameters=params)
         if not result.has_next():
             raise HTTPException(status_code=500, detail="Failed to create event")
         event_id = result.get_next()[0]
-        
+
         # Link participants if provided
         if event.participant_ids:
             for pid in event.participant_ids:
@@ -68,16 +69,20 @@ def create_event(event: EventCreate):
                     CREATE (p)-[:PARTICIPATED_IN]->(e)
                 """
                 conn.execute(link_query, parameters={"pid": pid, "eid": event_id})
-        
+        return event_id
+
+    try:
+        event_id = write_queue.run(write)
         return {"id": event_id, "message": "Event created successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/")
-def list_events(event_type: Optional[str] = None):
+def list_events(event_type: Optional[str] = None, conn: Connection = Depends(get_conn)):
     """List all events, optionally filtered by type."""
-    db, conn = get_db_connection()
     
     if event_type:
         query = """
@@ -116,9 +121,8 @@ def get_event_types():
 
 
 @router.get("/{event_id}")
-def get_event(event_id: int):
+def get_event(event_id: int, conn: Connection = Depends(get_read_conn)):
     """Get event details with participants."""
-    db, conn = get_db_connection()
     
     # Get event
     event_query = """
@@ -163,7 +167,6 @@ def get_event(event_id: int):
 @router.put("/{event_id}")
 def update_event(event_id: int, event: EventUpdate):
     """Update event details."""
-    db, conn = get_db_connection()
     
     # Build dynamic SET clause
     set_parts = []
@@ -198,18 +201,17 @@ def update_event(event_id: int, event: EventUpdate):
     """
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
-            raise HTTPException(status_code=404, detail="Event not found")
-        return {"message": "Event updated"}
+        rows = write_queue.execute(query, params)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return {"message": "Event updated"}
 
 
 @router.delete("/{event_id}")
 def delete_event(event_id: int):
     """Delete an event and its participant links."""
-    db, conn = get_db_connection()
     
     # Delete participant edges first, then the event node
     query = """
@@ -219,7 +221,7 @@ def delete_event(event_id: int):
     """
     
     try:
-        conn.execute(query, parameters={"eid": event_id})
+        write_queue.execute(query, {"eid": event_id})
         return {"message": "Event deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -228,7 +230,6 @@ def delete_event(event_id: int):
 @router.post("/{event_id}/participants")
 def add_participant(event_id: int, link: ParticipantLink):
     """Add a participant to an event."""
-    db, conn = get_db_connection()
     
     # Check if link already exists
     check_query = """
@@ -236,9 +237,6 @@ def add_participant(event_id: int, link: ParticipantLink):
         WHERE p.id = $pid AND e.id = $eid
         RETURN r
     """
-    result = conn.execute(check_query, parameters={"pid": link.person_id, "eid": event_id})
-    if result.has_next():
-        raise HTTPException(status_code=400, detail="Person already participates in this event")
     
     # Create link
     if link.role:
@@ -258,19 +256,25 @@ def add_participant(event_id: int, link: ParticipantLink):
         """
         params = {"pid": link.person_id, "eid": event_id}
     
-    try:
-        result = conn.execute(query, parameters=params)
+    # Check and create in one writer mutation, so two requests cannot both add the link
+    def write(conn):
+        result = conn.execute(check_query, parameters={"pid": link.person_id, "eid": event_id})
+        if result.has_next():
+            raise HTTPException(status_code=400, detail="Person already participates in this event")
+        try:
+            result = conn.execute(query, parameters=params)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
         if not result.has_next():
             raise HTTPException(status_code=404, detail="Person or Event not found")
-        return {"message": "Participant added"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    write_queue.run(write)
+    return {"message": "Participant added"}
 
 
 @router.delete("/{event_id}/participants/{person_id}")
 def remove_participant(event_id: int, person_id: int):
     """Remove a participant from an event."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (p:Person)-[r:PARTICIPATED_IN]->(e:Event)
@@ -279,16 +283,15 @@ def remove_participant(event_id: int, person_id: int):
     """
     
     try:
-        conn.execute(query, parameters={"pid": person_id, "eid": event_id})
+        write_queue.execute(query, {"pid": person_id, "eid": event_id})
         return {"message": "Participant removed"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/person/{person_id}")
-def get_person_events(person_id: int):
+def get_person_events(person_id: int, conn: Connection = Depends(get_conn)):
     """Get all events a person participated in."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (p:Person)-[r:PARTICIPATED_IN]->(e:Event)
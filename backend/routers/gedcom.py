@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Depends
+from fastapi.responses import StreamingResponse
+from kuzu import Connection
+from database import get_conn, get_read_conn
+from auth import require_admin
+from gedcom import import_gedcom, open_gedcom, export_gedcom
+
+router = APIRouter()
+
+@router.post("/import/gedcom", status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_admin)])
+def upload_gedcom(file: UploadFile = File(...)):
+    """
+    Import a GEDCOM 5.5.1 / 7.0 file. The upload is parsed as a stream and
+    bulk-loaded with COPY FROM (see gedcom.py); returns what was created.
+    """
+    try:
+        return import_gedcom(open_gedcom(file.file))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+
+
+@router.get("/export/gedcom")
+def download_gedcom(conn: Connection = Depends(get_read_conn)):
+    """
+    Export the whole tree as GEDCOM 5.5.1. Records are streamed as they are
+    generated, one id range at a time (see gedcom.py), all from the one
+    read-only snapshot the request holds.
+    """
+    return StreamingResponse(
+        export_gedcom(conn),
+        media_type="application/x-gedcom; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="family-tree.ged"'}
+    )
@@ -1,9 +1,11 @@
 
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form, Depends
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
 from pydantic import BaseModel
-from database import get_db_connection
+from kuzu import Connection
+from database import get_conn, write_queue, QueryTimeout
 from datetime import datetime
 import os
 import uuid
@@ -19,13 +21,17 @@ class MediaLink(BaseModel):
     entity_id: int
 
 
+def _write_file(path, contents):
+    with open(path, "wb") as f:
+        f.write(contents)
+
+
 @router.post("/upload", status_code=status.HTTP_201_CREATED)
 async def upload_media(
     file: UploadFile = File(...),
     caption: Optional[str] = Form(None)
 ):
     """Upload a media file."""
-    db, conn = get_db_connection()
     
     # Generate unique filename
     ext = os.path.splitext(file.filename)[1] if file.filename else ""
@@ -43,11 +49,10 @@ async def upload_media(
     else:
         file_type = "other"
     
-    # Save file
+    # Save file (off the event loop)
     try:
         contents = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        await run_in_threadpool(_write_file, file_path, contents)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
     
@@ -72,10 +77,11 @@ async def upload_media(
     }
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
+        # Committed by the writer thread (waited for off the event loop)
+        rows = await run_in_threadpool(write_queue.execute, query, params)
+        if not rows:
             raise HTTPException(status_code=500, detail="Failed to create media record")
-        media_id = result.get_next()[0]
+        media_id = rows[0][0]
         return {
             "id": media_id,
             "filename": file.filename,
@@ -86,13 +92,14 @@ async def upload_media(
         # Clean up file if DB insert fails
         if os.path.exists(file_path):
             os.remove(file_path)
+        if isinstance(e, (HTTPException, QueryTimeout)):
+            raise
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/")
-def list_media(file_type: Optional[str] = None):
+def list_media(file_type: Optional[str] = None, conn: Connection = Depends(get_conn)):
     """List all media, optionally filtered by type."""
-    db, conn = get_db_connection()
     
     if file_type:
         query = """
@@ -126,9 +133,8 @@ def list_media(file_type: Optional[str] = None):
 
 
 @router.get("/{media_id}")
-def get_media(media_id: int):
+def get_media(media_id: int, conn: Connection = Depends(get_conn)):
     """Get media metadata."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (m:Media)
@@ -152,9 +158,8 @@ def get_media(media_id: int):
 
 
 @router.get("/{media_id}/file")
-def get_media_file(media_id: int):
+def get_media_file(media_id: int, conn: Connection = Depends(get_conn)):
     """Serve the actual media file."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (m:Media)
@@ -179,22 +184,12 @@ def get_media_file(media_id: int):
 @router.delete("/{media_id}")
 def delete_media(media_id: int):
     """Delete a media item and its file."""
-    db, conn = get_db_connection()
     
-    # Get file path first
     get_query = """
         MATCH (m:Media)
         WHERE m.id = $mid
         RETURN m.file_path
     """
-    result = conn.execute(get_query, parameters={"mid": media_id})
-    
-    if not result.has_next():
-        raise HTTPException(status_code=404, detail="Media not found")
-    
-    file_path = result.get_next()[0]
-    
-    # Delete node and relationships
     delete_query = """
         MATCH (m:Media)
         WHERE m.id = $mid
@@ -202,13 +197,24 @@ def delete_media(media_id: int):
     """
     
     try:
-        conn.execute(delete_query, parameters={"mid": media_id})
+        # Get file path first, then delete node and relationships
+        def write(conn):
+            result = conn.execute(get_query, parameters={"mid": media_id})
+            if not result.has_next():
+                raise HTTPException(status_code=404, detail="Media not found")
+            file_path = result.get_next()[0]
+            conn.execute(delete_query, parameters={"mid": media_id})
+            return file_path
+
+        file_path = write_queue.run(write)
         
-        # Delete actual file
+        # Delete actual file (once the delete has committed)
         if file_path and os.path.exists(file_path):
             os.remove(file_path)
         
         return {"message": "Media deleted"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -216,7 +222,6 @@ def delete_media(media_id: int):
 @router.post("/{media_id}/link/person/{person_id}")
 def link_media_to_person(media_id: int, person_id: int):
     """Link a media item to a person."""
-    db, conn = get_db_connection()
     
     # Check if link already exists
     check_query = """
@@ -224,9 +229,6 @@ def link_media_to_person(media_id: int, person_id: int):
         WHERE p.id = $pid AND m.id = $mid
         RETURN r
     """
-    result = conn.execute(check_query, parameters={"pid": person_id, "mid": media_id})
-    if result.has_next():
-        return {"message": "Link already exists"}
     
     # Create link
     query = """
@@ -236,19 +238,27 @@ def link_media_to_person(media_id: int, person_id: int):
         RETURN p.id
     """
     
-    try:
-        result = conn.execute(query, parameters={"pid": person_id, "mid": media_id})
+    # Check and create in one writer mutation, so two requests cannot both add the link
+    def write(conn):
+        result = conn.execute(check_query, parameters={"pid": person_id, "mid": media_id})
+        if result.has_next():
+            return False
+        try:
+            result = conn.execute(query, parameters={"pid": person_id, "mid": media_id})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
         if not result.has_next():
             raise HTTPException(status_code=404, detail="Person or Media not found")
-        return {"message": "Media linked to person"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return True
+
+    if not write_queue.run(write):
+        return {"message": "Link already exists"}
+    return {"message": "Media linked to person"}
 
 
 @router.delete("/{media_id}/link/person/{person_id}")
 def unlink_media_from_person(media_id: int, person_id: int):
     """Remove link between media and person."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (p:Person)-[r:HAS_MEDIA]->(m:Media)
@@ -257,16 +267,15 @@ def unlink_media_from_person(media_id: int, person_id: int):
     """
     
     try:
-        conn.execute(query, parameters={"pid": person_id, "mid": media_id})
+        write_queue.execute(query, {"pid": person_id, "mid": media_id})
         return {"message": "Link removed"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/person/{person_id}")
-def get_person_media(person_id: int):
+def get_person_media(person_id: int, conn: Connection = Depends(get_conn)):
     """Get all media linked to a person."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (p:Person)-[:HAS_MEDIA]->(m:Media)
@@ -1,8 +1,9 @@
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends
 from typing import Optional
 from pydantic import BaseModel
-from database import get_db_connection
+from kuzu import Connection
+from database import get_conn, get_read_conn, write_queue
 
 router = APIRouter()
 
@@ -28,7 +29,6 @@ class OccupationUpdate(BaseModel):
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_occupation(occupation: OccupationCreate):
     """Create a new occupation and link to person."""
-    db, conn = get_db_connection()
     
     # Create occupation node
     query = """
@@ -50,40 +50,46 @@ def create_occupation(occupation: OccupationCreate):
     }
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
-            raise HTTPException(status_code=500, detail="Failed to create occupation")
-        occupation_id = result.get_next()[0]
-        
-        # Link to person
-        link_query = """
-            MATCH (p:Person), (o:Occupation)
-            WHERE p.id = $pid AND o.id = $oid
-            CREATE (p)-[:WORKED_AS]->(o)
-            RETURN p.id
-        """
-        result = conn.execute(link_query, parameters={"pid": occupation.person_id, "oid": occupation_id})
-        if not result.has_next():
-            raise HTTPException(status_code=404, detail="Person not found")
-        
-        # Link to organization if provided
-        if occupation.organization_id:
-            org_query = """
-                MATCH (o:Occupation), (org:Organization)
-                WHERE o.id = $oid AND org.id = $orgid
-                CREATE (o)-[:EMPLOYED_BY]->(org)
+        # No orphaned Occupation if the person turns out not to exist
+        def write(conn):
+            result = conn.execute(query, parameters=params)
+            if not result.has_next():
+                raise HTTPException(status_code=500, detail="Failed to create occupation")
+            occupation_id = result.get_next()[0]
+            
+            # Link to person
+            link_query = """
+                MATCH (p:Person), (o:Occupation)
+                WHERE p.id = $pid AND o.id = $oid
+                CREATE (p)-[:WORKED_AS]->(o)
+                RETURN p.id
             """
-            conn.execute(org_query, parameters={"oid": occupation_id, "orgid": occupation.organization_id})
+            result = conn.execute(link_query, parameters={"pid": occupation.person_id, "oid": occupation_id})
+            if not result.has_next():
+                raise HTTPException(status_code=404, detail="Person not found")
+            
+            # Link to organization if provided
+            if occupation.organization_id:
+                org_query = """
+                    MATCH (o:Occupation), (org:Organization)
+                    WHERE o.id = $oid AND org.id = $orgid
+                    CREATE (o)-[:EMPLOYED_BY]->(org)
+                """
+                conn.execute(org_query, parameters={"oid": occupation_id, "orgid": occupation.organization_id})
+            return occupation_id
+
+        occupation_id = write_queue.run(write)
         
         return {"id": occupation_id, "message": "Occupation created successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/")
-def list_occupations():
+def list_occupations(conn: Connection = Depends(get_conn)):
     """List all occupations."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (o:Occupation)
@@ -108,9 +114,8 @@ def list_occupations():
 
 
 @router.get("/{occupation_id}")
-def get_occupation(occupation_id: int):
+def get_occupation(occupation_id: int, conn: Connection = Depends(get_read_conn)):
     """Get occupation details with person and organization."""
-    db, conn = get_db_connection()
     
     # Get occupation
     query = """
@@ -156,7 +161,6 @@ def get_occupation(occupation_id: int):
 @router.put("/{occupation_id}")
 def update_occupation(occupation_id: int, occupation: OccupationUpdate):
     """Update occupation details."""
-    db, conn = get_db_connection()
     
     # Build dynamic SET clause
     set_parts = []
@@ -179,8 +183,8 @@ def update_occupation(occupation_id: int, occupation: OccupationUpdate):
     """
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
+        rows = write_queue.execute(query, params)
+        if not rows:
             raise HTTPException(status_code=404, detail="Occupation not found")
         return {"message": "Occupation updated"}
     except Exception as e:
@@ -190,7 +194,6 @@ def update_occupation(occupation_id: int, occupation: OccupationUpdate):
 @router.delete("/{occupation_id}")
 def delete_occupation(occupation_id: int):
     """Delete an occupation."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (o:Occupation)
@@ -199,16 +202,15 @@ def delete_occupation(occupation_id: int):
     """
     
     try:
-        conn.execute(query, parameters={"oid": occupation_id})
+        write_queue.execute(query, {"oid": occupation_id})
         return {"message": "Occupation deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/person/{person_id}")
-def get_person_occupations(person_id: int):
+def get_person_occupations(person_id: int, conn: Connection = Depends(get_conn)):
     """Get all occupations for a person with organization details."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (p:Person)-[:WORKED_AS]->(o:Occupation)
@@ -250,7 +252,6 @@ def get_person_occupations(person_id: int):
 @router.post("/{occupation_id}/organization/{organization_id}")
 def link_occupation_to_organization(occupation_id: int, organization_id: int):
     """Link an occupation to an organization."""
-    db, conn = get_db_connection()
     
     # Check if link already exists
     check_query = """
@@ -258,9 +259,6 @@ def link_occupation_to_organization(occupation_id: int, organization_id: int):
         WHERE o.id = $oid AND org.id = $orgid
         RETURN r
     """
-    result = conn.execute(check_query, parameters={"oid": occupation_id, "orgid": organization_id})
-    if result.has_next():
-        return {"message": "Link already exists"}
     
     # Create link
     query = """
@@ -270,19 +268,27 @@ def link_occupation_to_organization(occupation_id: int, organization_id: int):
         RETURN o.id
     """
     
-    try:
-        result = conn.execute(query, parameters={"oid": occupation_id, "orgid": organization_id})
+    # Check and create in one writer mutation, so two requests cannot both add the link
+    def write(conn):
+        result = conn.execute(check_query, parameters={"oid": occupation_id, "orgid": organization_id})
+        if result.has_next():
+            return False
+        try:
+            result = conn.execute(query, parameters={"oid": occupation_id, "orgid": organization_id})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
         if not result.has_next():
             raise HTTPException(status_code=404, detail="Occupation or Organization not found")
-        return {"message": "Occupation linked to organization"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return True
+
+    if not write_queue.run(write):
+        return {"message": "Link already exists"}
+    return {"message": "Occupation linked to organization"}
 
 
 @router.delete("/{occupation_id}/organization/{organization_id}")
 def unlink_occupation_from_organization(occupation_id: int, organization_id: int):
     """Remove organization link from occupation."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (o:Occupation)-[r:EMPLOYED_BY]->(org:Organization)
@@ -291,7 +297,7 @@ def unlink_occupation_from_organization(occupation_id: int, organization_id: int
     """
     
     try:
-        conn.execute(query, parameters={"oid": occupation_id, "orgid": organization_id})
+        write_queue.execute(query, {"oid": occupation_id, "orgid": organization_id})
         return {"message": "Organization link removed"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,9 @@
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends
 from typing import Optional
 from pydantic import BaseModel
-from database import get_db_connection
+from kuzu import Connection
+from database import get_conn, get_read_conn, write_queue
 
 router = APIRouter()
 
@@ -22,7 +23,6 @@ class OrganizationUpdate(BaseModel):
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_organization(organization: OrganizationCreate):
     """Create a new organization."""
-    db, conn = get_db_connection()
     
     query = """
         CREATE (org:Organization {
@@ -39,19 +39,18 @@ def create_organization(organization: OrganizationCreate):
     }
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
+        rows = write_queue.execute(query, params)
+        if not rows:
             raise HTTPException(status_code=500, detail="Failed to create organization")
-        org_id = result.get_next()[0]
+        org_id = rows[0][0]
         return {"id": org_id, "message": "Organization created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/")
-def list_organizations(search: Optional[str] = None):
+def list_organizations(search: Optional[str] = None, conn: Connection = Depends(get_conn)):
     """List all organizations with optional name search."""
-    db, conn = get_db_connection()
     
     if search:
         query = """
@@ -83,9 +82,8 @@ def list_organizations(search: Optional[str] = None):
 
 
 @router.get("/{organization_id}")
-def get_organization(organization_id: int):
+def get_organization(organization_id: int, conn: Connection = Depends(get_read_conn)):
     """Get organization details with all employees/occupations."""
-    db, conn = get_db_connection()
     
     # Get organization
     query = """
@@ -132,7 +130,6 @@ def get_organization(organization_id: int):
 @router.put("/{organization_id}")
 def update_organization(organization_id: int, organization: OrganizationUpdate):
     """Update organization details."""
-    db, conn = get_db_connection()
     
     # Build dynamic SET clause
     set_parts = []
@@ -155,8 +152,8 @@ def update_organization(organization_id: int, organization: OrganizationUpdate):
     """
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
+        rows = write_queue.execute(query, params)
+        if not rows:
             raise HTTPException(status_code=404, detail="Organization not found")
         return {"message": "Organization updated"}
     except Exception as e:
@@ -166,7 +163,6 @@ def update_organization(organization_id: int, organization: OrganizationUpdate):
 @router.delete("/{organization_id}")
 def delete_organization(organization_id: int):
     """Delete an organization."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (org:Organization)
@@ -175,7 +171,7 @@ def delete_organization(organization_id: int):
     """
     
     try:
-        conn.execute(query, parameters={"orgid": organization_id})
+        write_queue.execute(query, {"orgid": organization_id})
         return {"message": "Organization deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
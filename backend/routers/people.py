@@ -1,15 +1,23 @@
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import List, Optional
-from database import get_db_connection
+from kuzu import Connection
+from database import get_conn, get_read_conn, connection, write_queue
+from graph_index import get_kinship_index, reload_kinship_index
+from kinship import describe_relationship, pedigree_analysis, family, relationship_label
+from closure import closure_refresh
+from graph_cache import bump_graph_version
+from duplicates import get_duplicate_cache, refresh_duplicates, forget_duplicates, MIN_SCORE
 from models import PersonCreate, PersonResponse
 
 router = APIRouter()
 
+def _graph_node(row):
+    # Node as it appears in /relationships/graph (row in PersonResponse column order)
+    return {"id": row[0], "name": row[1], "gender": row[2], "birth_date": row[3]}
+
 @router.post("/", response_model=PersonResponse, status_code=status.HTTP_201_CREATED)
-def create_person(person: PersonCreate):
-    db, conn = get_db_connection()
-    
+def create_person(person: PersonCreate, conn: Connection = Depends(get_conn)):
     # Helper to convert empty strings to None
     def empty_to_none(value):
         return None if value == "" else value
@@ -40,9 +48,13 @@ def create_person(person: PersonCreate):
     }
     
     try:
-        result = conn.execute(query, parameters=params)
-        if result.has_next():
-            row = result.get_next()
+        # Committed by the writer thread, grouped with other pending writes
+        rows = write_queue.execute(query, params)
+        if rows:
+            row = rows[0]
+            get_kinship_index().add_person(row[0])
+            bump_graph_version({"op": "add_node", "node": _graph_node(row)})
+            refresh_duplicates(conn, row[0])
             # Construct response
             return PersonResponse(
                 id=row[0],
@@ -60,15 +72,75 @@ def create_person(person: PersonCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+PERSON_FIELDS = ("name", "gender", "birth_date", "birth_place", "death_date", "death_place", "bio", "maiden_name")
+
+@router.post("/bulk", response_model=List[PersonResponse], status_code=status.HTTP_201_CREATED)
+def create_people(people: List[PersonCreate], conn: Connection = Depends(get_conn)):
+    """
+    Create many people with one UNWIND query in one transaction: either all
+    are created or none. Returns them with their new ids, in input order.
+    """
+    rows = []
+    for i, person in enumerate(people):
+        row = {field: getattr(person, field) for field in PERSON_FIELDS}
+        # Empty strings are stored as NULL, as in create_person
+        row = {field: None if value == "" else value for field, value in row.items()}
+        row["i"] = i
+        rows.append(row)
+    if not rows:
+        return []
+
+    query = """
+        UNWIND $rows AS r
+        CREATE (p:Person {
+            name: r.name,
+            gender: r.gender,
+            birth_date: r.birth_date,
+            birth_place: r.birth_place,
+            death_date: r.death_date,
+            death_place: r.death_place,
+            bio: r.bio,
+            maiden_name: r.maiden_name
+        })
+        RETURN r.i, p.id, p.name, p.gender, p.birth_date, p.birth_place, p.death_date, p.death_place, p.bio, p.maiden_name
+    """
+    try:
+        # One writer mutation, so one transaction
+        created = [None] * len(rows)
+        for row in write_queue.execute(query, {"rows": rows}):
+            created[row[0]] = row[1:]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    index = get_kinship_index()
+    for row in created:
+        index.add_person(row[0])
+    bump_graph_version(*({"op": "add_node", "node": _graph_node(row)} for row in created))
+    refresh_duplicates(conn, *(row[0] for row in created))
+    return [
+        PersonResponse(
+            id=row[0],
+            name=row[1],
+            gender=row[2],
+            birth_date=row[3],
+            birth_place=row[4],
+            death_date=row[5],
+            death_place=row[6],
+            bio=row[7],
+            maiden_name=row[8]
+        )
+        for row in created
+    ]
+
 @router.get("/", response_model=List[PersonResponse])
 def list_people(
     search: Optional[str] = None,
     birth_year: Optional[int] = None,
     location: Optional[str] = None,
-    alive: Optional[bool] = None
+    alive: Optional[bool] = None,
+    conn: Connection = Depends(get_conn)
 ):
     """List all people with optional search and filters."""
-    db, conn = get_db_connection()
     
     # Build WHERE clauses dynamically
     where_clauses = []
@@ -119,9 +191,52 @@ def list_people(
         ))
     return people
 
+@router.get("/duplicates")
+def get_duplicates(offset: int = 0, limit: int = 50, min_score: float = Query(MIN_SCORE, ge=MIN_SCORE, le=1.0)):
+    """
+    Likely duplicate people as scored pairs, best first. Candidates are found
+    within blocking keys (see duplicates.py) and cached; the first call after
+    startup runs the full scan. Only pairs scoring MIN_SCORE or more are
+    cached, so min_score can raise the threshold but not lower it.
+    """
+    if offset < 0 or not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 500")
+
+    candidates = get_duplicate_cache().candidates(min_score)
+    page = candidates[offset:offset + limit]
+
+    people = {}
+    if page:
+        with connection() as conn:
+            result = conn.execute("""
+                MATCH (p:Person)
+                WHERE p.id IN $ids
+                RETURN p.id, p.name, p.gender, p.birth_date, p.birth_place, p.death_date, p.maiden_name
+            """, parameters={"ids": list({pid for a, b, _ in page for pid in (a, b)})})
+            while result.has_next():
+                row = result.get_next()
+                people[row[0]] = {
+                    "id": row[0],
+                    "name": row[1],
+                    "gender": row[2],
+                    "birth_date": row[3],
+                    "birth_place": row[4],
+                    "death_date": row[5],
+                    "maiden_name": row[6]
+                }
+
+    return {
+        "total": len(candidates),
+        "offset": offset,
+        "limit": limit,
+        "candidates": [
+            {"score": round(score, 3), "person": people.get(a), "other": people.get(b)}
+            for a, b, score in page
+        ]
+    }
+
 @router.get("/{person_id}", response_model=PersonResponse)
-def get_person(person_id: int):
-    db, conn = get_db_connection()
+def get_person(person_id: int, conn: Connection = Depends(get_conn)):
     query = """
         MATCH (p:Person)
         WHERE p.id = $id
@@ -144,9 +259,7 @@ def get_person(person_id: int):
     raise HTTPException(status_code=404, detail="Person not found")
 
 @router.put("/{person_id}", response_model=PersonResponse)
-def update_person(person_id: int, person: PersonCreate):
-    db, conn = get_db_connection()
-    
+def update_person(person_id: int, person: PersonCreate, conn: Connection = Depends(get_conn)):
     # 1. Update properties
     query = """
         MATCH (p:Person)
@@ -175,9 +288,11 @@ def update_person(person_id: int, person: PersonCreate):
     }
     
     try:
-        result = conn.execute(query, parameters=params)
-        if result.has_next():
-            row = result.get_next()
+        rows = write_queue.execute(query, params)
+        if rows:
+            row = rows[0]
+            bump_graph_version({"op": "update_node", "node": _graph_node(row)})
+            refresh_duplicates(conn, row[0])
             return PersonResponse(
                 id=row[0],
                 name=row[1],
@@ -196,18 +311,32 @@ def update_person(person_id: int, person: PersonCreate):
 
 @router.delete("/{person_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_person(person_id: int):
-    db, conn = get_db_connection()
     # DETACH DELETE to remove relationships too
     query = "MATCH (p:Person) WHERE p.id = $id DETACH DELETE p"
-    conn.execute(query, parameters={"id": person_id})
+
+    def write(conn):
+        # Person and closure rows go together; the index is patched inside
+        # (closure_refresh reads it) and rebuilt from Kuzu on rollback
+        conn.execute(query, parameters={"id": person_id})
+        index = get_kinship_index()
+        descendants = index.descendants(person_id)
+        write_queue.on_rollback(reload_kinship_index, conn)
+        index.remove_person(person_id)
+        closure_refresh(conn, index, descendants)
+
+    try:
+        write_queue.run(write)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    bump_graph_version({"op": "remove_node", "id": person_id})
+    forget_duplicates(person_id)
     return None
 
 @router.get("/{person_id}/relationships")
-def get_person_relationships(person_id: int):
+def get_person_relationships(person_id: int, conn: Connection = Depends(get_read_conn)):
     """
     Returns a dictionary of relationships for the given person.
     """
-    db, conn = get_db_connection()
     
     # Helper to build dict since we can't reuse PersonResponse easily without full fields sometimes
     # Actually we can just return what we have.
@@ -309,3 +438,248 @@ def get_person_relationships(person_id: int):
         "spouses": spouses,
         "siblings": siblings
     }
+
+# Largest degree /family will walk; relative counts grow quickly with it
+MAX_FAMILY_DEGREE = 8
+
+@router.get("/{person_id}/family")
+def get_family(person_id: int, degree: int = 4, conn: Connection = Depends(get_conn)):
+    """
+    The person plus every relative within `degree` (parent = 1, sibling = 2,
+    aunt/uncle = 3, first cousin = 4, ...), including half and step relatives,
+    each labelled. Relatives come from one kinship-index traversal and all
+    their details from one query, so a profile page needs a single call.
+    """
+    if not 0 <= degree <= MAX_FAMILY_DEGREE:
+        raise HTTPException(status_code=400, detail=f"degree must be between 0 and {MAX_FAMILY_DEGREE}")
+
+    index = get_kinship_index()
+    if person_id not in index:
+        raise HTTPException(status_code=404, detail="Person not found")
+    relatives = family(index, person_id, degree)
+
+    # Marriage and adoption details come along with the people they connect to
+    query = """
+        MATCH (p:Person)
+        WHERE p.id IN $ids
+        OPTIONAL MATCH (p)-[r:MARRIED_TO|ADOPTED_BY]-(me:Person)
+        WHERE me.id = $id
+        RETURN p.id, p.name, p.gender, p.birth_date, p.birth_place, p.death_date, p.death_place, p.bio, p.maiden_name,
+               label(r), r.adoption_date, r.start_date, r.end_date
+    """
+    ids = [person_id] + [r["id"] for r in relatives]
+    result = conn.execute(query, parameters={"ids": ids, "id": person_id})
+    people = {}
+    edges = {}
+    while result.has_next():
+        row = result.get_next()
+        people[row[0]] = {
+            "id": row[0],
+            "name": row[1],
+            "gender": row[2],
+            "birth_date": row[3],
+            "birth_place": row[4],
+            "death_date": row[5],
+            "death_place": row[6],
+            "bio": row[7],
+            "maiden_name": row[8]
+        }
+        if row[9] is not None:
+            edges[(row[0], row[9])] = row
+    if person_id not in people:
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    def brief(pid):
+        p = people[pid]
+        return {key: p[key] for key in ("id", "name", "gender", "birth_date", "death_date", "bio")}
+
+    def with_parent_edge(pid, label):
+        adoption = edges.get((pid, "ADOPTED_BY"))
+        return {
+            **brief(pid),
+            "relationship_type": "adopted" if label == "ADOPTED_BY" else "biological",
+            "adoption_date": adoption[10] if label == "ADOPTED_BY" and adoption else None
+        }
+
+    labelled = []
+    for r in relatives:
+        if r["id"] not in people:
+            continue  # deleted since the index walk
+        gender = people[r["id"]]["gender"]
+        if r["kind"] == "spouse":
+            label = "spouse"
+        else:
+            label = relationship_label(r["up"], r["down"], half=r["half"], gender=gender)
+            if r["kind"] == "step":
+                label = "step" + label
+        labelled.append({
+            "id": r["id"],
+            "name": people[r["id"]]["name"],
+            "gender": gender,
+            "birth_date": people[r["id"]]["birth_date"],
+            "death_date": people[r["id"]]["death_date"],
+            "relationship": label,
+            "kind": r["kind"],
+            "degree": r["degree"],
+            "generation": r["down"] - r["up"]
+        })
+    labelled.sort(key=lambda r: (r["degree"], -r["generation"], r["name"] or ""))
+
+    parents = [with_parent_edge(pid, label) for pid, label in index.parents(person_id) if pid in people] if degree >= 1 else []
+    children = [with_parent_edge(pid, label) for pid, label in index.children(person_id) if pid in people] if degree >= 1 else []
+    spouses = []
+    for r in labelled:
+        if r["kind"] == "spouse":
+            marriage = edges.get((r["id"], "MARRIED_TO"))
+            spouses.append({
+                **brief(r["id"]),
+                "start_date": marriage[11] if marriage else None,
+                "end_date": marriage[12] if marriage else None
+            })
+    siblings = [
+        {**brief(r["id"]), "relationship": r["relationship"]}
+        for r in labelled
+        if r["kind"] == "blood" and r["degree"] == 2 and r["generation"] == 0
+    ]
+
+    return {
+        "person": people[person_id],
+        "degree": degree,
+        "parents": parents,
+        "children": children,
+        "spouses": spouses,
+        "siblings": siblings,
+        "relatives": labelled
+    }
+
+@router.get("/{person_id}/relationship-to/{other_id}")
+def get_relationship_to(person_id: int, other_id: int, conn: Connection = Depends(get_read_conn)):
+    """
+    Names what `person_id` is to `other_id` (e.g. "second cousin once removed")
+    from their lowest common ancestor(s) in the kinship index.
+    """
+
+    people_query = """
+        MATCH (p:Person)
+        WHERE p.id IN $ids
+        RETURN p.id, p.name, p.gender
+    """
+    result = conn.execute(people_query, parameters={"ids": [person_id, other_id]})
+    people = {}
+    while result.has_next():
+        row = result.get_next()
+        people[row[0]] = {"id": row[0], "name": row[1], "gender": row[2]}
+    if person_id not in people or other_id not in people:
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    described = describe_relationship(get_kinship_index(), person_id, other_id, people[person_id]["gender"])
+
+    # Names of the common ancestors
+    ancestor_ids = [c[0] for c in described["common_ancestors"]]
+    names = {}
+    if ancestor_ids:
+        result = conn.execute(people_query, parameters={"ids": ancestor_ids})
+        while result.has_next():
+            row = result.get_next()
+            names[row[0]] = row[1]
+
+    return {
+        "person": people[person_id],
+        "other": people[other_id],
+        "relationship": described["relationship"],
+        "common_ancestors": [
+            {
+                "id": ancestor_id,
+                "name": names.get(ancestor_id),
+                "generations_from_person": up_a,
+                "generations_from_other": up_b
+            }
+            for ancestor_id, up_a, up_b in described["common_ancestors"]
+        ]
+    }
+
+
+def _closure_relatives(conn, person_id, direction, max_depth):
+    check = conn.execute("MATCH (p:Person) WHERE p.id = $id RETURN p.id", parameters={"id": person_id})
+    if not check.has_next():
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    # One hop over the precomputed CLOSURE table
+    if direction == "ancestors":
+        pattern = "(rel:Person)-[x:CLOSURE]->(p:Person)"
+    else:
+        pattern = "(p:Person)-[x:CLOSURE]->(rel:Person)"
+    depth_filter = "AND x.depth <= $max_depth" if max_depth is not None else ""
+    query = f"""
+        MATCH {pattern}
+        WHERE p.id = $id {depth_filter}
+        RETURN rel.id, rel.name, rel.gender, rel.birth_date, rel.death_date, x.depth
+        ORDER BY x.depth, rel.name
+    """
+    params = {"id": person_id}
+    if max_depth is not None:
+        params["max_depth"] = max_depth
+    result = conn.execute(query, parameters=params)
+
+    relatives = []
+    while result.has_next():
+        row = result.get_next()
+        relatives.append({
+            "id": row[0],
+            "name": row[1],
+            "gender": row[2],
+            "birth_date": row[3],
+            "death_date": row[4],
+            "generation": row[5]
+        })
+    return {"person_id": person_id, "count": len(relatives), direction: relatives}
+
+@router.get("/{person_id}/ancestors")
+def get_ancestors(person_id: int, max_depth: Optional[int] = None, conn: Connection = Depends(get_read_conn)):
+    """All ancestors with their generation distance (1 = parent), from the CLOSURE table."""
+    return _closure_relatives(conn, person_id, "ancestors", max_depth)
+
+@router.get("/{person_id}/descendants")
+def get_descendants(person_id: int, max_depth: Optional[int] = None, conn: Connection = Depends(get_read_conn)):
+    """All descendants with their generation distance (1 = child), from the CLOSURE table."""
+    return _closure_relatives(conn, person_id, "descendants", max_depth)
+
+@router.get("/{person_id}/pedigree-analysis")
+def get_pedigree_analysis(person_id: int, include_adopted: bool = True, conn: Connection = Depends(get_conn)):
+    """
+    Inbreeding coefficient, implex (pedigree collapse) and the ancestors who
+    appear more than once in this person's pedigree.
+    """
+
+    index = get_kinship_index()
+    if person_id not in index:
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    analysis = pedigree_analysis(index, person_id, include_adopted)
+
+    duplicated = analysis.pop("duplicated")
+    names = {}
+    if duplicated:
+        result = conn.execute(
+            "MATCH (p:Person) WHERE p.id IN $ids RETURN p.id, p.name",
+            parameters={"ids": list(duplicated)}
+        )
+        while result.has_next():
+            row = result.get_next()
+            names[row[0]] = row[1]
+
+    analysis["person_id"] = person_id
+    analysis["implex_percentage"] = round(analysis.pop("implex") * 100, 2)
+    analysis["duplicated_ancestors"] = sorted(
+        (
+            {
+                "id": pid,
+                "name": names.get(pid),
+                "occurrences": sum(counts.values()),
+                "generations": sorted(counts)
+            }
+            for pid, counts in duplicated.items()
+        ),
+        key=lambda a: (-a["occurrences"], min(a["generations"]))
+    )
+    return analysis
@@ -1,8 +1,9 @@
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Depends
 from typing import Optional
 from pydantic import BaseModel
-from database import get_db_connection
+from kuzu import Connection
+from database import get_conn, get_read_conn, write_queue
 
 router = APIRouter()
 
@@ -37,7 +38,6 @@ class ResidenceLink(BaseModel):
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_place(place: PlaceCreate):
     """Create a new place."""
-    db, conn = get_db_connection()
     
     query = """
         CREATE (p:Place {
@@ -62,19 +62,18 @@ def create_place(place: PlaceCreate):
     }
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
+        rows = write_queue.execute(query, params)
+        if not rows:
             raise HTTPException(status_code=500, detail="Failed to create place")
-        place_id = result.get_next()[0]
+        place_id = rows[0][0]
         return {"id": place_id, "message": "Place created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/")
-def list_places(search: Optional[str] = None):
+def list_places(search: Optional[str] = None, conn: Connection = Depends(get_conn)):
     """List all places, optionally filtered by name/city search."""
-    db, conn = get_db_connection()
     
     if search:
         query = """
@@ -110,9 +109,8 @@ def list_places(search: Optional[str] = None):
 
 
 @router.get("/{place_id}")
-def get_place(place_id: int):
+def get_place(place_id: int, conn: Connection = Depends(get_read_conn)):
     """Get place details with residents."""
-    db, conn = get_db_connection()
     
     # Get place info
     place_query = """
@@ -163,7 +161,6 @@ def get_place(place_id: int):
 @router.put("/{place_id}")
 def update_place(place_id: int, place: PlaceUpdate):
     """Update place details."""
-    db, conn = get_db_connection()
     
     # Build dynamic SET clause
     set_parts = []
@@ -186,8 +183,8 @@ def update_place(place_id: int, place: PlaceUpdate):
     """
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
+        rows = write_queue.execute(query, params)
+        if not rows:
             raise HTTPException(status_code=404, detail="Place not found")
         return {"message": "Place updated"}
     except Exception as e:
@@ -197,7 +194,6 @@ def update_place(place_id: int, place: PlaceUpdate):
 @router.delete("/{place_id}")
 def delete_place(place_id: int):
     """Delete a place and its residence links."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (p:Place)
@@ -206,7 +202,7 @@ def delete_place(place_id: int):
     """
     
     try:
-        conn.execute(query, parameters={"pid": place_id})
+        write_queue.execute(query, {"pid": place_id})
         return {"message": "Place deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -215,7 +211,6 @@ def delete_place(place_id: int):
 @router.post("/{place_id}/residents")
 def add_resident(place_id: int, link: ResidenceLink):
     """Add a resident to a place (LIVED_AT relationship)."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (person:Person), (place:Place)
@@ -236,8 +231,9 @@ def add_resident(place_id: int, link: ResidenceLink):
     }
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
+        # Committed by the writer thread, grouped with other pending writes
+        rows = write_queue.execute(query, params)
+        if not rows:
             raise HTTPException(status_code=404, detail="Person or Place not found")
         return {"message": "Resident added"}
     except Exception as e:
@@ -247,7 +243,6 @@ def add_resident(place_id: int, link: ResidenceLink):
 @router.delete("/{place_id}/residents/{person_id}")
 def remove_resident(place_id: int, person_id: int):
     """Remove a resident from a place."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (person:Person)-[r:LIVED_AT]->(place:Place)
@@ -256,16 +251,15 @@ def remove_resident(place_id: int, person_id: int):
     """
     
     try:
-        conn.execute(query, parameters={"pid": person_id, "plid": place_id})
+        write_queue.execute(query, {"pid": person_id, "plid": place_id})
         return {"message": "Resident removed"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/person/{person_id}")
-def get_person_residences(person_id: int):
+def get_person_residences(person_id: int, conn: Connection = Depends(get_conn)):
     """Get all places a person has lived."""
-    db, conn = get_db_connection()
     
     query = """
         MATCH (person:Person)-[r:LIVED_AT]->(place:Place)
@@ -1,9 +1,23 @@
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Header, Query, Depends
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import date
-from database import get_db_connection
+from kuzu import Connection
+from database import get_conn, connection, transaction, write_queue
+from graph_index import get_kinship_index, reload_kinship_index, CycleError, PARENT_OF, ADOPTED_BY, MARRIED_TO
+from kinship import kinship_matrix, relationship_matrix
+from closure import add_parent_edge, closure_refresh
+from layout import get_layout
+from graph_cache import (
+    bump_graph_version, get_graph_version, make_etag, etag_matches,
+    get_cached_payload, pick_encoding, compress_payload, get_changes_since
+)
+import base64
+import json
+import numpy as np
+import pyarrow as pa
 
 router = APIRouter()
 
@@ -19,10 +33,22 @@ class SpouseRelation(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
 
+def _graph_edge(source, target, edge_type):
+    # Edge as it appears in /relationships/graph
+    return {"source": source, "target": target, "type": edge_type}
+
+class RelationshipBulk(BaseModel):
+    parents: List[ParentRelation] = []
+    spouses: List[SpouseRelation] = []
+
+class KinshipMatrixRequest(BaseModel):
+    person_ids: List[int]
+    coefficient: Optional[str] = "relationship"  # 'relationship' (r) or 'kinship' (phi)
+    include_adopted: bool = True
+    format: Optional[str] = "json"  # 'json' (nested lists) or 'base64' (float32, row-major)
+
 @router.post("/parent", status_code=status.HTTP_201_CREATED)
 def add_parent(relation: ParentRelation):
-    db, conn = get_db_connection()
-    
     # Check for self-loop
     if relation.parent_id == relation.child_id:
         raise HTTPException(status_code=400, detail="Cannot be parent of self")
@@ -50,20 +76,29 @@ def add_parent(relation: ParentRelation):
         """
         params = {"pid": relation.parent_id, "cid": relation.child_id}
     
+    label = "ADOPTED_BY" if relation.relationship_type == "adopted" else "PARENT_OF"
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
-            raise HTTPException(status_code=404, detail="One or both persons not found")
+        # One writer-thread mutation: the cycle check, the edge, its closure rows
+        # and the index patch commit (or roll back) together
+        created = write_queue.run(
+            add_parent_edge, query, params, relation.parent_id, relation.child_id, label
+        )
+    except CycleError as e:
+        # Child already an ancestor of parent (possibly through an edge
+        # committed after this request started)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         # If ADOPTED_BY table missing, this will fail. We need the migration.
         raise HTTPException(status_code=500, detail=str(e))
+    if not created:
+        raise HTTPException(status_code=404, detail="One or both persons not found")
+
+    bump_graph_version({"op": "add_edge", "edge": _graph_edge(relation.parent_id, relation.child_id, label)})
 
     return {"message": "Parent relationship created"}
 
 @router.post("/spouse", status_code=status.HTTP_201_CREATED)
 def add_spouse(relation: SpouseRelation):
-    db, conn = get_db_connection()
-    
     if relation.spouse1_id == relation.spouse2_id:
         raise HTTPException(status_code=400, detail="Cannot marry self")
 
@@ -95,67 +130,405 @@ def add_spouse(relation: SpouseRelation):
     """
     
     try:
-        result = conn.execute(query, parameters=params)
-        if not result.has_next():
-             raise HTTPException(status_code=404, detail="Persons not found")
+        rows = write_queue.execute(query, params)
     except Exception as e:
          raise HTTPException(status_code=500, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=404, detail="Persons not found")
+
+    get_kinship_index().add_spouse(relation.spouse1_id, relation.spouse2_id)
+    bump_graph_version({"op": "add_edge", "edge": _graph_edge(relation.spouse1_id, relation.spouse2_id, "MARRIED_TO")})
          
-@router.get("/graph")
-def get_whole_graph():
-    db, conn = get_db_connection()
-    
-    # 1. Get all people
-    # Returning basic info needed for visualization
-    nodes_query = "MATCH (p:Person) RETURN p.id, p.name, p.gender, p.birth_date"
-    nodes_result = conn.execute(nodes_query)
-    
-    nodes = []
+BULK_PARENT_QUERY = """
+    UNWIND $rows AS r
+    MATCH (p:Person), (c:Person)
+    WHERE p.id = r.pid AND c.id = r.cid
+    CREATE (p)-[:PARENT_OF]->(c)
+"""
+BULK_ADOPTED_QUERY = """
+    UNWIND $rows AS r
+    MATCH (p:Person), (c:Person)
+    WHERE p.id = r.pid AND c.id = r.cid
+    CREATE (p)-[:ADOPTED_BY {adoption_date: r.ad_date}]->(c)
+"""
+BULK_SPOUSE_QUERY = """
+    UNWIND $rows AS r
+    MATCH (p1:Person), (p2:Person)
+    WHERE p1.id = r.id1 AND p2.id = r.id2
+    CREATE (p1)-[:MARRIED_TO {start_date: r.start_date, end_date: r.end_date}]->(p2)
+"""
+
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+def add_relationships(relations: RelationshipBulk):
+    """
+    Create many parent and spouse relationships in one transaction: either
+    all are created or none. Returns the created edges in input order.
+    """
+    index = get_kinship_index()
+
+    for relation in relations.parents:
+        if relation.parent_id == relation.child_id:
+            raise HTTPException(status_code=400, detail="Cannot be parent of self")
+    for relation in relations.spouses:
+        if relation.spouse1_id == relation.spouse2_id:
+            raise HTTPException(status_code=400, detail="Cannot marry self")
+    people = {r.parent_id for r in relations.parents} | {r.child_id for r in relations.parents}
+    people |= {r.spouse1_id for r in relations.spouses} | {r.spouse2_id for r in relations.spouses}
+    missing = sorted(pid for pid in people if pid not in index)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Persons not found: {missing}")
+    parents = [
+        ("ADOPTED_BY" if r.relationship_type == "adopted" else "PARENT_OF", r)
+        for r in relations.parents
+    ]
+    biological = [{"pid": r.parent_id, "cid": r.child_id} for label, r in parents if label == "PARENT_OF"]
+    adopted = [
+        {"pid": r.parent_id, "cid": r.child_id, "ad_date": r.adoption_date}
+        for label, r in parents if label == "ADOPTED_BY"
+    ]
+    spouses = [
+        {"id1": r.spouse1_id, "id2": r.spouse2_id, "start_date": r.start_date or None, "end_date": r.end_date or None}
+        for r in relations.spouses
+    ]
+    parent_edges = [_graph_edge(r.parent_id, r.child_id, label) for label, r in parents]
+    spouse_edges = [_graph_edge(r.spouse1_id, r.spouse2_id, "MARRIED_TO") for r in relations.spouses]
+
+    def write(conn):
+        # Cycles (also ones formed by edges within the batch) are checked here,
+        # on the writer thread, against the index as of this point in the group
+        index = get_kinship_index()
+        cycle = index.first_cycle([(r.parent_id, r.child_id) for r in relations.parents])
+        if cycle is not None:
+            raise CycleError(f"parents[{cycle}]: Child is already an ancestor of parent")
+        # Edges and closure rows commit together; the closure is computed from
+        # the index, so it is patched inside and rebuilt from Kuzu on rollback
+        if biological:
+            conn.execute(BULK_PARENT_QUERY, parameters={"rows": biological})
+        if adopted:
+            conn.execute(BULK_ADOPTED_QUERY, parameters={"rows": adopted})
+        if spouses:
+            conn.execute(BULK_SPOUSE_QUERY, parameters={"rows": spouses})
+        write_queue.on_rollback(reload_kinship_index, conn)
+        for edge in parent_edges:
+            index.add_parent(edge["source"], edge["target"], edge["type"])
+        for edge in spouse_edges:
+            index.add_spouse(edge["source"], edge["target"])
+        # One closure pass over every child and everyone below them
+        below = set()
+        for child_id in {edge["target"] for edge in parent_edges}:
+            if child_id not in below:
+                below.add(child_id)
+                below.update(index.descendants(child_id))
+        closure_refresh(conn, index, below)
+
+    try:
+        write_queue.run(write)
+    except CycleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if parent_edges or spouse_edges:
+        bump_graph_version(*({"op": "add_edge", "edge": edge} for edge in parent_edges + spouse_edges))
+
+    return {"parents": parent_edges, "spouses": spouse_edges}
+
+# Column aliases double as the Arrow column names (see graph_arrow_payload)
+GRAPH_NODES_QUERY = """
+    MATCH (p:Person)
+    {where}
+    RETURN p.id AS id, p.name AS name, p.gender AS gender, p.birth_date AS birth_date
+"""
+GRAPH_PARENT_EDGES_QUERY = """
+    MATCH (p:Person)-[r:PARENT_OF|ADOPTED_BY]->(c:Person)
+    {where}
+    RETURN p.id AS source, c.id AS target, label(r) AS type
+"""
+GRAPH_SPOUSE_EDGES_QUERY = """
+    MATCH (p1:Person)-[r:MARRIED_TO]->(p2:Person)
+    {where}
+    RETURN p1.id AS source, p2.id AS target, 'MARRIED_TO' AS type
+"""
+
+GRAPH_ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Low-cardinality string columns (edge type, gender) as int8 dictionary codes
+ARROW_SMALL_DICT = pa.dictionary(pa.int8(), pa.string())
+
+# Upper bound for ?up= / ?down= on the ego graph
+MAX_EGO_DEPTH = 30
+
+def _graph_queries(ids):
+    """(nodes, parent edges, spouse edges) queries and their parameters, optionally limited to `ids`."""
+    params = {} if ids is None else {"ids": list(ids)}
+
+    def where(*aliases):
+        if ids is None:
+            return ""
+        return "WHERE " + " AND ".join(f"{a}.id IN $ids" for a in aliases)
+
+    queries = (
+        GRAPH_NODES_QUERY.format(where=where("p")),
+        GRAPH_PARENT_EDGES_QUERY.format(where=where("p", "c")),
+        GRAPH_SPOUSE_EDGES_QUERY.format(where=where("p1", "p2"))
+    )
+    return queries, params
+
+def iter_graph(conn, ids=None):
+    """
+    Yield ("node", dict) and then ("edge", dict) items straight off the Kuzu
+    result cursors, so callers never have to hold the whole graph at once.
+    If `ids` is given, only those people and the edges between them are returned.
+    """
+    (nodes_query, parent_query, spouse_query), params = _graph_queries(ids)
+
+    # 1. People - basic info needed for visualization
+    nodes_result = conn.execute(nodes_query, parameters=params)
     while nodes_result.has_next():
         row = nodes_result.get_next()
-        nodes.append({
+        yield "node", {
             "id": row[0],
             "name": row[1],
             "gender": row[2],
             "birth_date": row[3]
-        })
-        
-    # 2. Get all edges
-    # PARENT_OF
-    edges = []
-    # PARENT_OF and ADOPTED_BY
-    edges = []
-    # We can match both types of edges
-    parent_query = """
-        MATCH (p:Person)-[r:PARENT_OF|ADOPTED_BY]->(c:Person) 
-        RETURN p.id, c.id, label(r)
-    """
-    parent_result = conn.execute(parent_query)
+        }
+
+    # 2. PARENT_OF and ADOPTED_BY edges
+    parent_result = conn.execute(parent_query, parameters=params)
     while parent_result.has_next():
         row = parent_result.get_next()
-        edges.append({
+        yield "edge", {
             "source": row[0],
             "target": row[1],
             "type": row[2] # "PARENT_OF" or "ADOPTED_BY"
-        })
+        }
 
-    # MARRIED_TO
-    spouse_query = "MATCH (p1:Person)-[r:MARRIED_TO]->(p2:Person) RETURN p1.id, p2.id"
-    spouse_result = conn.execute(spouse_query)
+    # 3. MARRIED_TO edges
+    spouse_result = conn.execute(spouse_query, parameters=params)
     while spouse_result.has_next():
         row = spouse_result.get_next()
-        edges.append({
+        yield "edge", {
             "source": row[0],
             "target": row[1],
-            "type": "MARRIED_TO"
-        })
-        
-    return {"nodes": nodes, "edges": edges}
+            "type": row[2] # "MARRIED_TO"
+        }
+
+def graph_arrow_payload(conn, ids=None):
+    """
+    Graph as two Arrow IPC streams written back to back: nodes
+    (id, name, gender, birth_date) then edges (source, target, type).
+    Columns come straight from Kuzu's Arrow export; repeated strings (gender,
+    edge type) are dictionary-encoded so each edge is two ints and a small code.
+    """
+    (nodes_query, parent_query, spouse_query), params = _graph_queries(ids)
+
+    nodes = conn.execute(nodes_query, parameters=params).get_as_arrow().combine_chunks()
+    gender_idx = nodes.schema.get_field_index("gender")
+    nodes = nodes.set_column(gender_idx, "gender", nodes.column(gender_idx).cast(ARROW_SMALL_DICT))
+
+    edges = pa.concat_tables([
+        conn.execute(parent_query, parameters=params).get_as_arrow(),
+        conn.execute(spouse_query, parameters=params).get_as_arrow()
+    ]).combine_chunks()
+    type_idx = edges.schema.get_field_index("type")
+    edges = edges.set_column(type_idx, "type", edges.column(type_idx).cast(ARROW_SMALL_DICT))
+
+    sink = pa.BufferOutputStream()
+    for table in (nodes, edges):
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def get_ego_ids(conn, root, up, down, spouses=True):
+    """
+    Ids of `root`, its ancestors up to `up` generations, its descendants down to
+    `down` generations and (optionally) the spouses of everyone in that set.
+    Traversal runs on the in-memory kinship index, not recursive Cypher.
+    """
+    check = conn.execute("MATCH (p:Person) WHERE p.id = $id RETURN p.id", parameters={"id": root})
+    if not check.has_next():
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    index = get_kinship_index()
+    ids = {root}
+    if up > 0:
+        ids.update(index.ancestors(root, up))
+    if down > 0:
+        ids.update(index.descendants(root, down))
+    if spouses:
+        for pid in list(ids):
+            ids.update(index.spouses(pid))
+
+    return ids
+
+@router.get("/graph/layout")
+def get_graph_layout(if_none_match: Optional[str] = Header(None)):
+    """
+    Precomputed tree coordinates for every person (top-left of a
+    node_width x node_height box), cached until the kinship graph changes.
+    """
+    layout = get_layout(get_kinship_index())
+    etag = make_etag(layout["version"], "layout")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return JSONResponse(layout, headers={"ETag": etag})
+
+@router.get("/components")
+def get_components(min_size: int = 1, limit: Optional[int] = None):
+    """
+    Connected components ("islands") of the kinship graph, largest first, with
+    a representative person each. Pass a component_id to /graph?component_id=
+    to load one island.
+    """
+    index = get_kinship_index()
+    components = [c for c in index.components() if c[1] >= min_size]
+    total = len(components)
+    if limit is not None:
+        components = components[:max(limit, 0)]
+
+    names = {}
+    if components:
+        with connection() as conn:
+            result = conn.execute(
+                "MATCH (p:Person) WHERE p.id IN $ids RETURN p.id, p.name",
+                parameters={"ids": [component_id for component_id, _ in components]}
+            )
+            while result.has_next():
+                row = result.get_next()
+                names[row[0]] = row[1]
+
+    return {
+        "count": total,
+        "components": [
+            {
+                "component_id": component_id,
+                "size": size,
+                "representative": {"id": component_id, "name": names.get(component_id)}
+            }
+            for component_id, size in components
+        ]
+    }
+
+@router.get("/graph/changes")
+def get_graph_changes(since: int):
+    """
+    Changes to /relationships/graph after version `since` (its X-Graph-Version
+    header), oldest first. If the journal no longer reaches back that far,
+    `full_reload` is true and the client should refetch the whole graph.
+    """
+    version, changes = get_changes_since(since)
+    return {
+        "since": since,
+        "version": version,
+        "full_reload": changes is None,
+        "changes": changes or []
+    }
+
+def _ndjson_lines(items):
+    # One JSON object per line: {"kind": "node"|"edge", ...fields}
+    for kind, item in items:
+        yield json.dumps({"kind": kind, **item}) + "\n"
+
+@router.get("/graph")
+def get_whole_graph(
+    format: Optional[str] = None,
+    root: Optional[int] = None,
+    up: int = 2,
+    down: int = 2,
+    spouses: bool = True,
+    component_id: Optional[int] = None,
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Returns every person and kinship edge.
+
+    With ?root={person_id} only the neighbourhood of that person is returned:
+    `up` generations of ancestors, `down` generations of descendants and, if
+    `spouses` is true, their spouses.
+
+    With ?component_id= only that connected component (see /components) is
+    returned; combined with ?root= it limits the neighbourhood to it.
+
+    With ?format=ndjson the response is streamed as newline-delimited JSON
+    (all node lines first, then edge lines) instead of one big document.
+
+    With ?format=arrow or `Accept: application/vnd.apache.arrow.stream` the
+    graph is sent as columnar Arrow IPC (see graph_arrow_payload).
+
+    Responses carry the graph version as a strong ETag; a matching
+    If-None-Match gets 304. JSON and Arrow payloads, plus their gzip/brotli
+    variants, are served from memory until the graph changes.
+    """
+    if format is None and accept and GRAPH_ARROW_MEDIA_TYPE in accept:
+        format = "arrow"
+    if format not in (None, "json", "ndjson", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be 'json', 'ndjson' or 'arrow'")
+
+    variant = format or "json"
+    if root is not None:
+        if not (0 <= up <= MAX_EGO_DEPTH and 0 <= down <= MAX_EGO_DEPTH):
+            raise HTTPException(status_code=400, detail=f"up and down must be between 0 and {MAX_EGO_DEPTH}")
+        variant += f"-root{root}-u{up}-d{down}-s{int(spouses)}"
+    component = None
+    if component_id is not None:
+        component = get_kinship_index().component_members(component_id)
+        if component is None:
+            raise HTTPException(status_code=404, detail="Component not found")
+        variant += f"-c{component_id}"
+
+    # Streamed responses are not precompressed
+    encoding = None if format == "ndjson" else pick_encoding(accept_encoding)
+    version = get_graph_version()
+    etag = make_etag(version, f"{variant}-{encoding}" if encoding else variant)
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding", "X-Graph-Version": str(version)}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    def graph_ids(conn):
+        ids = None if root is None else get_ego_ids(conn, root, up, down, spouses)
+        if component is not None:
+            ids = set(component) if ids is None else ids & set(component)
+        return ids
+
+    if format == "ndjson":
+        # Resolve the ids first so an unknown root is still a 404
+        with connection() as conn:
+            ids = graph_ids(conn)
+
+        def lines():
+            with connection() as conn, transaction(conn, read_only=True):
+                yield from _ndjson_lines(iter_graph(conn, ids))
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+    def build():
+        # Nodes and edges from one snapshot, so no edge points at a missing node
+        with connection() as conn, transaction(conn, read_only=True):
+            if format == "arrow":
+                return graph_arrow_payload(conn, graph_ids(conn))
+            nodes = []
+            edges = []
+            for kind, item in iter_graph(conn, graph_ids(conn)):
+                if kind == "node":
+                    nodes.append(item)
+                else:
+                    edges.append(item)
+        return json.dumps({"nodes": nodes, "edges": edges}).encode()
+
+    if encoding:
+        payload = get_cached_payload(
+            version, f"{variant}-{encoding}",
+            lambda: compress_payload(get_cached_payload(version, variant, build), encoding)
+        )
+        headers["Content-Encoding"] = encoding
+    else:
+        payload = get_cached_payload(version, variant, build)
+
+    media_type = GRAPH_ARROW_MEDIA_TYPE if format == "arrow" else "application/json"
+    return Response(content=payload, media_type=media_type, headers=headers)
 
 @router.delete("/parent")
 def remove_parent(relation: ParentRelation):
-    db, conn = get_db_connection()
-    
     query = """
         MATCH (p:Person)-[r:PARENT_OF|ADOPTED_BY]->(c:Person)
         WHERE p.id = $pid AND c.id = $cid
@@ -163,13 +536,32 @@ def remove_parent(relation: ParentRelation):
     """
     params = {"pid": relation.parent_id, "cid": relation.child_id}
     
-    try:
+    def write(conn):
+        # Edge and closure rows commit together; the index is patched inside
+        # (closure_refresh reads it) and restored if the transaction rolls back
         conn.execute(query, parameters=params)
         # We can't easily check if it deleted anything without a prior match or checking result stats (if kuzu provides)
-        # For now, just assume success if no error.
+        # For now, trust the index: it has the edge exactly when Kuzu does.
+        index = get_kinship_index()
+        removed_label = dict(index.parents(relation.child_id)).get(relation.parent_id)
+        if removed_label:
+            index.remove_parent(relation.parent_id, relation.child_id)
+            write_queue.on_rollback(index.add_parent, relation.parent_id, relation.child_id, removed_label)
+            # Only the child and everyone below it can lose ancestors
+            affected = [relation.child_id, *index.descendants(relation.child_id)]
+            closure_refresh(conn, index, affected)
+        return removed_label
+
+    try:
+        removed_label = write_queue.run(write)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-        
+
+    changes = []
+    if removed_label:
+        changes.append({"op": "remove_edge", "edge": _graph_edge(relation.parent_id, relation.child_id, removed_label)})
+    bump_graph_version(*changes)
+
     return {"message": "Parent relationship removed"}
 
 @router.put("/parent")
@@ -178,11 +570,14 @@ def update_parent(relation: ParentRelation):
     Update parent relationship metadata and type.
     If type changes (Bio <-> Adopted), delete old edge and create new one.
     """
-    db, conn = get_db_connection()
     
+    # Graph-visible changes for the journal (adoption_date is not in the graph payload)
+    changes = []
+
     # 1. Check existing relationship type
+    # (only parent edges; CLOSURE and MARRIED_TO also connect Person -> Person)
     check_query = """
-        MATCH (p:Person)-[r]->(c:Person)
+        MATCH (p:Person)-[r:PARENT_OF|ADOPTED_BY]->(c:Person)
         WHERE p.id = $pid AND c.id = $cid
         RETURN label(r)
     """
@@ -191,50 +586,72 @@ def update_parent(relation: ParentRelation):
         "cid": relation.child_id
     }
     
-    result = conn.execute(check_query, parameters=params)
-    if not result.has_next():
-        raise HTTPException(status_code=404, detail="Relationship not found")
-        
-    current_type_label = result.get_next()[0] # "PARENT_OF" or "ADOPTED_BY"
-    
     target_type_label = "ADOPTED_BY" if relation.relationship_type == "adopted" else "PARENT_OF"
-    
-    if current_type_label != target_type_label:
-        # Type Changed: Delete and Re-create
-        delete_query = f"""
-            MATCH (p:Person)-[r:{current_type_label}]->(c:Person)
-            WHERE p.id = $pid AND c.id = $cid
-            DELETE r
-        """
-        conn.execute(delete_query, parameters=params)
+
+    # Check, delete and re-create in one writer mutation: readers never see the
+    # pair without an edge, and a failed create keeps the old one
+    def write(conn):
+        result = conn.execute(check_query, parameters=params)
+        if not result.has_next():
+            raise HTTPException(status_code=404, detail="Relationship not found")
+            
+        current_type_label = result.get_next()[0] # "PARENT_OF" or "ADOPTED_BY"
         
-        # Create new
-        if target_type_label == "ADOPTED_BY":
-             create_query = """
-                MATCH (p:Person), (c:Person)
+        if current_type_label != target_type_label:
+            # Type Changed: Delete and Re-create
+            delete_query = f"""
+                MATCH (p:Person)-[r:{current_type_label}]->(c:Person)
                 WHERE p.id = $pid AND c.id = $cid
-                CREATE (p)-[:ADOPTED_BY {adoption_date: $ad_date}]->(c)
+                DELETE r
             """
-             create_params = {**params, "ad_date": relation.adoption_date}
-             conn.execute(create_query, parameters=create_params)
+            conn.execute(delete_query, parameters=params)
+            
+            # Create new
+            if target_type_label == "ADOPTED_BY":
+                 create_query = """
+                    MATCH (p:Person), (c:Person)
+                    WHERE p.id = $pid AND c.id = $cid
+                    CREATE (p)-[:ADOPTED_BY {adoption_date: $ad_date}]->(c)
+                """
+                 create_params = {**params, "ad_date": relation.adoption_date}
+                 conn.execute(create_query, parameters=create_params)
+            else:
+                 create_query = """
+                    MATCH (p:Person), (c:Person)
+                    WHERE p.id = $pid AND c.id = $cid
+                    CREATE (p)-[:PARENT_OF]->(c)
+                """
+                 conn.execute(create_query, parameters=params)
+
+            # Same pair, new kind: overwrite the indexed edge (CycleError if
+            # the pair no longer fits the tree; the transaction rolls back)
+            index = get_kinship_index()
+            index.add_parent(relation.parent_id, relation.child_id, target_type_label)
+            write_queue.on_rollback(index.add_parent, relation.parent_id, relation.child_id, current_type_label)
+                 
         else:
-             create_query = """
-                MATCH (p:Person), (c:Person)
-                WHERE p.id = $pid AND c.id = $cid
-                CREATE (p)-[:PARENT_OF]->(c)
-            """
-             conn.execute(create_query, parameters=params)
-             
-    else:
-        # Same Type: Just Update Props
-        if target_type_label == "ADOPTED_BY":
-             query = """
-                MATCH (p:Person)-[r:ADOPTED_BY]->(c:Person)
-                WHERE p.id = $pid AND c.id = $cid
-                SET r.adoption_date = $ad_date
-            """
-             conn.execute(query, parameters={**params, "ad_date": relation.adoption_date})
-             
+            # Same Type: Just Update Props
+            if target_type_label == "ADOPTED_BY":
+                 query = """
+                    MATCH (p:Person)-[r:ADOPTED_BY]->(c:Person)
+                    WHERE p.id = $pid AND c.id = $cid
+                    SET r.adoption_date = $ad_date
+                """
+                 conn.execute(query, parameters={**params, "ad_date": relation.adoption_date})
+        return current_type_label
+
+    try:
+        current_type_label = write_queue.run(write)
+    except CycleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if current_type_label != target_type_label:
+        changes = [
+            {"op": "remove_edge", "edge": _graph_edge(relation.parent_id, relation.child_id, current_type_label)},
+            {"op": "add_edge", "edge": _graph_edge(relation.parent_id, relation.child_id, target_type_label)}
+        ]
+
+    bump_graph_version(*changes)
     return {"message": "Relationship updated"}
 
 @router.put("/spouse")
@@ -242,7 +659,6 @@ def update_spouse(relation: SpouseRelation):
     """
     Update spouse relationship metadata (start_date, end_date).
     """
-    db, conn = get_db_connection()
     
     # Kuzu requires non-null for SET usually, or dynamic query.
     # We'll use simple dynamic construction.
@@ -271,9 +687,103 @@ def update_spouse(relation: SpouseRelation):
     """
     
     try:
-        conn.execute(query, parameters=params)
+        write_queue.execute(query, params)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-        
+
+    bump_graph_version()
     return {"message": "Spouse relationship updated"}
 
+
+
+@router.post("/kinship-matrix")
+def get_kinship_matrix(request: KinshipMatrixRequest):
+    """
+    Pairwise coefficient of relationship (or kinship coefficient) for a set of
+    people, computed in one pass over their shared pedigree.
+    """
+    index = get_kinship_index()
+
+    # De-duplicate, keeping the caller's order
+    person_ids = list(dict.fromkeys(request.person_ids))
+    if not person_ids:
+        raise HTTPException(status_code=400, detail="person_ids must not be empty")
+    missing = [pid for pid in person_ids if pid not in index]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Persons not found: {missing}")
+    if request.coefficient not in ("relationship", "kinship"):
+        raise HTTPException(status_code=400, detail="coefficient must be 'relationship' or 'kinship'")
+    if request.format not in ("json", "base64"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'base64'")
+
+    try:
+        matrix = kinship_matrix(index, person_ids, request.include_adopted)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.coefficient == "relationship":
+        matrix = relationship_matrix(matrix)
+
+    response = {
+        "person_ids": person_ids,
+        "coefficient": request.coefficient,
+        "shape": list(matrix.shape)
+    }
+    if request.format == "base64":
+        response["dtype"] = "float32"
+        response["data"] = base64.b64encode(np.ascontiguousarray(matrix, dtype="<f4").tobytes()).decode("ascii")
+    else:
+        response["matrix"] = np.round(matrix, 6).tolist()
+    return response
+
+# Edge kinds each `via` option of /path may use
+PATH_VIA = {"parent": PARENT_OF, "adopted": ADOPTED_BY, "spouse": MARRIED_TO}
+
+@router.get("/path")
+def get_connection_path(
+    from_id: int = Query(..., alias="from"),
+    to_id: int = Query(..., alias="to"),
+    via: str = "parent,adopted,spouse",
+    conn: Connection = Depends(get_conn)
+):
+    """
+    Shortest chain of parent/child/spouse links between two people, found by
+    bidirectional BFS over the kinship index. `via` limits the edge kinds
+    (parent = PARENT_OF, adopted = ADOPTED_BY, spouse = MARRIED_TO).
+    """
+    options = [v.strip() for v in via.split(",") if v.strip()]
+    unknown = [v for v in options if v not in PATH_VIA]
+    if unknown or not options:
+        raise HTTPException(status_code=400, detail=f"via must be a comma-separated list of {', '.join(PATH_VIA)}")
+
+    index = get_kinship_index()
+    if from_id not in index or to_id not in index:
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    path = index.shortest_path(from_id, to_id, [PATH_VIA[v] for v in options])
+    if path is None:
+        return {"from": from_id, "to": to_id, "connected": False, "length": None, "path": [], "edges": []}
+
+    result = conn.execute(
+        "MATCH (p:Person) WHERE p.id IN $ids RETURN p.id, p.name, p.gender",
+        parameters={"ids": [pid for pid, _, _ in path]}
+    )
+    people = {}
+    while result.has_next():
+        row = result.get_next()
+        people[row[0]] = {"name": row[1], "gender": row[2]}
+
+    steps = []
+    edges = []
+    for n, (pid, label, step) in enumerate(path):
+        person = people.get(pid, {})
+        # `relationship` is what this person is to the previous one on the path
+        steps.append({"id": pid, "name": person.get("name"), "gender": person.get("gender"), "relationship": step})
+        if n == 0:
+            continue
+        previous = path[n - 1][0]
+        if step == "parent":
+            edges.append(_graph_edge(pid, previous, label))
+        else:
+            edges.append(_graph_edge(previous, pid, label))
+
+    return {"from": from_id, "to": to_id, "connected": True, "length": len(edges), "path": steps, "edges": edges}
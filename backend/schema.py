@@ -1,8 +1,10 @@
 
 from database import get_db_connection
 
-def create_schema():
-    db, conn = get_db_connection()
+def create_schema(conn=None):
+    """Create missing tables, on the shared connection unless `conn` is given."""
+    if conn is None:
+        db, conn = get_db_connection()
     
     # helper to ignore "table exists" errors
     def exec_safe(query):
@@ -40,6 +42,7 @@ def create_schema():
             death_place STRING,
             bio STRING,
             maiden_name STRING,
+            import_key STRING,
             PRIMARY KEY (id)
         )
     """)
@@ -52,6 +55,7 @@ def create_schema():
             event_date STRING,
             description STRING,
             location STRING,
+            import_key STRING,
             PRIMARY KEY (id)
         )
     """)
@@ -60,7 +64,23 @@ def create_schema():
     
     # Parentage: Person -> Person
     exec_safe("CREATE REL TABLE PARENT_OF(FROM Person TO Person)")
+
+    # Adoption: Person -> Person (same direction as PARENT_OF)
+    exec_safe("""
+        CREATE REL TABLE ADOPTED_BY(
+            FROM Person TO Person,
+            adoption_date STRING
+        )
+    """)
     
+    # Transitive closure of PARENT_OF/ADOPTED_BY: ancestor -> descendant (see closure.py)
+    exec_safe("""
+        CREATE REL TABLE CLOSURE(
+            FROM Person TO Person,
+            depth INT64
+        )
+    """)
+
     # Spouses: Person <-> Person (Undirected conceptually, but directed in graph DBs often represented as pair or directed req)
     # Kuzu supports recursive queries, but typically we define directed. 
     # For now: MARRIED_TO
@@ -91,6 +111,7 @@ def create_schema():
             country STRING,
             geo_lat DOUBLE,
             geo_lng DOUBLE,
+            import_key STRING,
             PRIMARY KEY (id)
         )
     """)
@@ -150,6 +171,11 @@ def create_schema():
     exec_safe("CREATE REL TABLE WORKED_AS(FROM Person TO Occupation)")
     exec_safe("CREATE REL TABLE EMPLOYED_BY(FROM Occupation TO Organization)")
 
+    # import_key maps rows bulk-loaded by gedcom.py back to their SERIAL ids;
+    # add it to databases created before it existed
+    for table in ("Person", "Event", "Place"):
+        exec_safe(f"ALTER TABLE {table} ADD IF NOT EXISTS import_key STRING")
+
     print("Schema initialization complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,296 @@
+"""
+Whole-database snapshots as Parquet, and restore from them.
+
+A snapshot is a directory snapshots/snapshot-<UTC timestamp>/ with one Parquet
+file per node and rel table (written by Kuzu COPY TO) and a manifest.json
+listing each table's columns, row count and SHA-256. All tables are exported
+inside one read-only transaction, so the files are a consistent point in time
+and neither readers nor writers wait for the export.
+
+Restore verifies the checksums and that the tables match schema.py, then
+drops and recreates every table and loads the files back with COPY FROM, all
+in one transaction on the write_queue writer thread, never grouped with other
+writes. SERIAL ids cannot be written directly, so node rows are padded to their
+original positions with empty rows that are deleted after the load; ids
+therefore survive the round trip. The padding runs up to the table's SERIAL
+high-water mark (`next_id` in the manifest), not just past the largest id
+left, so ids of rows deleted before the snapshot are not handed out again.
+
+Usage: python snapshot.py create
+       python snapshot.py list
+       python snapshot.py restore snapshots/snapshot-20240101T000000Z
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import kuzu
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from database import get_db_connection, transaction, write_queue
+from graph_index import reload_kinship_index
+from graph_cache import invalidate_graph
+from duplicates import reset_duplicates
+
+SNAPSHOT_DIR = "snapshots"
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def _rows(conn, query, params=None):
+    result = conn.execute(query, parameters=params or {})
+    rows = []
+    while result.has_next():
+        rows.append(result.get_next())
+    return rows
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _tables(conn):
+    """Manifest entries (without file stats) for every table: nodes first."""
+    tables = []
+    for _, name, kind, _, _ in _rows(conn, "CALL show_tables() RETURN *"):
+        info = _rows(conn, f"CALL table_info('{name}') RETURN *")
+        entry = {"name": name, "kind": kind}
+        if kind == "NODE":
+            entry["columns"] = [row[1] for row in info]
+            entry["primary_key"] = next(row[1] for row in info if row[4])
+            entry["serial"] = any(row[2] == "SERIAL" for row in info)
+        else:
+            entry["columns"] = [row[1] for row in info]
+            src, dst, src_key, dst_key = _rows(conn, f"CALL show_connection('{name}') RETURN *")[0]
+            entry.update({"from": src, "to": dst, "from_key": src_key, "to_key": dst_key})
+        tables.append(entry)
+    return sorted(tables, key=lambda t: (t["kind"] != "NODE", t["name"]))
+
+
+def _export_query(table, serial_tables):
+    def key(alias, table_name, column):
+        # SERIAL keys are cast: Kuzu writes them with a type pyarrow cannot read
+        if table_name in serial_tables:
+            return f"CAST({alias}.{column} AS INT64)"
+        return f"{alias}.{column}"
+
+    if table["kind"] == "NODE":
+        columns = [
+            f"{key('n', table['name'], c) if c == table['primary_key'] else 'n.' + c} AS {c}"
+            for c in table["columns"]
+        ]
+        return f"MATCH (n:{table['name']}) RETURN {', '.join(columns)} ORDER BY n.{table['primary_key']}"
+    columns = [
+        f"{key('a', table['from'], table['from_key'])} AS `from`",
+        f"{key('b', table['to'], table['to_key'])} AS `to`"
+    ] + [f"r.{c} AS {c}" for c in table["columns"]]
+    return f"MATCH (a:{table['from']})-[r:{table['name']}]->(b:{table['to']}) RETURN {', '.join(columns)}"
+
+
+def create_snapshot(conn, root=SNAPSHOT_DIR):
+    """Export every table to a new snapshot directory; returns its manifest."""
+    started = time.perf_counter()
+    name = "snapshot-" + datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(root, name)
+    partial = path + ".partial"
+    os.makedirs(partial)
+    try:
+        with transaction(conn, read_only=True):
+            tables = _tables(conn)
+            serial_tables = {t["name"] for t in tables if t["kind"] == "NODE" and t["serial"]}
+            for table in tables:
+                table["file"] = table["name"] + ".parquet"
+                target = os.path.abspath(os.path.join(partial, table["file"]))
+                conn.execute(f"COPY ({_export_query(table, serial_tables)}) TO '{target}'")
+        # Read after the export: a failed statement (see _next_serial) would
+        # end its transaction, and a sequence only moves forward, so this is
+        # at least the high-water mark the exported rows were written under
+        for table in tables:
+            if table["name"] in serial_tables:
+                table["next_id"] = _next_serial(conn, table)
+        for table in tables:
+            target = os.path.join(partial, table["file"])
+            table["rows"] = pq.ParquetFile(target).metadata.num_rows
+            table["sha256"] = _sha256(target)
+        manifest = {
+            "format": FORMAT_VERSION,
+            "name": name,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "kuzu_version": kuzu.__version__,
+            "tables": tables
+        }
+        with open(os.path.join(partial, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        # Only complete snapshots get their final name
+        os.rename(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    manifest["path"] = path
+    manifest["seconds"] = round(time.perf_counter() - started, 3)
+    return manifest
+
+
+def list_snapshots(root=SNAPSHOT_DIR):
+    """Manifests of the complete snapshots under `root`, newest first."""
+    if not os.path.isdir(root):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(root), reverse=True):
+        manifest_path = os.path.join(root, name, MANIFEST)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            manifest["path"] = os.path.join(root, name)
+            snapshots.append(manifest)
+    return snapshots
+
+
+def read_manifest(path):
+    """Load a snapshot's manifest and check every file against its checksum."""
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.isfile(manifest_path):
+        raise ValueError(f"No {MANIFEST} in {path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format')}")
+    for table in manifest["tables"]:
+        file_path = os.path.join(path, table["file"])
+        if not os.path.isfile(file_path):
+            raise ValueError(f"Missing file: {table['file']}")
+        if _sha256(file_path) != table["sha256"]:
+            raise ValueError(f"Checksum mismatch: {table['file']}")
+    return manifest
+
+
+def _next_serial(conn, table):
+    # The id the table's SERIAL sequence hands out next (currval fails until
+    # the first row is created)
+    try:
+        rows = _rows(conn, f"RETURN currval('{table['name']}_{table['primary_key']}_serial')")
+    except RuntimeError:
+        return 0
+    return rows[0][0] + 1
+
+
+def _load_serial_nodes(conn, table, file_path, staging_dir):
+    # Pad rows so row k has id k, load without the id column, drop the padding
+    data = pq.read_table(file_path)
+    key = table["primary_key"]
+    ids = data.column(key).to_pylist()
+    # Older snapshots have no next_id: pad past the largest id only
+    size = max(table.get("next_id", 0), max(ids, default=-1) + 1)
+    if not size:
+        return
+    position = [None] * size
+    for row, pid in enumerate(ids):
+        position[pid] = row
+    columns = [c for c in table["columns"] if c != key]
+    padded = data.select(columns).take(pa.array(position, pa.int64()))
+    staged = os.path.join(staging_dir, table["file"])
+    pq.write_table(padded, staged)
+    conn.execute(f'COPY {table["name"]}({", ".join(columns)}) FROM "{os.path.abspath(staged)}"')
+    gaps = [pid for pid, row in enumerate(position) if row is None]
+    if gaps:
+        conn.execute(f"MATCH (n:{table['name']}) WHERE n.{key} IN $ids DELETE n", parameters={"ids": gaps})
+
+
+def _shape(table):
+    # What a table must look like for its snapshot file to load into it
+    keys = ("kind", "columns", "primary_key", "serial", "from", "to", "from_key", "to_key")
+    return {key: table.get(key) for key in keys}
+
+
+def check_schema(manifest):
+    """
+    Raise ValueError unless the snapshot's tables are exactly those schema.py
+    creates. Checked on a scratch in-memory database, before anything is dropped.
+    """
+    from schema import create_schema
+
+    scratch = kuzu.Database(":memory:", buffer_pool_size=1 << 26, max_db_size=1 << 30)
+    conn = kuzu.Connection(scratch)
+    create_schema(conn)
+    expected = {t["name"]: _shape(t) for t in _tables(conn)}
+    found = {t["name"]: _shape(t) for t in manifest["tables"]}
+    problems = []
+    if expected.keys() - found.keys():
+        problems.append(f"missing tables {sorted(expected.keys() - found.keys())}")
+    if found.keys() - expected.keys():
+        problems.append(f"unknown tables {sorted(found.keys() - expected.keys())}")
+    changed = sorted(name for name in expected.keys() & found.keys() if expected[name] != found[name])
+    if changed:
+        problems.append(f"tables that differ from schema.py {changed}")
+    if problems:
+        raise ValueError("Snapshot does not match the schema: " + "; ".join(problems))
+
+
+def _restore_tables(conn, manifest, path):
+    """write_queue mutation: drop every table and load the snapshot, in one transaction."""
+    from schema import create_schema
+
+    for table in sorted(_tables(conn), key=lambda t: t["kind"] == "NODE"):
+        conn.execute(f"DROP TABLE {table['name']}")
+    create_schema(conn)
+
+    with tempfile.TemporaryDirectory() as staging_dir:
+        for table in manifest["tables"]:
+            file_path = os.path.abspath(os.path.join(path, table["file"]))
+            if table["kind"] == "NODE" and table["serial"]:
+                # Even with no rows left, so the ids handed out before are not reused
+                _load_serial_nodes(conn, table, file_path, staging_dir)
+            elif not table["rows"]:
+                continue
+            else:
+                conn.execute(f'COPY {table["name"]} FROM "{file_path}"')
+
+    # Later mutations in the same group commit must see the restored graph
+    reload_kinship_index(conn)
+    write_queue.on_rollback(reload_kinship_index, conn)
+
+
+def restore_snapshot(path):
+    """
+    Replace the whole database with a snapshot. The snapshot is checked against
+    schema.py first; the drop and reload then run on the writer thread in a
+    transaction of their own, so no other write interleaves or shares its fate,
+    and a failure leaves the database as it was.
+    """
+    started = time.perf_counter()
+    manifest = read_manifest(path)
+    check_schema(manifest)
+    write_queue.run(_restore_tables, manifest, path, exclusive=True)
+
+    invalidate_graph()
+    reset_duplicates()
+    return {
+        "name": manifest["name"],
+        "tables": {t["name"]: t["rows"] for t in manifest["tables"]},
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+
+if __name__ == "__main__":
+    commands = ("create", "list", "restore")
+    if len(sys.argv) < 2 or sys.argv[1] not in commands or (sys.argv[1] == "restore") != (len(sys.argv) == 3):
+        print("Usage: python snapshot.py create | list | restore SNAPSHOT_DIR")
+        sys.exit(1)
+    db, conn = get_db_connection()
+    if sys.argv[1] == "create":
+        manifest = create_snapshot(conn)
+        print(f"{manifest['path']}: {sum(t['rows'] for t in manifest['tables'])} rows in {manifest['seconds']}s")
+    elif sys.argv[1] == "list":
+        for manifest in list_snapshots():
+            print(manifest["path"], manifest["created_at"], sum(t["rows"] for t in manifest["tables"]), "rows")
+    else:
+        print(restore_snapshot(sys.argv[2]))
@@ -0,0 +1,116 @@
+from graph_index import KinshipIndex
+from kinship import pedigree_analysis, describe_relationship, family, _greats, _ordinal
+
+
+def _index(parent_edges):
+    people = {p for edge in parent_edges for p in edge[:2]}
+    return KinshipIndex(people, parent_edges, [])
+
+
+def test_pedigree_analysis_three_parents():
+    # Child 0 with biological parents 1, 2 and adoptive parent 3
+    index = _index([(1, 0, "PARENT_OF"), (2, 0, "PARENT_OF"), (3, 0, "ADOPTED_BY")])
+    result = pedigree_analysis(index, 0)
+    assert result["unique_ancestors"] == 2
+    assert result["ancestor_occurrences"] == 2
+    assert result["implex"] == 0.0
+    assert all(row["implex"] >= 0 for row in result["generations"])
+
+
+def test_pedigree_analysis_without_adopted_parents():
+    # 3 is adopted by 0; 3's own parents 4 and 5 must not count either
+    index = _index([
+        (1, 0, "PARENT_OF"), (3, 0, "ADOPTED_BY"),
+        (4, 3, "PARENT_OF"), (5, 3, "PARENT_OF")
+    ])
+    result = pedigree_analysis(index, 0, include_adopted=False)
+    assert result["unique_ancestors"] == 1
+    assert result["ancestor_occurrences"] == 1
+    assert result["implex"] == 0.0
+
+    result = pedigree_analysis(index, 0, include_adopted=True)
+    assert result["unique_ancestors"] == 4
+    assert result["implex"] == 0.0
+
+
+def test_pedigree_analysis_collapse():
+    # First cousins 3 and 4 (grandparents 1, 2) have child 0
+    index = _index([
+        (1, 5, "PARENT_OF"), (2, 5, "PARENT_OF"), (1, 6, "PARENT_OF"), (2, 6, "PARENT_OF"),
+        (5, 3, "PARENT_OF"), (6, 4, "PARENT_OF"), (3, 0, "PARENT_OF"), (4, 0, "PARENT_OF")
+    ])
+    result = pedigree_analysis(index, 0)
+    assert result["unique_ancestors"] == 6
+    assert result["ancestor_occurrences"] == 8
+    assert result["implex"] == 0.25
+    assert result["inbreeding_coefficient"] == 1 / 16
+
+
+def test_pedigree_analysis_large_pedigree():
+    # Parents 1 and 2 are first cousins (shared grandparents 7, 8); 4, 6, 7 and
+    # 8 each have 11 generations of distinct ancestors above them, well past
+    # the kinship matrix's MAX_KINSHIP_PEDIGREE
+    edges = [
+        (1, 0, "PARENT_OF"), (2, 0, "PARENT_OF"), (3, 1, "PARENT_OF"), (4, 1, "PARENT_OF"),
+        (5, 2, "PARENT_OF"), (6, 2, "PARENT_OF"), (7, 3, "PARENT_OF"), (8, 3, "PARENT_OF"),
+        (7, 5, "PARENT_OF"), (8, 5, "PARENT_OF")
+    ]
+    next_id = 9
+    for root in (4, 6, 7, 8):
+        generation = [root]
+        for _ in range(11):
+            parents = []
+            for child in generation:
+                edges += [(next_id, child, "PARENT_OF"), (next_id + 1, child, "PARENT_OF")]
+                parents += [next_id, next_id + 1]
+                next_id += 2
+            generation = parents
+    result = pedigree_analysis(_index(edges), 0)
+    assert result["unique_ancestors"] == next_id - 1
+    assert result["inbreeding_coefficient"] == 1 / 16
+
+
+def test_describe_relationship_half_needs_two_recorded_parents():
+    # 2 and 3 share parent 1; only 3 also has a second parent on record
+    index = _index([(1, 2, "PARENT_OF"), (1, 3, "PARENT_OF"), (4, 3, "PARENT_OF")])
+    assert describe_relationship(index, 2, 3)["relationship"] == "sibling"
+
+    # Both have two recorded parents but share only one
+    index = _index([(1, 2, "PARENT_OF"), (5, 2, "PARENT_OF"), (1, 3, "PARENT_OF"), (4, 3, "PARENT_OF")])
+    assert describe_relationship(index, 2, 3)["relationship"] == "half-sibling"
+
+    # Half first cousins: children 6, 7 of half-siblings 2 and 3
+    index = _index([
+        (1, 2, "PARENT_OF"), (5, 2, "PARENT_OF"), (1, 3, "PARENT_OF"), (4, 3, "PARENT_OF"),
+        (2, 6, "PARENT_OF"), (3, 7, "PARENT_OF")
+    ])
+    assert describe_relationship(index, 6, 7)["relationship"] == "half-first cousin"
+
+
+def test_family_half_matches_describe_relationship():
+    # 2 and 3 share parent 1; only 3 has a second parent on record
+    index = _index([(1, 2, "PARENT_OF"), (1, 3, "PARENT_OF"), (4, 3, "PARENT_OF")])
+    relatives = {r["id"]: r for r in family(index, 2, 2)}
+    assert relatives[3]["half"] is False
+
+    # Both have two recorded parents but share only one (so their children
+    # are half first cousins)
+    index = _index([
+        (1, 2, "PARENT_OF"), (5, 2, "PARENT_OF"), (1, 3, "PARENT_OF"), (4, 3, "PARENT_OF"),
+        (2, 6, "PARENT_OF"), (3, 7, "PARENT_OF")
+    ])
+    relatives = {r["id"]: r for r in family(index, 2, 2)}
+    assert relatives[3]["half"] is True
+    relatives = {r["id"]: r for r in family(index, 6, 4)}
+    assert relatives[7]["half"] is True
+    assert describe_relationship(index, 6, 7)["relationship"] == "half-first cousin"
+
+
+def test_ordinal_suffixes():
+    assert [_greats(n) for n in (1, 2, 3, 4, 11, 12, 13, 21, 22, 23, 101, 111)] == [
+        "great-", "2nd great-", "3rd great-", "4th great-", "11th great-", "12th great-",
+        "13th great-", "21st great-", "22nd great-", "23rd great-", "101st great-", "111th great-"
+    ]
+    assert [_ordinal(n) for n in (3, 11, 12, 13, 21, 22, 23, 112)] == [
+        "third", "11th", "12th", "13th", "21st", "22nd", "23rd", "112th"
+    ]
@@ -0,0 +1,31 @@
+from collections import defaultdict
+from layout import assign_generations
+
+
+def _generations(person_ids, parent_edges, spouse_pairs):
+    parents, children, spouses = defaultdict(list), defaultdict(list), defaultdict(list)
+    for p, c in parent_edges:
+        parents[c].append(p)
+        children[p].append(c)
+    for a, b in spouse_pairs:
+        spouses[a].append(b)
+        spouses[b].append(a)
+    return assign_generations(person_ids, parents, children, spouses)
+
+
+def test_assign_generations_spouses_share_a_row():
+    # 0, 1 -> 2; 2 married to 3, whose parent 4 has no parents of its own
+    gen = _generations(range(5), [(0, 2), (1, 2), (4, 3)], [(2, 3)])
+    assert gen[0] == gen[1] == gen[4] == 0
+    assert gen[2] == gen[3] == 1
+
+
+def test_assign_generations_spouse_on_own_line():
+    # A spouse edge between an ancestor and a descendant (no row fits both)
+    # and a spouse chain tying a line to itself: both finish, children stay
+    # below their parents
+    n = 8000
+    parent_edges = [(i // 2, i) for i in range(1, n)]
+    gen = _generations(range(n), parent_edges, [(0, n - 1), (3, 8), (4, 7), (20, 21)])
+    assert all(gen[c] > gen[p] for p, c in parent_edges)
+    assert gen[20] == gen[21]
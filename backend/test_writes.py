@@ -0,0 +1,234 @@
+import io
+import os
+import re
+import tempfile
+import threading
+
+import database
+
+# A throwaway database for these tests, set before anything opens one
+database.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="kuzu-test-"), "kuzu_db")
+
+from fastapi import HTTPException
+from database import connection, transaction, write_queue
+from schema import create_schema
+from graph_index import get_kinship_index, reload_kinship_index, CycleError
+from closure import add_parent_edge, closure_matches
+from gedcom import import_gedcom, open_gedcom, export_gedcom
+from snapshot import create_snapshot, restore_snapshot
+from routers.relationships import (
+    add_relationships, remove_parent, ParentRelation, RelationshipBulk, SpouseRelation
+)
+from routers.people import delete_person
+
+PARENT_QUERY = """
+    MATCH (p:Person), (c:Person)
+    WHERE p.id = $pid AND c.id = $cid
+    CREATE (p)-[:PARENT_OF]->(c)
+    RETURN p.id, c.id
+"""
+
+_schema = []
+
+
+def _reset():
+    # Empty database (ids keep counting up) and a kinship index to match
+    if not _schema:
+        create_schema()
+        _schema.append(True)
+    write_queue.execute("MATCH (n) DETACH DELETE n")
+    with connection() as conn:
+        reload_kinship_index(conn)
+
+
+def _people(*names):
+    ids = [write_queue.execute("CREATE (p:Person {name: $name}) RETURN p.id", {"name": name})[0][0] for name in names]
+    for pid in ids:
+        get_kinship_index().add_person(pid)
+    return ids
+
+
+def _add_parent(parent_id, child_id):
+    params = {"pid": parent_id, "cid": child_id}
+    return write_queue.submit(add_parent_edge, PARENT_QUERY, params, parent_id, child_id, "PARENT_OF")
+
+
+def _closure_ok():
+    with connection() as conn:
+        return closure_matches(conn, get_kinship_index())
+
+
+def _parent_edges():
+    rows = write_queue.execute("MATCH (p:Person)-[:PARENT_OF|ADOPTED_BY]->(c:Person) RETURN p.id, c.id")
+    return sorted(tuple(row) for row in rows)
+
+
+def test_write_queue_group_commit():
+    _reset()
+    started = threading.Event()
+    release = threading.Event()
+
+    def hold(conn):
+        started.set()
+        release.wait(5)
+
+    # Writes queued while the writer is busy are committed together
+    first = write_queue.submit(hold)
+    started.wait(5)
+    before = write_queue.stats()["batches"]
+    futures = [
+        write_queue.submit(database._all_rows, "CREATE (p:Person {name: $name}) RETURN p.name", {"name": f"P{i}"})
+        for i in range(10)
+    ]
+    release.set()
+    first.result()
+    assert [f.result() for f in futures] == [[[f"P{i}"]] for i in range(10)]
+    assert write_queue.stats()["batches"] - before == 1
+    assert write_queue.execute("MATCH (p:Person) RETURN count(p)") == [[10]]
+
+
+def test_write_queue_rollback_undoes_index_patches():
+    _reset()
+    a, b, c = _people("A", "B", "C")
+
+    def fails(conn):
+        # Patches the index (with an undo) and the database, then fails
+        add_parent_edge(conn, PARENT_QUERY, {"pid": a, "cid": b}, a, b, "PARENT_OF")
+        raise RuntimeError("boom")
+
+    ok = _add_parent(b, c)
+    failed = write_queue.submit(fails)
+    assert ok.result() is True
+    assert isinstance(failed.exception(), RuntimeError)
+
+    assert _parent_edges() == [(b, c)]
+    assert get_kinship_index().parents(b) == []
+    assert get_kinship_index().parents(c) == [(b, "PARENT_OF")]
+    assert _closure_ok()
+
+
+def test_closure_after_add_remove_bulk():
+    _reset()
+    a, b, c, d, e, f = _people("A", "B", "C", "D", "E", "F")
+    for parent, child in ((a, c), (b, c), (c, d), (d, e)):
+        assert _add_parent(parent, child).result() is True
+    assert _closure_ok()
+
+    remove_parent(ParentRelation(parent_id=c, child_id=d))
+    assert (c, d) not in _parent_edges()
+    assert _closure_ok()
+
+    add_relationships(RelationshipBulk(
+        parents=[ParentRelation(parent_id=c, child_id=d), ParentRelation(parent_id=e, child_id=f)],
+        spouses=[SpouseRelation(spouse1_id=a, spouse2_id=b)]
+    ))
+    assert get_kinship_index().ancestors(f) == {e: 1, d: 2, c: 3, a: 4, b: 4}
+    assert _closure_ok()
+
+    delete_person(d)
+    assert get_kinship_index().ancestors(f) == {e: 1}
+    assert _closure_ok()
+
+
+def test_cycle_rejected():
+    _reset()
+    a, b, c = _people("A", "B", "C")
+    assert _add_parent(a, b).result() is True
+    assert _add_parent(b, c).result() is True
+    assert isinstance(_add_parent(c, a).exception(), CycleError)
+
+    # Both directions queued together: one commits, the other is refused
+    x, y = _people("X", "Y")
+    first, second = _add_parent(x, y), _add_parent(y, x)
+    assert first.result() is True
+    assert isinstance(second.exception(), CycleError)
+    assert (y, x) not in _parent_edges()
+
+    # Cycles closed within a bulk request
+    try:
+        add_relationships(RelationshipBulk(parents=[
+            ParentRelation(parent_id=c, child_id=x), ParentRelation(parent_id=y, child_id=a)
+        ]))
+        assert False, "bulk cycle was accepted"
+    except HTTPException as e:
+        assert e.status_code == 400
+    assert _parent_edges() == sorted([(a, b), (b, c), (x, y)])
+    assert _closure_ok()
+
+
+GEDCOM = """0 HEAD
+1 CHAR UTF-8
+0 @I1@ INDI
+1 NAME John /Smith/
+1 SEX M
+1 BIRT
+2 DATE 12 MAR 1900
+0 @I2@ INDI
+1 NAME Mary /Jones/
+1 SEX F
+0 @I3@ INDI
+1 NAME Ann /Smith/
+1 SEX F
+1 FAMC @F1@
+0 @I4@ INDI
+1 NAME Tom /Smith/
+1 SEX M
+1 FAMC @F1@
+2 PEDI adopted
+0 @F1@ FAM
+1 HUSB @I1@
+1 WIFE @I2@
+1 CHIL @I3@
+1 CHIL @I4@
+1 MARR
+2 DATE 1925
+0 TRLR
+"""
+
+
+def _export():
+    with connection() as conn, transaction(conn, read_only=True):
+        text = "".join(export_gedcom(conn))
+    # Ids differ between imports; compare the records themselves
+    return re.sub(r"@([IF])[0-9_]+@", r"@\1@", text)
+
+
+def test_gedcom_round_trip():
+    _reset()
+    counts = import_gedcom(open_gedcom(io.BytesIO(GEDCOM.encode())))
+    assert (counts["people"], counts["families"], counts["parent_edges"], counts["adoptions"], counts["marriages"]) == (4, 1, 2, 2, 1)
+    exported = _export()
+    assert "1 NAME John /Smith/\n" in exported
+    assert "2 DATE 12 MAR 1900\n" in exported
+    assert _closure_ok()
+
+    # Export, import the export again and export that
+    with connection() as conn, transaction(conn, read_only=True):
+        text = "".join(export_gedcom(conn))
+    _reset()
+    counts = import_gedcom(open_gedcom(io.BytesIO(text.encode())))
+    assert (counts["people"], counts["families"], counts["parent_edges"], counts["adoptions"], counts["marriages"]) == (4, 1, 2, 2, 1)
+    assert _export() == exported
+    assert _closure_ok()
+
+
+def test_snapshot_restore_keeps_ids():
+    _reset()
+    a, b, c, d = _people("A", "B", "C", "D")
+    assert _add_parent(a, b).result() is True
+    assert _add_parent(b, c).result() is True
+    delete_person(d)
+
+    with connection() as conn:
+        manifest = create_snapshot(conn, root=tempfile.mkdtemp(prefix="snapshots-"))
+    (e,) = _people("E")
+    write_queue.execute("MATCH (p:Person) WHERE p.id = $id SET p.name = 'changed'", {"id": a})
+
+    restore_snapshot(manifest["path"])
+    rows = write_queue.execute("MATCH (p:Person) RETURN p.id, p.name ORDER BY p.id")
+    assert rows == [[a, "A"], [b, "B"], [c, "C"]]
+    assert _parent_edges() == [(a, b), (b, c)]
+    assert _closure_ok()
+    # Ids handed out before the snapshot (d) are not handed out again
+    (f,) = _people("F")
+    assert f > d
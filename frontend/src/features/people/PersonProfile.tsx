@@ -21,6 +21,7 @@ interface Person {
     relationship_type?: 'biological' | 'adopted';
     adoption_date?: string;
     maiden_name?: string;
+    relationship?: string;
 }
 
 interface Relationships {
@@ -91,11 +92,11 @@ const PersonProfile: React.FC = () => {
         if (!personId) return;
         setLoading(true);
         try {
-            const personRes = await client.get(`/people/${personId}`);
-            setPerson(personRes.data);
-
-            const relRes = await client.get(`/people/${personId}/relationships`);
-            setRelationships(relRes.data);
+            // Person and immediate family in one call
+            const familyRes = await client.get(`/people/${personId}/family`, { params: { degree: 2 } });
+            const { person: personData, parents, children, spouses, siblings } = familyRes.data;
+            setPerson(personData);
+            setRelationships({ parents, children, spouses, siblings });
 
             // Fetch events for this person
             const eventsRes = await client.get(`/events/person/${personId}`);
@@ -506,7 +507,12 @@ const PersonProfile: React.FC = () => {
                         <ul className="space-y-2">
                             {relationships.siblings.map(p => (
                                 <li key={p.id} className="flex justify-between items-center group">
-                                    <Link to={`/people/${p.id}`} className="text-indigo-600 hover:underline">{p.name}</Link>
+                                    <div>
+                                        <Link to={`/people/${p.id}`} className="text-indigo-600 hover:underline">{p.name}</Link>
+                                        {p.relationship?.startsWith('half-') && (
+                                            <span className="text-xs text-gray-500 ml-2">(Half)</span>
+                                        )}
+                                    </div>
                                     {/* Siblings are inferred, no direct link to remove here easily unless we remove parent link? 
                                         Let's keep it read-only for now as per requirement 'Inferring'. 
                                     */}